@@ -0,0 +1,206 @@
+import os
+import io
+import sys
+import time
+import tarfile
+import zipfile
+import argparse
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from word_processor_1 import WordProcessor
+from fingerprint import is_already_processed
+from preflight import preflight_check
+from batch import summarize
+from template_cache import TemplatePlanCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_IN_FLIGHT_BYTES = 256 * 1024 * 1024
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+def is_tar_path(path):
+    return path.lower().endswith(TAR_SUFFIXES)
+
+
+def _is_document(name):
+    base_name = name.rsplit("/", 1)[-1]
+    return base_name.lower().endswith(".docx") and not base_name.startswith("~$")
+
+
+def iter_archive_entries(archive_path):
+    """Duyệt các tệp trong kho nén zip/tar, trả về (tên, kích thước, hàm đọc bytes).
+
+    Tar được đọc dạng luồng (không cần seek) nên hàm đọc phải được gọi trước khi chuyển
+    sang mục tiếp theo; dữ liệu chỉ được đọc khi cần, không giải nén ra đĩa.
+    """
+    if is_tar_path(archive_path):
+        with tarfile.open(archive_path, "r|*") as tar:
+            for member in tar:
+                if member.isfile():
+                    yield member.name, member.size, lambda member=member: tar.extractfile(member).read()
+    else:
+        with zipfile.ZipFile(archive_path) as zip_file:
+            for info in zip_file.infolist():
+                if not info.is_dir():
+                    yield info.filename, info.file_size, lambda info=info: zip_file.read(info)
+
+
+class ArchiveWriter:
+    """Ghi kết quả vào kho nén zip hoặc tar (theo đuôi tệp); chỉ được dùng từ một luồng."""
+
+    def __init__(self, output_path):
+        if is_tar_path(output_path):
+            mode = "w:gz" if output_path.lower().endswith((".gz", ".tgz")) else "w"
+            self._tar = tarfile.open(output_path, mode)
+            self._zip = None
+        else:
+            self._tar = None
+            # .docx đã được nén sẵn, nén lại chỉ tốn CPU
+            self._zip = zipfile.ZipFile(output_path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+
+    def write(self, name, data):
+        if self._zip is not None:
+            self._zip.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        (self._zip or self._tar).close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+_local = threading.local()
+
+
+def _get_processor(template_cache=None):
+    """Mỗi luồng xử lý dùng một WordProcessor riêng (TemplatePlanCache thì dùng chung)."""
+    processor = getattr(_local, "processor", None)
+    if processor is None:
+        processor = _local.processor = WordProcessor()
+    processor.template_cache = template_cache
+    return processor
+
+
+def process_document_bytes(name, data, force=False, stamp=True, template_cache=None):
+    """Xử lý một tài liệu trong bộ nhớ, trả về (kết quả, bytes cần ghi vào kho nén đầu ra)."""
+    start_time = time.perf_counter()
+    result = {"path": name, "status": "error", "changes": 0}
+    output = data
+
+    preflight = preflight_check(data)
+    if not preflight["ok"]:
+        result.update(status="rejected", reason=preflight["category"])
+    elif not force and is_already_processed(data):
+        result["status"] = "skipped"
+    else:
+        processor = _get_processor(template_cache)
+        if processor.open_document_bytes(data, os.path.basename(name), preflight):
+            pipeline = processor.run_pipeline(save=False)
+            # Transform lỗi: giữ nguyên bản gốc thay vì ghi tài liệu đã sửa dở dang
+            fixed = processor.save_document_bytes(stamp=stamp) if "error" not in pipeline else None
+            if fixed is not None:
+                changes = sum(count for count in pipeline["changes"].values() if count)
+                result.update(status="fixed" if changes else "clean", changes=changes)
+                output = fixed
+            elif pipeline.get("error"):
+                result["reason"] = pipeline["error"]
+            # Giải phóng tài liệu ngay để giữ bộ nhớ của luồng thấp
+            processor.document = None
+            processor.page_analyzer = None
+            processor.source = None
+
+    result["seconds"] = round(time.perf_counter() - start_time, 3)
+    return result, output
+
+
+def process_archive(input_path, output_path, workers=None, max_in_flight_bytes=DEFAULT_MAX_IN_FLIGHT_BYTES,
+                    force=False, stamp=True, copy_other=True, template_cache=None):
+    """Xử lý mọi tệp .docx trong kho nén zip/tar và ghi kết quả vào kho nén mới.
+
+    Các tài liệu được đọc dạng luồng từ kho nén, xử lý song song trên workers luồng và ghi
+    thẳng vào kho nén đầu ra; tổng kích thước các tài liệu đang xử lý (ước lượng theo kích
+    thước tệp) không vượt max_in_flight_bytes, trừ khi một tài liệu đơn lẻ đã lớn hơn giới hạn.
+    Tệp lỗi hoặc bị loại được ghi nguyên bản; tệp khác .docx được sao chép nếu copy_other=True.
+    template_cache (TemplatePlanCache) được dùng chung giữa các luồng.
+    """
+    workers = workers or min(4, os.cpu_count() or 1)
+    results = []
+    in_flight = {}
+    in_flight_bytes = 0
+
+    with ArchiveWriter(output_path) as writer, ThreadPoolExecutor(workers, thread_name_prefix="autooffice-archive") as executor:
+
+        def drain(block):
+            nonlocal in_flight_bytes
+            if not in_flight:
+                return
+            done, _ = wait(list(in_flight), timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, size = in_flight.pop(future)
+                in_flight_bytes -= size
+                result, data = future.result()
+                writer.write(name, data)
+                logger.info(f"{result['status']}: {name} ({result['changes']} thay đổi, {result['seconds']}s)")
+                results.append(result)
+
+        for name, size, read in iter_archive_entries(input_path):
+            if not _is_document(name):
+                if copy_other:
+                    writer.write(name, read())
+                continue
+
+            # Chờ bớt tài liệu đang xử lý để giữ bộ nhớ trong giới hạn
+            while in_flight and (in_flight_bytes + size > max_in_flight_bytes or len(in_flight) >= workers * 2):
+                drain(block=True)
+
+            data = read()
+            future = executor.submit(process_document_bytes, name, data, force, stamp, template_cache)
+            in_flight[future] = (name, size)
+            in_flight_bytes += size
+            drain(block=False)
+
+        while in_flight:
+            drain(block=True)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Xóa trang trắng trong các tệp Word nằm trong kho nén zip/tar")
+    parser.add_argument("input", help="Kho nén đầu vào (.zip, .tar, .tar.gz, ...)")
+    parser.add_argument("output", help="Kho nén đầu ra (.zip hoặc .tar/.tar.gz)")
+    parser.add_argument("--workers", type=int, help="Số luồng xử lý song song")
+    parser.add_argument("--max-memory-mb", type=int, default=DEFAULT_MAX_IN_FLIGHT_BYTES // (1024 * 1024),
+                        help="Tổng kích thước tối đa của các tài liệu đang xử lý (MB)")
+    parser.add_argument("--force", action="store_true", help="Xử lý cả các tệp đã có dấu đã xử lý")
+    parser.add_argument("--no-stamp", action="store_true", help="Không ghi dấu đã xử lý vào tệp")
+    parser.add_argument("--no-template-cache", action="store_true",
+                        help="Không dùng lại kết luận giữa các tệp cùng cấu trúc (cùng mẫu trộn thư)")
+    parser.add_argument("--documents-only", action="store_true", help="Không sao chép các tệp khác .docx")
+    args = parser.parse_args(argv)
+
+    template_cache = None if args.no_template_cache else TemplatePlanCache()
+    results = process_archive(args.input, args.output, args.workers, args.max_memory_mb * 1024 * 1024,
+                              args.force, not args.no_stamp, not args.documents_only, template_cache)
+    for result in results:
+        reason = f"  ({result['reason']})" if result.get("reason") else ""
+        print(f"{result['status']:<8} {result['changes']:>3} {result['seconds']:>8}s  {result['path']}{reason}")
+
+    summary = summarize(results)
+    print(", ".join(f"{status}: {count}" for status, count in sorted(summary.items())))
+    return 1 if summary.get("error") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from word_processor_1 import WordProcessor
+from word_processor_2 import EmptyPageDetector
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncWordProcessor:
+    """Giao diện asyncio cho WordProcessor, dùng trong các dịch vụ bất đồng bộ.
+
+    Công việc CPU (mở, phân tích, sửa, lưu) chạy trên một ThreadPoolExecutor riêng, giới hạn
+    bởi semaphore CPU; đếm trang bằng Word (COM) luôn chạy trên luồng COM riêng, giới hạn bởi
+    semaphore COM, vì Word không chịu được nhiều lời gọi đồng thời.
+
+    Hủy tác vụ (task.cancel()) có hiệu lực ngay với bước chưa bắt đầu; bước đang chạy trong luồng
+    không thể dừng giữa chừng nên được chờ cho xong (để tài liệu không ở trạng thái dở dang)
+    rồi CancelledError mới được ném ra.
+    """
+
+    def __init__(self, max_cpu_workers=None, max_com_workers=1):
+        self.max_cpu_workers = max_cpu_workers or min(4, os.cpu_count() or 1)
+        self.max_com_workers = max_com_workers
+        self._cpu_executor = ThreadPoolExecutor(self.max_cpu_workers, thread_name_prefix="autooffice-cpu")
+        self._com_executor = ThreadPoolExecutor(max_com_workers, thread_name_prefix="autooffice-com")
+        self._cpu_semaphore = asyncio.Semaphore(self.max_cpu_workers)
+        self._com_semaphore = asyncio.Semaphore(max_com_workers)
+        self._com_detector = EmptyPageDetector()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """Dừng các executor sau khi các bước đang chạy kết thúc."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._shutdown)
+
+    def _shutdown(self):
+        self._cpu_executor.shutdown(wait=True)
+        self._com_executor.shutdown(wait=True)
+
+    async def _run(self, executor, semaphore, func, *args):
+        async with semaphore:
+            future = executor.submit(func, *args)
+            try:
+                return await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                # Bước chưa chạy đã bị hủy cùng future; bước đang chạy thì chờ xong mới trả semaphore
+                if not future.done():
+                    await asyncio.wait([asyncio.wrap_future(future)])
+                raise
+
+    def _count_pages_blocking(self, docx_path):
+        """Backend đếm trang cho các luồng CPU: chuyển lời gọi COM sang luồng COM và chờ kết quả."""
+        return self._com_executor.submit(self._com_detector.get_exact_page_count, docx_path).result()
+
+    async def count_pages(self, docx_path):
+        """Đếm số trang chính xác bằng Word trên luồng COM, None nếu không có Word."""
+        return await self._run(self._com_executor, self._com_semaphore,
+                               self._com_detector.get_exact_page_count, docx_path)
+
+    def document(self, debug_mode=False, progress_callback=None):
+        """Tạo một AsyncDocument (mỗi tài liệu một WordProcessor riêng)."""
+        processor = WordProcessor()
+        processor.set_debug_mode(debug_mode)
+        if progress_callback:
+            processor.set_progress_callback(progress_callback)
+        processor.page_count_backend = self._count_pages_blocking
+        return AsyncDocument(self, processor)
+
+    async def process(self, input_path, output_path, stamp=False):
+        """Mở, phân tích, sửa và lưu một tệp; trả về số thay đổi hoặc None nếu lỗi."""
+        document = self.document()
+        if not await document.open(input_path):
+            return None
+        await document.analyze()
+        changes = await document.fix() if document.processor.empty_pages else 0
+        if not await document.save(output_path, stamp=stamp):
+            return None
+        return changes
+
+
+class AsyncDocument:
+    """Các thao tác awaitable trên một tài liệu; các bước của cùng tài liệu chạy tuần tự."""
+
+    def __init__(self, owner, processor):
+        self.owner = owner
+        self.processor = processor
+        self._lock = asyncio.Lock()
+
+    async def _call(self, method, *args):
+        async with self._lock:
+            return await self.owner._run(self.owner._cpu_executor, self.owner._cpu_semaphore, method, *args)
+
+    async def open(self, file_path):
+        return await self._call(self.processor.open_document, file_path)
+
+    async def open_bytes(self, data, file_name=None, document_key=None):
+        return await self._call(self.processor.open_document_bytes, data, file_name, None, document_key)
+
+    async def analyze(self, plan_path=None):
+        return await self._call(self.processor.analyze_document, plan_path)
+
+    async def fix(self):
+        return await self._call(self.processor.fix_empty_pages)
+
+    async def save(self, output_path=None, stamp=False):
+        return await self._call(self.processor.save_document, output_path, stamp)
+
+    async def save_bytes(self, stamp=False):
+        return await self._call(self.processor.save_document_bytes, stamp)
+
+    async def get_document_info(self):
+        return await self._call(self.processor.get_document_info)
@@ -0,0 +1,297 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import logging
+
+from word_processor_1 import WordProcessor
+from fingerprint import is_already_processed, is_output_current, stamp_marker, compute_source_hash
+from metrics import REGISTRY, start_http_server
+from profiling import ProfileCapture
+from docx_stats import read_document_stats
+from preflight import preflight_check
+from template_cache import TemplatePlanCache
+from page_count_rpc import RemotePageCountBackend
+
+logger = logging.getLogger(__name__)
+
+# Khoảng thời gian mặc định (giây) giữa hai lần quét ở chế độ --watch
+DEFAULT_WATCH_INTERVAL = 30.0
+
+
+def find_documents(paths):
+    """Trả về danh sách (đường dẫn tệp, đường dẫn tương đối) của các tệp .docx cần xử lý."""
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dir_path, dir_names, file_names in os.walk(path):
+                dir_names.sort()
+                for file_name in sorted(file_names):
+                    # Bỏ qua tệp khóa tạm của Word (~$...)
+                    if file_name.lower().endswith(".docx") and not file_name.startswith("~$"):
+                        full_path = os.path.join(dir_path, file_name)
+                        documents.append((full_path, os.path.relpath(full_path, path)))
+        else:
+            documents.append((path, os.path.basename(path)))
+    return documents
+
+
+def process_file(processor, input_path, output_path, force=False, stamp=True, preflight=None):
+    """Phân tích, sửa và lưu một tệp; bỏ qua nếu tệp đã có dấu đã xử lý hợp lệ.
+
+    Khi ghi ra nơi khác, tệp gốc đã có dấu được sao chép nguyên bản sang output_path, và tệp
+    cũng được bỏ qua nếu output_path đã là kết quả hợp lệ của tệp gốc hiện tại.
+    Tệp không cần sửa không được ghi lại qua python-docx (xem _write_clean_file).
+    preflight là kết quả preflight_check đã có của tệp (không kiểm tra lại khi mở).
+    """
+    start_time = time.perf_counter()
+    result = {"path": input_path, "status": "error", "changes": 0}
+    separate_output = os.path.abspath(output_path) != os.path.abspath(input_path)
+
+    if not force and is_already_processed(input_path):
+        result["status"] = "skipped"
+        if separate_output:
+            shutil.copyfile(input_path, output_path)
+    elif not force and separate_output and is_output_current(input_path, output_path):
+        result["status"] = "skipped"
+    elif processor.open_document(input_path, preflight):
+        # Mọi transform (mặc định chỉ fix_empty_pages) chạy trên một lần đọc và một lần ghi
+        pipeline = processor.run_pipeline(save=False)
+        changes = sum(count for count in pipeline["changes"].values() if count)
+        if pipeline.get("error"):
+            result["reason"] = pipeline["error"]
+        elif changes:
+            if processor.save_document(output_path, stamp):
+                result["status"] = "fixed"
+                result["changes"] = changes
+        elif _write_clean_file(input_path, output_path, stamp):
+            result["status"] = "clean"
+
+    result["seconds"] = round(time.perf_counter() - start_time, 3)
+    return result
+
+
+def _write_clean_file(input_path, output_path, stamp):
+    """Ghi tệp không cần sửa mà không ghi lại phần thân tài liệu.
+
+    Có đóng dấu thì chỉ thêm dấu vào gói gốc (các phần XML khác giữ nguyên byte); không đóng
+    dấu thì sao chép sang output_path, hoặc không ghi gì khi xử lý tại chỗ.
+    """
+    try:
+        if stamp:
+            with open(input_path, 'rb') as f:
+                data = f.read()
+            stamped = stamp_marker(data, source_hash=compute_source_hash(data))
+            with open(output_path, 'wb') as f:
+                f.write(stamped)
+        elif os.path.abspath(output_path) != os.path.abspath(input_path):
+            shutil.copyfile(input_path, output_path)
+        return True
+    except Exception as e:
+        logger.error(f"Lỗi khi ghi tệp {output_path}: {e}")
+        return False
+
+
+def process_batch(paths, output_dir=None, in_place=False, force=False, stamp=True, progress_callback=None,
+                  profile_capture=None, template_cache=None, page_count_backend=None):
+    """Xử lý hàng loạt tệp .docx, ghi đè (in_place) hoặc ghi vào output_dir.
+
+    Nếu có profile_capture (profiling.ProfileCapture), mỗi tệp được chạy dưới cProfile và
+    thống kê cấu trúc (không có văn bản) của tệp được ghi vào hồ sơ.
+
+    Nếu có template_cache (template_cache.TemplatePlanCache), các tệp cùng cấu trúc với tệp đã
+    phân tích (ví dụ kết quả trộn thư từ một mẫu) dùng lại kết luận thay vì phân tích lại.
+    page_count_backend thay cho Word qua COM khi cần số trang (ví dụ RemotePageCountBackend).
+    """
+    return process_documents(find_documents(paths), output_dir, in_place, force, stamp, progress_callback,
+                             profile_capture, template_cache, page_count_backend)
+
+
+def process_documents(documents, output_dir=None, in_place=False, force=False, stamp=True, progress_callback=None,
+                      profile_capture=None, template_cache=None, page_count_backend=None):
+    """Xử lý danh sách (đường dẫn tệp, đường dẫn tương đối) từ find_documents; xem process_batch."""
+    if not in_place and not output_dir:
+        raise ValueError("Cần chỉ định output_dir hoặc in_place=True")
+
+    processor = WordProcessor()
+    processor.template_cache = template_cache
+    processor.page_count_backend = page_count_backend
+    if progress_callback:
+        processor.set_progress_callback(progress_callback)
+
+    # Kiểm tra sơ bộ mọi tệp trước khi bắt đầu phân tích để phân loại sớm các tệp hỏng
+    preflight_results = {input_path: preflight_check(input_path) for input_path, _ in documents}
+    rejected = sum(1 for preflight in preflight_results.values() if not preflight["ok"])
+    if rejected:
+        logger.warning(f"Kiểm tra sơ bộ: {rejected}/{len(documents)} tệp không hợp lệ")
+
+    results = []
+    for input_path, relative_path in documents:
+        preflight = preflight_results[input_path]
+        if not preflight["ok"]:
+            logger.warning(f"rejected: {input_path} ({preflight['category']}: {preflight['message']})")
+            results.append({"path": input_path, "status": "rejected", "reason": preflight["category"],
+                            "changes": 0, "seconds": preflight["elapsed"]})
+            continue
+
+        if in_place:
+            output_path = input_path
+        else:
+            output_path = os.path.join(output_dir, relative_path)
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+        if profile_capture is not None:
+            result = profile_capture.run(process_file, processor, input_path, output_path, force, stamp, preflight)
+            if result["status"] != "skipped":
+                try:
+                    profile_capture.add_document_stats(read_document_stats(input_path))
+                except Exception as e:
+                    logger.warning(f"Không thể ghi thống kê tài liệu vào hồ sơ hiệu năng: {e}")
+        else:
+            result = process_file(processor, input_path, output_path, force, stamp, preflight)
+        logger.info(f"{result['status']}: {input_path} ({result['changes']} thay đổi, {result['seconds']}s)")
+        results.append(result)
+
+    return results
+
+
+def _file_signature(path):
+    """(mtime, kích thước) của tệp, hoặc None nếu tệp không còn."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def watch_batch(paths, interval=DEFAULT_WATCH_INTERVAL, on_results=None, rounds=None, **options):
+    """Theo dõi paths và xử lý các tệp .docx mới hoặc vừa thay đổi sau mỗi interval giây.
+
+    Mỗi lần quét chỉ so sánh (mtime, kích thước) nên tệp không đổi không bị mở lại; tệp thay đổi
+    được xử lý bằng process_documents (options giống process_batch), trong đó tệp đã có dấu
+    hợp lệ được bỏ qua chỉ bằng cách đọc central directory. on_results(results) nhận kết quả
+    của từng lần quét có tệp thay đổi. rounds giới hạn số lần quét (None để chạy đến khi bị ngắt).
+    """
+    seen = {}
+    completed_rounds = 0
+    while True:
+        documents = find_documents(paths)
+        changed = [(input_path, relative_path) for input_path, relative_path in documents
+                   if _file_signature(input_path) != seen.get(input_path)]
+        current_paths = {input_path for input_path, _ in documents}
+        for input_path in list(seen):
+            if input_path not in current_paths:
+                del seen[input_path]
+
+        if changed:
+            logger.info(f"Phát hiện {len(changed)} tệp mới hoặc đã thay đổi")
+            results = process_documents(changed, **options)
+            # Ghi nhận sau khi xử lý để tệp vừa được ghi đè (--in-place) không bị xử lý lại
+            for input_path, _ in changed:
+                seen[input_path] = _file_signature(input_path)
+            if on_results:
+                on_results(results)
+
+        completed_rounds += 1
+        if rounds is not None and completed_rounds >= rounds:
+            return
+        time.sleep(interval)
+
+
+def print_results(results):
+    """In kết quả từng tệp và bảng tổng hợp theo trạng thái."""
+    for result in results:
+        reason = f"  ({result['reason']})" if result.get("reason") else ""
+        print(f"{result['status']:<8} {result['changes']:>3} {result['seconds']:>8}s  {result['path']}{reason}")
+
+    summary = summarize(results)
+    print(", ".join(f"{status}: {count}" for status, count in sorted(summary.items())))
+    return summary
+
+
+def summarize(results):
+    """Đếm số tệp theo trạng thái."""
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return summary
+
+
+def print_progress(event):
+    """In sự kiện tiến trình ra stderr (dùng cho --progress)."""
+    if event["event"] == "progress":
+        print(f"  {event['stage']}: {event['current']}/{event['total']}", file=sys.stderr)
+    elif event["event"] == "end" and event.get("elapsed") is not None:
+        print(f"  {event['stage']}: xong sau {event['elapsed']:.2f}s", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Xóa trang trắng do ngắt phần Next Page trong nhiều tệp Word")
+    parser.add_argument("paths", nargs="+", help="Tệp .docx hoặc thư mục chứa tệp .docx")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--output-dir", help="Thư mục ghi các tệp đã sửa (giữ nguyên cấu trúc thư mục)")
+    target.add_argument("--in-place", action="store_true", help="Ghi đè tệp gốc")
+    parser.add_argument("--force", action="store_true", help="Xử lý cả các tệp đã có dấu đã xử lý")
+    parser.add_argument("--no-stamp", action="store_true", help="Không ghi dấu đã xử lý vào tệp")
+    parser.add_argument("--progress", action="store_true", help="In tiến trình từng giai đoạn")
+    parser.add_argument("--metrics-file", help="Ghi chỉ số dạng văn bản Prometheus vào tệp sau khi chạy xong")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="Ghi hồ sơ hiệu năng (pstats, collapsed stacks, thời gian từng giai đoạn) vào thư mục DIR")
+    parser.add_argument("--no-template-cache", action="store_true",
+                        help="Không dùng lại kết luận giữa các tệp cùng cấu trúc (cùng mẫu trộn thư)")
+    parser.add_argument("--page-count-server", metavar="HOST:PORT",
+                        help="Đếm số trang qua máy chủ page_count_rpc thay vì Word trên máy này")
+    parser.add_argument("--metrics-port", type=int, help="Phục vụ chỉ số tại http://127.0.0.1:<port>/metrics trong khi chạy")
+    parser.add_argument("--watch", nargs="?", type=float, const=DEFAULT_WATCH_INTERVAL, metavar="SECONDS",
+                        help="Tiếp tục theo dõi và xử lý tệp mới hoặc thay đổi sau mỗi SECONDS giây (Ctrl+C để dừng)")
+    args = parser.parse_args(argv)
+
+    metrics_server = start_http_server(args.metrics_port) if args.metrics_port else None
+
+    progress_callback = print_progress if args.progress else None
+
+    profile_capture = ProfileCapture() if args.profile else None
+    if profile_capture:
+        profile_capture.start()
+    try:
+        template_cache = None if args.no_template_cache else TemplatePlanCache()
+        page_count_backend = (RemotePageCountBackend.from_address(args.page_count_server)
+                              if args.page_count_server else None)
+        options = {
+            "output_dir": args.output_dir, "in_place": args.in_place, "force": args.force,
+            "stamp": not args.no_stamp, "progress_callback": progress_callback,
+            "profile_capture": profile_capture, "template_cache": template_cache,
+            "page_count_backend": page_count_backend
+        }
+        if args.watch is not None:
+            results = []
+
+            def on_results(round_results):
+                results.extend(round_results)
+                print_results(round_results)
+
+            try:
+                watch_batch(args.paths, args.watch, on_results, **options)
+            except KeyboardInterrupt:
+                print("Đã dừng theo dõi.", file=sys.stderr)
+        else:
+            results = process_batch(args.paths, **options)
+    finally:
+        if profile_capture:
+            profile_capture.stop()
+            print(f"Hồ sơ hiệu năng: {profile_capture.write_artifact(args.profile)}", file=sys.stderr)
+    if args.watch is not None:
+        summary = summarize(results)
+    else:
+        summary = print_results(results)
+
+    if args.metrics_file:
+        REGISTRY.write_textfile(args.metrics_file)
+    if metrics_server:
+        metrics_server.shutdown()
+    return 1 if summary.get("error") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import json
+import time
+import threading
+import logging
+
+from fix_plan import START_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Tên kiểu ngắt phần theo giá trị python-docx, dùng khi xuất nhật ký
+START_TYPE_NAMES = {value: name for name, value in START_TYPES.items()}
+
+
+class ChangeLog:
+    """Nhật ký các thay đổi kiểu ngắt phần, hỗ trợ hoàn tác/làm lại trong bộ nhớ.
+
+    Các thay đổi được gom theo nhóm (mỗi lần sửa là một nhóm); undo/redo áp dụng lại
+    đúng các thay đổi của nhóm nên chi phí chỉ tỉ lệ với số thay đổi, không cần phân tích lại.
+    """
+
+    def __init__(self):
+        self._groups = []
+        # Số nhóm đang được áp dụng; các nhóm phía sau có thể làm lại (redo)
+        self._position = 0
+        self._current_group = None
+        self._lock = threading.RLock()
+
+    def begin_group(self, name):
+        """Bắt đầu một nhóm thay đổi mới (ví dụ một lần fix_empty_pages)."""
+        with self._lock:
+            self._current_group = {"name": name, "time": time.time(), "changes": []}
+
+    def end_group(self):
+        """Kết thúc nhóm hiện tại; nhóm rỗng bị bỏ qua và không ảnh hưởng lịch sử làm lại."""
+        with self._lock:
+            group = self._current_group
+            self._current_group = None
+            if group and group["changes"]:
+                # Thay đổi mới sau khi hoàn tác thì không thể làm lại các nhóm cũ nữa
+                del self._groups[self._position:]
+                self._groups.append(group)
+                self._position = len(self._groups)
+
+    def record(self, section_index, old_type, new_type, source):
+        """Ghi lại một thay đổi kiểu ngắt phần."""
+        with self._lock:
+            change = {
+                "section_index": section_index,
+                "old_type": START_TYPE_NAMES.get(old_type, str(old_type)),
+                "new_type": START_TYPE_NAMES.get(new_type, str(new_type)),
+                "source": source
+            }
+            if self._current_group is not None:
+                self._current_group["changes"].append(change)
+            else:
+                del self._groups[self._position:]
+                self._groups.append({"name": source, "time": time.time(), "changes": [change]})
+                self._position = len(self._groups)
+
+    def can_undo(self):
+        with self._lock:
+            return self._position > 0
+
+    def can_redo(self):
+        with self._lock:
+            return self._position < len(self._groups)
+
+    def undo(self, document):
+        """Hoàn tác nhóm thay đổi gần nhất trên document, trả về số thay đổi đã hoàn tác."""
+        with self._lock:
+            if not self.can_undo():
+                return 0
+            self._position -= 1
+            group = self._groups[self._position]
+            sections = document.sections
+            for change in reversed(group["changes"]):
+                sections[change["section_index"]].start_type = START_TYPES[change["old_type"]]
+            logger.info(f"Đã hoàn tác {len(group['changes'])} thay đổi ({group['name']})")
+            return len(group["changes"])
+
+    def redo(self, document):
+        """Làm lại nhóm thay đổi vừa hoàn tác, trả về số thay đổi đã áp dụng lại."""
+        with self._lock:
+            if not self.can_redo():
+                return 0
+            group = self._groups[self._position]
+            self._position += 1
+            sections = document.sections
+            for change in group["changes"]:
+                sections[change["section_index"]].start_type = START_TYPES[change["new_type"]]
+            logger.info(f"Đã làm lại {len(group['changes'])} thay đổi ({group['name']})")
+            return len(group["changes"])
+
+    def to_dict(self):
+        """Trả về nhật ký dạng dict để kiểm tra/lưu vết."""
+        with self._lock:
+            return {
+                "applied_groups": self._position,
+                "groups": [dict(group, changes=list(group["changes"])) for group in self._groups]
+            }
+
+    def export(self, path):
+        """Xuất nhật ký ra tệp JSON."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=4)
+        logger.info(f"Đã xuất nhật ký thay đổi vào: {path}")
+        return path
@@ -0,0 +1,237 @@
+import os
+import sys
+import time
+import json
+import sqlite3
+import argparse
+import logging
+from urllib.request import pathname2url
+
+from batch import find_documents
+from change_log import START_TYPE_NAMES
+from fix_plan import compute_document_hash
+from fingerprint import RULES_VERSION, get_tool_version
+from word_processor_2 import EmptyPageDetector
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    file_hash TEXT NOT NULL,
+    detector_version TEXT NOT NULL,
+    analyzed_at REAL NOT NULL,
+    sections INTEGER NOT NULL DEFAULT 0,
+    empty_pages INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS sections (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    section_index INTEGER NOT NULL,
+    start_type TEXT NOT NULL,
+    is_empty INTEGER NOT NULL,
+    confidence TEXT,
+    detection_method TEXT,
+    evidence TEXT,
+    PRIMARY KEY (file_id, section_index)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_files_hash ON files(file_hash);
+CREATE INDEX IF NOT EXISTS idx_files_empty_pages ON files(empty_pages);
+CREATE INDEX IF NOT EXISTS idx_sections_type_empty ON sections(start_type, is_empty);
+"""
+
+
+def get_detector_version():
+    """Phiên bản bộ phát hiện: kết quả được phân tích lại khi công cụ hoặc quy tắc thay đổi."""
+    return f"{get_tool_version()}/{RULES_VERSION}"
+
+
+class CorpusIndex:
+    """Chỉ mục SQLite về cấu trúc phần và trang trắng của một kho tài liệu.
+
+    refresh() chỉ phân tích lại các tệp mới, tệp có mtime/kích thước thay đổi và nội dung
+    (hash) thực sự khác, hoặc tệp được phân tích bởi phiên bản bộ phát hiện cũ; các truy vấn
+    và báo cáo được trả lời trực tiếp từ chỉ mục.
+    """
+
+    def __init__(self, db_path, detector=None):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.detector = detector or EmptyPageDetector()
+        # Kết nối chỉ đọc cho query(), chỉ mở khi cần
+        self._read_connection = None
+
+    def close(self):
+        if self._read_connection is not None:
+            self._read_connection.close()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def refresh(self, paths, prune=True):
+        """Cập nhật chỉ mục cho các tệp .docx trong paths, trả về số tệp theo trạng thái
+        (analyzed, touched, unchanged, error, removed)."""
+        detector_version = get_detector_version()
+        counts = {"analyzed": 0, "touched": 0, "unchanged": 0, "error": 0, "removed": 0}
+        seen = set()
+
+        for file_path, _ in find_documents(paths):
+            file_path = os.path.abspath(file_path)
+            seen.add(file_path)
+            try:
+                stat = os.stat(file_path)
+            except OSError as e:
+                logger.warning(f"Không thể đọc thông tin tệp {file_path}: {e}")
+                counts["error"] += 1
+                continue
+
+            row = self.connection.execute(
+                "SELECT id, mtime, size, file_hash, detector_version FROM files WHERE path = ?",
+                (file_path,)).fetchone()
+            if (row and row["mtime"] == stat.st_mtime and row["size"] == stat.st_size
+                    and row["detector_version"] == detector_version):
+                counts["unchanged"] += 1
+                continue
+
+            file_hash = compute_document_hash(file_path)
+            if row and row["file_hash"] == file_hash and row["detector_version"] == detector_version:
+                # Chỉ thời gian sửa đổi thay đổi (ví dụ sao chép lại tệp): không cần phân tích lại
+                with self.connection:
+                    self.connection.execute("UPDATE files SET mtime = ?, size = ? WHERE id = ?",
+                                            (stat.st_mtime, stat.st_size, row["id"]))
+                counts["touched"] += 1
+                continue
+
+            status = self._index_file(file_path, stat, file_hash, detector_version)
+            counts[status] += 1
+
+        if prune:
+            counts["removed"] = self._prune(paths, seen)
+        return counts
+
+    def _index_file(self, file_path, stat, file_hash, detector_version):
+        """Phân tích một tệp và ghi kết quả (thay cho kết quả cũ) trong một giao dịch."""
+        error = None
+        verdicts = []
+        try:
+            context = self.detector.run_detection(file_path)
+            # Tài liệu không có phần nào là kết quả hợp lệ (rỗng), chỉ lỗi phát hiện mới là lỗi
+            verdicts = context["verdicts"]
+            error = context.get("error")
+        except Exception as e:
+            error = str(e)
+        if error:
+            logger.warning(f"Lỗi khi phân tích {file_path}: {error}")
+
+        empty_pages = sum(1 for verdict in verdicts if verdict["status"] == "empty")
+        with self.connection:
+            self.connection.execute("DELETE FROM files WHERE path = ?", (file_path,))
+            cursor = self.connection.execute(
+                "INSERT INTO files (path, mtime, size, file_hash, detector_version, analyzed_at,"
+                " sections, empty_pages, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (file_path, stat.st_mtime, stat.st_size, file_hash, detector_version, time.time(),
+                 len(verdicts), empty_pages, error))
+            self.connection.executemany(
+                "INSERT INTO sections (file_id, section_index, start_type, is_empty, confidence,"
+                " detection_method, evidence) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(cursor.lastrowid, i, START_TYPE_NAMES.get(verdict["type"], str(verdict["type"])),
+                  int(verdict["status"] == "empty"), verdict["confidence"], verdict["detection_method"],
+                  ",".join(verdict["sources"]))
+                 for i, verdict in enumerate(verdicts)])
+        return "error" if error else "analyzed"
+
+    def _prune(self, paths, seen):
+        """Xóa khỏi chỉ mục các tệp đã bị xóa khỏi thư mục được quét."""
+        roots = [os.path.abspath(path) for path in paths if os.path.isdir(path)]
+        removed = 0
+        with self.connection:
+            for root in roots:
+                prefix = os.path.join(root, "")
+                rows = self.connection.execute(
+                    "SELECT id, path FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)).fetchall()
+                for row in rows:
+                    if row["path"] not in seen:
+                        self.connection.execute("DELETE FROM files WHERE id = ?", (row["id"],))
+                        removed += 1
+        return removed
+
+    def files_with_empty_pages(self, start_type="NEW_PAGE"):
+        """Các tệp còn trang trắng do ngắt phần kiểu start_type (None để lấy mọi kiểu)."""
+        sql = ("SELECT f.path, f.file_hash, f.analyzed_at, COUNT(*) AS empty_pages,"
+               " GROUP_CONCAT(s.section_index) AS sections"
+               " FROM sections s JOIN files f ON f.id = s.file_id WHERE s.is_empty = 1")
+        params = ()
+        if start_type is not None:
+            sql += " AND s.start_type = ?"
+            params = (start_type,)
+        sql += " GROUP BY f.id ORDER BY f.path"
+        return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def summary(self):
+        """Tổng hợp toàn kho: số tệp, số tệp có trang trắng, số phần theo kiểu ngắt và số lỗi."""
+        files = self.connection.execute(
+            "SELECT COUNT(*) AS files, COALESCE(SUM(empty_pages > 0), 0) AS files_with_empty_pages,"
+            " COALESCE(SUM(empty_pages), 0) AS empty_pages, COUNT(error) AS errors FROM files").fetchone()
+        section_types = {
+            row["start_type"]: {"sections": row["sections"], "empty": row["empty"]}
+            for row in self.connection.execute(
+                "SELECT start_type, COUNT(*) AS sections, SUM(is_empty) AS empty"
+                " FROM sections GROUP BY start_type ORDER BY start_type")
+        }
+        return dict(files, section_types=section_types)
+
+    def query(self, sql, params=()):
+        """Chạy truy vấn tùy ý trên chỉ mục qua kết nối chỉ đọc; câu lệnh ghi gây sqlite3.OperationalError."""
+        if self.db_path == ":memory:":
+            # Cơ sở dữ liệu trong bộ nhớ không mở lại được: chặn ghi trên kết nối chung khi truy vấn
+            self.connection.execute("PRAGMA query_only = ON")
+            try:
+                return [dict(row) for row in self.connection.execute(sql, params)]
+            finally:
+                self.connection.execute("PRAGMA query_only = OFF")
+        if self._read_connection is None:
+            uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+            self._read_connection = sqlite3.connect(uri, uri=True)
+            self._read_connection.row_factory = sqlite3.Row
+        return [dict(row) for row in self._read_connection.execute(sql, params)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chỉ mục SQLite về cấu trúc phần và trang trắng của kho tài liệu")
+    parser.add_argument("database", help="Tệp cơ sở dữ liệu SQLite")
+    commands = parser.add_subparsers(dest="command", required=True)
+    refresh_parser = commands.add_parser("refresh", help="Cập nhật chỉ mục (chỉ phân tích tệp đã thay đổi)")
+    refresh_parser.add_argument("paths", nargs="+", help="Tệp .docx hoặc thư mục")
+    refresh_parser.add_argument("--no-prune", action="store_true", help="Giữ lại các tệp đã bị xóa trong chỉ mục")
+    empty_parser = commands.add_parser("empty", help="Liệt kê các tệp còn trang trắng")
+    empty_parser.add_argument("--start-type", default="NEW_PAGE", help="Kiểu ngắt phần (ALL cho mọi kiểu)")
+    commands.add_parser("summary", help="Thống kê toàn kho")
+    args = parser.parse_args(argv)
+
+    with CorpusIndex(args.database) as index:
+        if args.command == "refresh":
+            result = index.refresh(args.paths, prune=not args.no_prune)
+        elif args.command == "empty":
+            result = index.files_with_empty_pages(None if args.start_type == "ALL" else args.start_type)
+        else:
+            result = index.summary()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+import os
+import io
+import sys
+import json
+import hashlib
+import zipfile
+import posixpath
+import logging
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+MC_NS = "http://schemas.openxmlformats.org/markup-compatibility/2006"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+W = f"{{{W_NS}}}"
+TAG_P = W + "p"
+TAG_TBL = W + "tbl"
+TAG_T = W + "t"
+TAG_BR = W + "br"
+TAG_SECT_PR = W + "sectPr"
+TAG_TYPE = W + "type"
+TAG_DRAWING = W + "drawing"
+TAG_PICT = W + "pict"
+# Hình có bản dự phòng VML nằm trong mc:AlternateContent: chỉ đếm nhánh mc:Choice
+TAG_MC_FALLBACK = f"{{{MC_NS}}}Fallback"
+ATTR_VAL = W + "val"
+ATTR_TYPE = W + "type"
+# Thuộc tính rsid chỉ ghi lịch sử sửa đổi, không ảnh hưởng bố cục trang
+LAYOUT_IGNORED_ATTRS = ("rsidR", "rsidRPr", "rsidSect", "rsidDel")
+TAG_HEADER_REFERENCE = W + "headerReference"
+TAG_FOOTER_REFERENCE = W + "footerReference"
+
+DEFAULT_DOCUMENT_PART = "word/document.xml"
+
+
+def open_zip_source(source):
+    """Mở tài liệu .docx dạng zip từ đường dẫn, bytes hoặc đối tượng file-like."""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return zipfile.ZipFile(source)
+
+
+def find_document_part(zip_file):
+    """Tìm tên phần XML chính của tài liệu qua _rels/.rels, mặc định word/document.xml."""
+    try:
+        with zip_file.open("_rels/.rels") as f:
+            for _, element in ET.iterparse(f):
+                if element.tag == f"{{{REL_NS}}}Relationship" and element.get("Type") == OFFICE_DOCUMENT_REL:
+                    return posixpath.normpath(element.get("Target").lstrip("/"))
+    except KeyError:
+        pass
+    return DEFAULT_DOCUMENT_PART
+
+
+def _new_section_stats():
+    return {
+        "start_type": "nextPage",
+        "paragraphs": 0,
+        "non_empty_paragraphs": 0,
+        "tables": 0,
+        "images": 0,
+        "page_breaks": 0
+    }
+
+
+def section_layout(sect_pr):
+    """Chuỗi chuẩn hóa các thiết lập của một sectPr (khổ giấy, lề, cột, kiểu ngắt, trang đầu khác...).
+
+    Tham chiếu header/footer chỉ giữ loại (default/first/even), không giữ r:id.
+    """
+    parts = []
+    for child in sect_pr:
+        name = child.tag.rsplit("}", 1)[-1]
+        if child.tag in (TAG_HEADER_REFERENCE, TAG_FOOTER_REFERENCE):
+            parts.append(f"{name}:{child.get(ATTR_TYPE, 'default')}")
+        elif not name.endswith("Change"):
+            attrs = sorted((key.rsplit("}", 1)[-1], value) for key, value in child.attrib.items()
+                           if key.rsplit("}", 1)[-1] not in LAYOUT_IGNORED_ATTRS)
+            parts.append(name + "".join(f" {key}={value}" for key, value in attrs))
+    return ";".join(parts)
+
+
+def read_document_stats(source, fingerprints=False, layout=False):
+    """Đọc nhanh số phần, đoạn văn, bảng, hình ảnh và ngắt trực tiếp từ XML.
+
+    Không tạo đối tượng python-docx; XML được đọc dạng luồng nên bộ nhớ gần như không
+    phụ thuộc vào kích thước tài liệu. Số đoạn văn và bảng chỉ tính ở cấp body, giống
+    document.paragraphs và document.tables của python-docx.
+
+    Nếu fingerprints=True, mỗi phần trong sections_detail có thêm "fingerprint": SHA-256 của
+    XML các phần tử body thuộc phần đó (kể cả sectPr), dùng để nhận ra phần không đổi giữa
+    các phiên bản tài liệu.
+
+    Nếu layout=True, mỗi phần có thêm "layout": thiết lập sectPr đã chuẩn hóa (xem section_layout).
+    """
+    stats = {
+        "sections": 0,
+        "paragraphs": 0,
+        "non_empty_paragraphs": 0,
+        "all_paragraphs": 0,
+        "tables": 0,
+        "images": 0,
+        "page_breaks": 0,
+        "column_breaks": 0,
+        "section_types": {},
+        "sections_detail": []
+    }
+
+    with open_zip_source(source) as zip_file:
+        document_part = find_document_part(zip_file)
+        with zip_file.open(document_part) as f:
+            current_section = _new_section_stats()
+            depth = 0
+            in_sect_pr = False
+            # Bỏ qua sectPr/pPr cũ nằm trong các thẻ theo dõi thay đổi (w:sectPrChange, w:pPrChange)
+            change_depth = 0
+            fallback_depth = 0
+            paragraph_has_text = False
+            section_ends_with_paragraph = False
+            section_hash = hashlib.sha256() if fingerprints else None
+
+            def finish_section():
+                nonlocal section_hash
+                if fingerprints:
+                    current_section["fingerprint"] = section_hash.hexdigest()
+                    section_hash = hashlib.sha256()
+                stats["sections"] += 1
+                start_type = current_section["start_type"]
+                stats["section_types"][start_type] = stats["section_types"].get(start_type, 0) + 1
+                stats["sections_detail"].append(current_section)
+                return _new_section_stats()
+
+            for event, element in ET.iterparse(f, events=("start", "end")):
+                tag = element.tag
+                if event == "start":
+                    depth += 1
+                    if tag.endswith("Change"):
+                        change_depth += 1
+                    elif tag == TAG_MC_FALLBACK:
+                        fallback_depth += 1
+                    elif tag == TAG_SECT_PR and not change_depth:
+                        in_sect_pr = True
+                    elif tag == TAG_P and depth == 3:
+                        paragraph_has_text = False
+                    continue
+
+                depth -= 1
+                if tag.endswith("Change"):
+                    change_depth -= 1
+                elif tag == TAG_MC_FALLBACK:
+                    fallback_depth -= 1
+                elif tag == TAG_T:
+                    if element.text and element.text.strip():
+                        paragraph_has_text = True
+                elif tag == TAG_P:
+                    stats["all_paragraphs"] += 1
+                elif tag == TAG_BR:
+                    break_type = element.get(ATTR_TYPE)
+                    if break_type == "page":
+                        stats["page_breaks"] += 1
+                        current_section["page_breaks"] += 1
+                    elif break_type == "column":
+                        stats["column_breaks"] += 1
+                elif tag in (TAG_DRAWING, TAG_PICT) and not fallback_depth:
+                    stats["images"] += 1
+                    current_section["images"] += 1
+                elif tag == TAG_TYPE and in_sect_pr and not change_depth:
+                    current_section["start_type"] = element.get(ATTR_VAL, "nextPage")
+                elif tag == TAG_SECT_PR and not change_depth:
+                    in_sect_pr = False
+                    if layout:
+                        current_section["layout"] = section_layout(element)
+                    if depth == 2:
+                        # sectPr cuối body kết thúc phần cuối cùng
+                        if fingerprints:
+                            section_hash.update(ET.tostring(element))
+                        current_section = finish_section()
+                    else:
+                        # sectPr trong pPr: đoạn văn chứa nó là đoạn cuối của phần
+                        section_ends_with_paragraph = True
+
+                # Các phần tử con trực tiếp của body
+                if depth == 2:
+                    if fingerprints and tag != TAG_SECT_PR:
+                        section_hash.update(ET.tostring(element))
+                    if tag == TAG_P:
+                        stats["paragraphs"] += 1
+                        current_section["paragraphs"] += 1
+                        if paragraph_has_text:
+                            stats["non_empty_paragraphs"] += 1
+                            current_section["non_empty_paragraphs"] += 1
+                        if section_ends_with_paragraph:
+                            section_ends_with_paragraph = False
+                            current_section = finish_section()
+                    elif tag == TAG_TBL:
+                        stats["tables"] += 1
+                        current_section["tables"] += 1
+                    # Giải phóng phần tử đã đọc xong để giữ bộ nhớ thấp
+                    element.clear()
+
+    return stats
+
+
+def main():
+    """In thống kê của các tệp .docx (hoặc mọi tệp .docx trong thư mục) dưới dạng JSON, mỗi tệp một dòng."""
+    paths = []
+    for arg in sys.argv[1:]:
+        if os.path.isdir(arg):
+            for dir_path, _, file_names in os.walk(arg):
+                paths.extend(os.path.join(dir_path, name) for name in sorted(file_names)
+                             if name.lower().endswith(".docx") and not name.startswith("~$"))
+        else:
+            paths.append(arg)
+
+    if not paths:
+        print("Cách dùng: python docx_stats.py <tệp.docx|thư mục> ...")
+        return 1
+
+    exit_code = 0
+    for path in paths:
+        try:
+            stats = read_document_stats(path)
+            stats.pop("sections_detail")
+            print(json.dumps({"path": path, **stats}, ensure_ascii=False))
+        except Exception as e:
+            print(json.dumps({"path": path, "error": str(e)}, ensure_ascii=False))
+            exit_code = 2
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+import os
+import io
+import json
+import functools
+import zlib
+import hashlib
+import zipfile
+import logging
+import xml.etree.ElementTree as ET
+
+from docx_stats import open_zip_source
+from metrics import FINGERPRINT_CHECKS
+
+try:
+    from update import get_application_path
+except ImportError:
+    # Nếu không import được, định nghĩa hàm tạm thời
+    def get_application_path():
+        return os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger(__name__)
+
+# Phiên bản bộ quy tắc phát hiện trang trắng; tăng lên khi quy tắc thay đổi để các tệp
+# đã xử lý bằng quy tắc cũ được phân tích lại
+RULES_VERSION = "1"
+
+CUSTOM_PROPS_PART = "docProps/custom.xml"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+PACKAGE_RELS_PART = "_rels/.rels"
+
+CUSTOM_PROPS_NS = "http://schemas.openxmlformats.org/officeDocument/2006/custom-properties"
+VT_NS = "http://schemas.openxmlformats.org/officeDocument/2006/docPropsVTypes"
+CONTENT_TYPES_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CUSTOM_PROPS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/custom-properties"
+CUSTOM_PROPS_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.custom-properties+xml"
+# FMTID bắt buộc cho thuộc tính tùy chỉnh do người dùng định nghĩa
+CUSTOM_PROPS_FMTID = "{D5CDD505-2E9C-101B-9397-08002B2CF9AE}"
+
+MARKER_PROPERTIES = {
+    "tool_version": "AutoOfficeToolVersion",
+    "rules_version": "AutoOfficeRulesVersion",
+    "content_hash": "AutoOfficeContentHash",
+    # Hash nội dung của tệp gốc đã sinh ra tệp này, để chế độ --output-dir nhận ra tệp đầu ra còn hợp lệ
+    "source_hash": "AutoOfficeSourceHash"
+}
+
+
+@functools.lru_cache(maxsize=1)
+def get_tool_version():
+    """Đọc phiên bản ứng dụng từ version.json."""
+    try:
+        with open(os.path.join(get_application_path(), "version.json"), 'r', encoding='utf-8') as f:
+            return json.load(f).get("version", "1.0.0")
+    except Exception:
+        return "1.0.0"
+
+
+def _content_hash(entries):
+    """Hash nội dung từ (tên, CRC32, kích thước) của các phần trong zip, trừ phần thuộc tính tùy chỉnh.
+
+    Các giá trị này nằm sẵn trong central directory nên kiểm tra không cần giải nén.
+    """
+    sha256 = hashlib.sha256()
+    for name, crc, size in sorted(entries):
+        if name == CUSTOM_PROPS_PART:
+            continue
+        sha256.update(f"{name}\0{crc:08x}\0{size}\n".encode("utf-8"))
+    return sha256.hexdigest()
+
+
+def compute_content_hash(zip_file):
+    """Tính hash nội dung của một ZipFile đã mở chỉ từ central directory."""
+    return _content_hash((info.filename, info.CRC, info.file_size) for info in zip_file.infolist())
+
+
+def _ensure_content_type(data):
+    """Thêm Override cho docProps/custom.xml vào [Content_Types].xml nếu chưa có."""
+    ET.register_namespace("", CONTENT_TYPES_NS)
+    root = ET.fromstring(data)
+    for override in root.findall(f"{{{CONTENT_TYPES_NS}}}Override"):
+        if override.get("PartName") == "/" + CUSTOM_PROPS_PART:
+            return data
+    ET.SubElement(root, f"{{{CONTENT_TYPES_NS}}}Override",
+                  {"PartName": "/" + CUSTOM_PROPS_PART, "ContentType": CUSTOM_PROPS_CONTENT_TYPE})
+    return ET.tostring(root, encoding="UTF-8", xml_declaration=True)
+
+
+def _ensure_relationship(data):
+    """Thêm quan hệ custom-properties vào _rels/.rels nếu chưa có."""
+    ET.register_namespace("", REL_NS)
+    root = ET.fromstring(data)
+    ids = set()
+    for rel in root.findall(f"{{{REL_NS}}}Relationship"):
+        if rel.get("Type") == CUSTOM_PROPS_REL:
+            return data
+        ids.add(rel.get("Id"))
+    next_id = 1
+    while f"rId{next_id}" in ids:
+        next_id += 1
+    ET.SubElement(root, f"{{{REL_NS}}}Relationship",
+                  {"Id": f"rId{next_id}", "Type": CUSTOM_PROPS_REL, "Target": CUSTOM_PROPS_PART})
+    return ET.tostring(root, encoding="UTF-8", xml_declaration=True)
+
+
+def _build_custom_props(existing_data, marker):
+    """Tạo docProps/custom.xml chứa dấu đã xử lý, giữ nguyên các thuộc tính khác của người dùng."""
+    ET.register_namespace("", CUSTOM_PROPS_NS)
+    ET.register_namespace("vt", VT_NS)
+    if existing_data:
+        root = ET.fromstring(existing_data)
+    else:
+        root = ET.Element(f"{{{CUSTOM_PROPS_NS}}}Properties")
+
+    marker_names = set(MARKER_PROPERTIES.values())
+    for prop in list(root):
+        if prop.get("name") in marker_names:
+            root.remove(prop)
+
+    next_pid = max([int(prop.get("pid", 1)) for prop in root] + [1]) + 1
+    for key, name in MARKER_PROPERTIES.items():
+        if marker.get(key) is None:
+            continue
+        prop = ET.SubElement(root, f"{{{CUSTOM_PROPS_NS}}}property",
+                             {"fmtid": CUSTOM_PROPS_FMTID, "pid": str(next_pid), "name": name})
+        value = ET.SubElement(prop, f"{{{VT_NS}}}lpwstr")
+        value.text = marker[key]
+        next_pid += 1
+
+    return ET.tostring(root, encoding="UTF-8", xml_declaration=True)
+
+
+def compute_source_hash(source):
+    """Hash nội dung của tài liệu (đường dẫn, bytes hoặc file-like), chỉ đọc central directory."""
+    with open_zip_source(source) as zip_file:
+        return compute_content_hash(zip_file)
+
+
+def stamp_marker(docx_bytes, tool_version=None, rules_version=RULES_VERSION, source_hash=None):
+    """Trả về bản sao tài liệu có dấu đã xử lý (phiên bản công cụ, phiên bản quy tắc, hash nội dung).
+
+    source_hash (xem compute_source_hash) là hash của tệp gốc, ghi kèm khi tệp được lưu ra nơi khác.
+    """
+    with zipfile.ZipFile(io.BytesIO(docx_bytes)) as source_zip:
+        infos = source_zip.infolist()
+        parts = {info.filename: source_zip.read(info.filename) for info in infos}
+
+    parts[CONTENT_TYPES_PART] = _ensure_content_type(parts[CONTENT_TYPES_PART])
+    parts[PACKAGE_RELS_PART] = _ensure_relationship(parts[PACKAGE_RELS_PART])
+
+    content_hash = _content_hash((name, zlib.crc32(data), len(data)) for name, data in parts.items())
+    marker = {
+        "tool_version": tool_version or get_tool_version(),
+        "rules_version": rules_version,
+        "content_hash": content_hash,
+        "source_hash": source_hash
+    }
+    parts[CUSTOM_PROPS_PART] = _build_custom_props(parts.get(CUSTOM_PROPS_PART), marker)
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as target_zip:
+        written = set()
+        for info in infos:
+            target_zip.writestr(info.filename, parts[info.filename])
+            written.add(info.filename)
+        if CUSTOM_PROPS_PART not in written:
+            target_zip.writestr(CUSTOM_PROPS_PART, parts[CUSTOM_PROPS_PART])
+
+    return output.getvalue()
+
+
+def read_marker(source):
+    """Đọc dấu đã xử lý từ tài liệu, chỉ đọc central directory và docProps/custom.xml.
+
+    Trả về dict gồm tool_version, rules_version, content_hash (stored), source_hash (None nếu
+    không ghi) và current_hash (tính lại từ central directory), hoặc None nếu không có dấu.
+    """
+    with open_zip_source(source) as zip_file:
+        try:
+            data = zip_file.read(CUSTOM_PROPS_PART)
+        except KeyError:
+            return None
+        current_hash = compute_content_hash(zip_file)
+
+    values = {}
+    for prop in ET.fromstring(data):
+        name = prop.get("name")
+        if name in MARKER_PROPERTIES.values() and len(prop):
+            values[name] = prop[0].text
+
+    if MARKER_PROPERTIES["content_hash"] not in values:
+        return None
+
+    marker = {key: values.get(name) for key, name in MARKER_PROPERTIES.items()}
+    marker["current_hash"] = current_hash
+    return marker
+
+
+def _is_current(marker, tool_version, rules_version):
+    """Dấu được ghi bởi cùng phiên bản công cụ/quy tắc và tài liệu chưa bị sửa sau đó."""
+    return bool(marker) and (marker["tool_version"] == (tool_version or get_tool_version())
+                             and marker["rules_version"] == rules_version
+                             and marker["content_hash"] == marker["current_hash"])
+
+
+def is_already_processed(source, tool_version=None, rules_version=RULES_VERSION):
+    """Kiểm tra tài liệu đã được xử lý bởi cùng phiên bản công cụ/quy tắc và chưa bị sửa sau đó."""
+    try:
+        marker = read_marker(source)
+    except Exception as e:
+        logger.warning(f"Không thể đọc dấu đã xử lý: {e}")
+        return False
+
+    processed = _is_current(marker, tool_version, rules_version)
+    FINGERPRINT_CHECKS.inc(result="hit" if processed else "miss")
+    return processed
+
+
+def is_output_current(source, output_path, tool_version=None, rules_version=RULES_VERSION):
+    """Kiểm tra output_path là kết quả hợp lệ của chính tài liệu source hiện tại.
+
+    Dùng khi ghi ra thư mục khác (tệp gốc không được đóng dấu): tệp đầu ra phải có dấu hợp lệ
+    và source_hash trong dấu phải khớp với tệp gốc, nên sửa tệp gốc sẽ làm nó được xử lý lại.
+    """
+    if not os.path.exists(output_path):
+        return False
+    try:
+        marker = read_marker(output_path)
+        current = (_is_current(marker, tool_version, rules_version)
+                   and marker["source_hash"] == compute_source_hash(source))
+    except Exception as e:
+        logger.warning(f"Không thể đọc dấu đã xử lý của tệp đầu ra: {e}")
+        return False
+
+    FINGERPRINT_CHECKS.inc(result="hit" if current else "miss")
+    return current
@@ -0,0 +1,153 @@
+import os
+import io
+import json
+import hashlib
+import logging
+from docx import Document
+from docx.enum.section import WD_SECTION_START
+
+logger = logging.getLogger(__name__)
+
+# Phiên bản định dạng kế hoạch sửa, tăng lên khi cấu trúc thay đổi
+FIX_PLAN_VERSION = 1
+
+# Tên kiểu ngắt phần dùng trong kế hoạch sửa
+START_TYPES = {
+    "CONTINUOUS": WD_SECTION_START.CONTINUOUS,
+    "NEW_COLUMN": WD_SECTION_START.NEW_COLUMN,
+    "NEW_PAGE": WD_SECTION_START.NEW_PAGE,
+    "EVEN_PAGE": WD_SECTION_START.EVEN_PAGE,
+    "ODD_PAGE": WD_SECTION_START.ODD_PAGE
+}
+
+# Chỉ ngắt phần Next Page mới được chuyển khi sửa trang trắng (giống PageAnalyzer.fix_empty_pages)
+FIXABLE_TYPE = "NEW_PAGE"
+# Chỉ kết luận có độ tin cậy này mới được sửa (giống PageAnalyzer.fix_empty_pages)
+FIXABLE_CONFIDENCE = "high"
+
+
+def compute_document_hash(file_path, chunk_size=65536):
+    """Tính hash SHA-256 của tài liệu (đường dẫn tệp hoặc bytes)."""
+    if isinstance(file_path, (bytes, bytearray)):
+        return hashlib.sha256(file_path).hexdigest()
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def create_fix_plan(file_path, empty_pages, target_type="CONTINUOUS", file_name=None):
+    """Tạo kế hoạch sửa từ danh sách trang trắng đã phát hiện.
+
+    Chỉ ghi các phần Next Page (kiểu ngắt thực sự đổi) có độ tin cậy cao, như sửa trực tiếp;
+    mỗi thay đổi có "from_type" để apply_fix_plan không đổi nhầm phần có kiểu khác, kể cả khi
+    bỏ qua kiểm tra hash, và "confidence" để apply_fix_plan từ chối kế hoạch bị sửa tay.
+    file_path có thể là bytes của tài liệu, khi đó nên truyền thêm file_name.
+    """
+    if file_name is None and isinstance(file_path, str):
+        file_name = os.path.basename(file_path)
+
+    changes = []
+    for page in sorted(empty_pages, key=lambda page: page['section_index']):
+        if page.get('type', START_TYPES[FIXABLE_TYPE]) != START_TYPES[FIXABLE_TYPE] or target_type == FIXABLE_TYPE:
+            continue
+        confidence = page.get('confidence', FIXABLE_CONFIDENCE)
+        if confidence != FIXABLE_CONFIDENCE:
+            logger.info(f"Không đưa phần {page['section_index']} vào kế hoạch sửa: độ tin cậy {confidence}")
+            continue
+        changes.append({
+            "section_index": page['section_index'],
+            "from_type": FIXABLE_TYPE,
+            "start_type": target_type,
+            "confidence": confidence
+        })
+
+    return {
+        "version": FIX_PLAN_VERSION,
+        "file_name": file_name,
+        "file_hash": compute_document_hash(file_path),
+        "changes": changes
+    }
+
+
+def save_fix_plan(plan, plan_path):
+    """Ghi kế hoạch sửa ra tệp JSON."""
+    with open(plan_path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, ensure_ascii=False, separators=(',', ':'))
+    logger.info(f"Đã lưu kế hoạch sửa vào: {plan_path}")
+    return plan_path
+
+
+def load_fix_plan(plan_path):
+    """Đọc và kiểm tra kế hoạch sửa từ tệp JSON."""
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        plan = json.load(f)
+
+    if plan.get("version") != FIX_PLAN_VERSION:
+        raise ValueError(f"Phiên bản kế hoạch sửa không được hỗ trợ: {plan.get('version')}")
+    for change in plan.get("changes", []):
+        if change.get("start_type") not in START_TYPES:
+            raise ValueError(f"Kiểu ngắt phần không hợp lệ trong kế hoạch sửa: {change.get('start_type')}")
+        if change.get("from_type", FIXABLE_TYPE) not in START_TYPES:
+            raise ValueError(f"Kiểu ngắt phần không hợp lệ trong kế hoạch sửa: {change.get('from_type')}")
+
+    return plan
+
+
+def apply_fix_plan(plan, docx_path, output_path=None, verify_hash=True):
+    """Áp dụng kế hoạch sửa lên tệp mà không cần phân tích lại.
+
+    docx_path có thể là bytes và output_path có thể là đối tượng file-like.
+    Trả về số thay đổi đã thực hiện, hoặc False nếu tệp không khớp với kế hoạch.
+    """
+    try:
+        if verify_hash and compute_document_hash(docx_path) != plan["file_hash"]:
+            source_name = docx_path if isinstance(docx_path, str) else plan.get("file_name") or "<bộ nhớ>"
+            logger.error(f"Tệp {source_name} đã thay đổi so với khi tạo kế hoạch sửa "
+                         f"(hash kế hoạch {plan['file_hash'][:12]})")
+            return False
+
+        if isinstance(docx_path, (bytes, bytearray)):
+            document = Document(io.BytesIO(docx_path))
+        else:
+            document = Document(docx_path)
+        sections = document.sections
+        total_sections = len(sections)
+        changes_made = 0
+
+        for change in plan["changes"]:
+            section_index = change["section_index"]
+            if not 0 <= section_index < total_sections:
+                logger.warning(f"Bỏ qua phần {section_index} nằm ngoài phạm vi tài liệu")
+                continue
+
+            # Kế hoạch cũ (không có confidence) chỉ được tạo từ kết luận đã được sửa trực tiếp
+            if change.get("confidence", FIXABLE_CONFIDENCE) != FIXABLE_CONFIDENCE:
+                logger.warning(f"Bỏ qua phần {section_index}: độ tin cậy {change['confidence']} chưa đủ để sửa")
+                continue
+
+            section = sections[section_index]
+            target_type = START_TYPES[change["start_type"]]
+            # Kế hoạch cũ (không có from_type) chỉ ghi các phần Next Page
+            from_type = START_TYPES[change.get("from_type", FIXABLE_TYPE)]
+            if section.start_type not in (from_type, target_type):
+                logger.warning(f"Bỏ qua phần {section_index}: kiểu ngắt hiện tại khác với khi tạo kế hoạch")
+                continue
+            if section.start_type != target_type:
+                section.start_type = target_type
+                changes_made += 1
+
+        if not output_path:
+            if not isinstance(docx_path, str):
+                raise ValueError("Cần chỉ định nơi lưu khi tài liệu được truyền dưới dạng bytes")
+            file_name, file_ext = os.path.splitext(docx_path)
+            output_path = f"{file_name}_fixed{file_ext}"
+
+        document.save(output_path)
+        logger.info(f"Đã áp dụng {changes_made} thay đổi từ kế hoạch sửa")
+        return changes_made
+
+    except Exception as e:
+        logger.error(f"Lỗi khi áp dụng kế hoạch sửa: {e}")
+        return False
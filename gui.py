@@ -6,13 +6,33 @@ import os
 from PIL import Image, ImageTk
 import logging
 
+from profiling import ProfileCapture
+try:
+    from update import get_application_path
+except ImportError:
+    # Nếu không import được, định nghĩa hàm tạm thời
+    def get_application_path():
+        return os.path.dirname(os.path.abspath(__file__))
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Nhãn hiển thị cho các giai đoạn xử lý được WordProcessor báo về
+STAGE_LABELS = {
+    "open": "Đang mở tệp",
+    "analyze": "Đang phân tích tệp",
+    "page_count": "Đang đếm số trang",
+    "detect": "Đang phát hiện trang trắng",
+    "fix": "Đang xử lý tệp",
+    "save": "Đang lưu tệp"
+}
+
 class AutoOfficeGUI:
-    def __init__(self, root, word_processor, updater=None):
+    def __init__(self, root, session_manager, updater=None):
         self.root = root
-        self.word_processor = word_processor
+        # Mỗi tệp có một phiên riêng để phân tích/xử lý nhiều tệp cùng lúc không ảnh hưởng nhau
+        self.sessions = session_manager
+        self.current_session_id = None
         self.updater = updater
         
         # Thiết lập cửa sổ chính
@@ -28,6 +48,9 @@ class AutoOfficeGUI:
         self.file_path = tk.StringVar()
         self.status_text = tk.StringVar(value="Sẵn sàng")
         self.progress_value = tk.DoubleVar(value=0)
+        self.debug_mode = tk.BooleanVar(value=False)
+        # Hồ sơ hiệu năng được ghi trong khi bật chế độ debug
+        self.profile_capture = None
         
         # Tạo logo nếu có
         self.logo_image = None
@@ -36,6 +59,9 @@ class AutoOfficeGUI:
         # Tạo giao diện
         self.create_widgets()
         
+        # Nhận tiến trình thực tế từ các phiên tài liệu
+        self.sessions.progress_callback = self.on_progress_event
+        
         # Kiểm tra cập nhật nếu có
         if self.updater:
             self.check_for_updates()
@@ -109,6 +135,10 @@ class AutoOfficeGUI:
         check_update_button = ctk.CTkButton(control_frame, text="Kiểm tra cập nhật", command=self.manual_check_update)
         check_update_button.pack(side=tk.LEFT, padx=10)
         
+        debug_checkbox = ctk.CTkCheckBox(control_frame, text="Chế độ debug", variable=self.debug_mode,
+                                         command=self.toggle_debug_mode)
+        debug_checkbox.pack(side=tk.RIGHT, padx=10)
+        
         # Khu vực hiển thị kết quả
         self.result_text = tk.Text(result_frame, height=15, wrap=tk.WORD)
         self.result_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -134,6 +164,51 @@ class AutoOfficeGUI:
         )
         version_label.pack(side=tk.RIGHT, padx=10)
     
+    def on_progress_event(self, event):
+        """Nhận sự kiện tiến trình từ luồng xử lý và chuyển sang luồng giao diện."""
+        self.root.after(0, self.apply_progress_event, event)
+    
+    def apply_progress_event(self, event):
+        """Cập nhật thanh tiến trình và trạng thái theo sự kiện tiến trình."""
+        label = STAGE_LABELS.get(event["stage"])
+        if event["event"] == "start" and label:
+            self.status_text.set(f"{label}...")
+        elif event["event"] == "progress" and event.get("total"):
+            self.progress_value.set(event["current"] / event["total"])
+    
+    def toggle_debug_mode(self):
+        """Bật/tắt chế độ debug; khi tắt, hồ sơ hiệu năng của cả thời gian debug được ghi ra tệp."""
+        enabled = self.debug_mode.get()
+        self.sessions.set_debug_mode(enabled)
+        
+        if enabled:
+            # Chỉ lấy mẫu khi có thao tác đang chạy, không lấy mẫu lúc giao diện chờ người dùng
+            self.profile_capture = ProfileCapture(sample_idle=False)
+            self.profile_capture.start()
+            self.sessions.set_profile_capture(self.profile_capture)
+            self.status_text.set("Đã bật chế độ debug, đang ghi hồ sơ hiệu năng")
+            return
+            
+        capture = self.profile_capture
+        self.profile_capture = None
+        self.sessions.set_profile_capture(None)
+        if capture is None:
+            return
+            
+        def write_profile_task():
+            try:
+                capture.stop()
+                path = capture.write_artifact(os.path.join(get_application_path(), "profiles"))
+                self.root.after(0, lambda: self.result_text.insert(tk.END, f"\n\nĐã ghi hồ sơ hiệu năng vào: {path}"))
+                self.root.after(0, lambda: self.status_text.set("Đã tắt chế độ debug"))
+            except Exception as e:
+                logger.error(f"Lỗi khi ghi hồ sơ hiệu năng: {e}")
+                self.root.after(0, lambda: self.status_text.set("Không thể ghi hồ sơ hiệu năng"))
+        
+        thread = threading.Thread(target=write_profile_task)
+        thread.daemon = True
+        thread.start()
+    
     def browse_file(self):
         """Mở hộp thoại chọn tệp Word."""
         file_path = filedialog.askopenfilename(
@@ -158,13 +233,30 @@ class AutoOfficeGUI:
         self.status_text.set("Đang phân tích tệp...")
         self.progress_value.set(0.2)
         
+        self.current_session_id = file_path
+        
         # Sử dụng thread để không làm treo giao diện
         def analyze_task():
-            if self.word_processor.open_document(file_path):
-                sections_info = self.word_processor.analyze_document()
+            # Ghim phiên từ lúc mở đến khi đọc xong thông tin để không bị giải phóng giữa chừng
+            with self.sessions.use(file_path) as session:
+                analyze_session(session)
+        
+        def analyze_session(session):
+            if session.open(file_path):
+                # Hiển thị các phần ngay khi đọc được, kết quả đầy đủ sẽ thay thế khi phân tích xong
+                self.root.after(0, self.insert_result, file_path, "Các ngắt phần được tìm thấy (đang phân tích...):\n")
+                for record in session.iter_analysis():
+                    if record['event'] == 'section':
+                        line = f"- Phần {record['index'] + 1}: Kiểu: {record['type_name']}\n"
+                        self.root.after(0, self.insert_result, file_path, line)
+                    elif record['event'] == 'verdict' and record['is_empty_page']:
+                        line = f"  Phần {record['index'] + 1} gây ra trang trắng ⚠️\n"
+                        self.root.after(0, self.insert_result, file_path, line)
                 
+                sections_info = session.processor.sections_info
+                doc_info = session.get_document_info()
                 if sections_info:
-                    self.root.after(0, self.update_analysis_results, sections_info)
+                    self.root.after(0, self.update_analysis_results, sections_info, doc_info, file_path)
                 else:
                     self.root.after(0, lambda: self.status_text.set("Không thể phân tích tệp."))
             else:
@@ -175,13 +267,21 @@ class AutoOfficeGUI:
         thread.daemon = True
         thread.start()
     
-    def update_analysis_results(self, sections_info):
+    def insert_result(self, session_id, text):
+        """Thêm kết quả vào khung hiển thị nếu vẫn là tệp đang được chọn."""
+        if session_id == self.current_session_id:
+            self.result_text.insert(tk.END, text)
+    
+    def update_analysis_results(self, sections_info, doc_info=None, session_id=None):
         """Cập nhật kết quả phân tích."""
+        # Kết quả của một tệp khác đã được chọn sau đó thì không hiển thị đè lên
+        if session_id is not None and session_id != self.current_session_id:
+            return
+            
         self.result_text.delete(1.0, tk.END)
         
         self.result_text.insert(tk.END, "Kết quả phân tích tài liệu Word:\n\n")
         
-        doc_info = self.word_processor.get_document_info()
         if doc_info:
             self.result_text.insert(tk.END, f"Tài liệu có {doc_info['sections']} phần, {doc_info['paragraphs']} đoạn văn, {doc_info['tables']} bảng.\n\n")
         
@@ -207,9 +307,17 @@ class AutoOfficeGUI:
         
         self.progress_value.set(1.0)
     
+    def get_current_session(self):
+        """Trả về phiên của tệp đang chọn nếu đã được mở."""
+        session = self.sessions.get_session(self.file_path.get(), create=False)
+        if session is None or not session.has_document:
+            return None
+        return session
+    
     def process_document(self):
         """Xử lý tài liệu để loại bỏ trang trắng."""
-        if not self.word_processor.document:
+        session = self.get_current_session()
+        if not session:
             messagebox.showwarning("Cảnh báo", "Vui lòng phân tích tệp trước!")
             return
         
@@ -218,9 +326,9 @@ class AutoOfficeGUI:
         
         # Sử dụng thread để không làm treo giao diện
         def process_task():
-            changes = self.word_processor.fix_empty_pages()
+            changes = session.fix()
             
-            if changes >= 0:
+            if changes is not False and changes >= 0:
                 self.root.after(0, lambda: self.result_text.insert(tk.END, f"\n\nĐã xử lý {changes} ngắt phần."))
                 self.root.after(0, lambda: self.status_text.set(f"Xử lý hoàn tất: Đã thay đổi {changes} ngắt phần"))
             else:
@@ -235,7 +343,8 @@ class AutoOfficeGUI:
     
     def save_document(self):
         """Lưu tài liệu đã chỉnh sửa."""
-        if not self.word_processor.document:
+        session = self.get_current_session()
+        if not session:
             messagebox.showwarning("Cảnh báo", "Vui lòng xử lý tệp trước!")
             return
         
@@ -254,11 +363,11 @@ class AutoOfficeGUI:
             
             # Sử dụng thread để không làm treo giao diện
             def save_task():
-                result = self.word_processor.save_document(save_path)
+                result = session.save(save_path)
                 
                 if result:
                     self.root.after(0, lambda: self.result_text.insert(tk.END, f"\n\nĐã lưu tệp vào: {result}"))
-                    self.root.after(0, lambda: self.status_text.set(f"Đã lưu tệp thành công"))
+                    self.root.after(0, lambda: self.status_text.set("Đã lưu tệp thành công"))
                     self.root.after(0, lambda: messagebox.showinfo("Thành công", f"Đã lưu tệp vào:\n{result}"))
                 else:
                     self.root.after(0, lambda: self.status_text.set("Không thể lưu tệp."))
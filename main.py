@@ -3,7 +3,7 @@ import logging
 import sys
 import os
 
-from word_processor_1 import WordProcessor
+from session import SessionManager
 from gui import AutoOfficeGUI
 from update import AutoOfficeUpdater, get_application_path
 
@@ -44,11 +44,11 @@ def main():
             logger.warning(f"Không thể thiết lập icon: {e}")
         
         # Khởi tạo các module
-        word_processor = WordProcessor()
+        session_manager = SessionManager()
         updater = AutoOfficeUpdater()
         
         # Khởi tạo giao diện
-        app = AutoOfficeGUI(root, word_processor, updater)
+        app = AutoOfficeGUI(root, session_manager, updater)
         
         # Chạy ứng dụng
         root.mainloop()
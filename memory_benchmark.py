@@ -0,0 +1,237 @@
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import logging
+import tempfile
+import tracemalloc
+
+from docx import Document
+from docx.enum.section import WD_SECTION_START
+
+from word_processor_1 import WordProcessor
+
+# psutil là tùy chọn, nếu không có thì đọc RSS từ /proc (Linux)
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+# Các kích thước tài liệu dùng để đo: số phần và số đoạn văn mỗi phần
+DOCUMENT_SIZES = {
+    "small": {"sections": 10, "paragraphs_per_section": 20},
+    "medium": {"sections": 100, "paragraphs_per_section": 50},
+    "large": {"sections": 400, "paragraphs_per_section": 100},
+}
+
+# Các giai đoạn của pipeline được đo, theo đúng thứ tự thực hiện
+STAGES = ["open", "analyze", "fix", "save"]
+
+# Cho phép vượt ngân sách bao nhiêu trước khi báo lỗi (ngân sách được ghi kèm phần dự phòng)
+DEFAULT_HEADROOM = 0.2
+# RSS của tiến trình tăng dần khi các kích thước chạy nối tiếp nhau, nên ngân sách dùng mức tăng
+# RSS của từng giai đoạn. Mức tăng dao động theo cách bộ cấp phát giữ lại trang nhớ, dao động
+# lớn dần theo kích thước tài liệu, nên ngân sách được cộng thêm một khoảng tỷ lệ với kích thước
+# tệp (bytes RSS cho mỗi byte .docx) cùng một mức tối thiểu; mức tăng ghi được là 0 vẫn có khoảng này
+BUDGET_METRICS = ("peak_traced", "rss_delta")
+RSS_DELTA_SLACK_PER_BYTE = 100
+RSS_DELTA_MIN_SLACK = 4 * 1024 * 1024
+
+DEFAULT_BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "memory_budget.json")
+
+
+def get_rss():
+    """Trả về bộ nhớ RSS hiện tại của tiến trình (bytes), hoặc None nếu không đo được."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+
+def generate_document(output_path, sections, paragraphs_per_section, empty_every=5):
+    """Tạo tài liệu thử nghiệm, cứ empty_every phần lại có một phần trống kiểu Next Page."""
+    document = Document()
+    for section_idx in range(sections):
+        if section_idx > 0:
+            document.add_section(WD_SECTION_START.NEW_PAGE)
+        if empty_every and section_idx % empty_every == empty_every - 1:
+            continue
+        for para_idx in range(paragraphs_per_section):
+            document.add_paragraph(f"Phần {section_idx + 1}, đoạn văn {para_idx + 1}: " + "nội dung mẫu " * 8)
+        if section_idx % 10 == 0:
+            table = document.add_table(rows=3, cols=3)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = "ô"
+    document.save(output_path)
+    return output_path
+
+
+def measure_stage(stage_func):
+    """Chạy một giai đoạn và trả về (kết quả, số đo bộ nhớ)."""
+    gc.collect()
+    tracemalloc.reset_peak()
+    rss_before = get_rss()
+    start_time = time.perf_counter()
+
+    result = stage_func()
+
+    elapsed = time.perf_counter() - start_time
+    current, peak = tracemalloc.get_traced_memory()
+    rss_after = get_rss()
+
+    return result, {
+        "peak_traced": peak,
+        "current_traced": current,
+        "rss": rss_after,
+        "rss_delta": rss_after - rss_before if rss_after is not None and rss_before is not None else None,
+        "seconds": round(elapsed, 3),
+    }
+
+
+def run_pipeline(docx_path, output_path):
+    """Chạy open/analyze/fix/save trên một tài liệu và đo bộ nhớ từng giai đoạn."""
+    processor = WordProcessor()
+    results = {}
+
+    tracemalloc.start()
+    try:
+        stage_funcs = {
+            "open": lambda: processor.open_document(docx_path),
+            "analyze": processor.analyze_document,
+            "fix": processor.fix_empty_pages,
+            "save": lambda: processor.save_document(output_path),
+        }
+        for stage in STAGES:
+            _, results[stage] = measure_stage(stage_funcs[stage])
+    finally:
+        tracemalloc.stop()
+
+    return results
+
+
+def run_benchmark(sizes=None):
+    """Chạy benchmark trên các tài liệu được tạo với kích thước tăng dần."""
+    sizes = sizes or list(DOCUMENT_SIZES)
+    report = {}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size_name in sizes:
+            spec = DOCUMENT_SIZES[size_name]
+            docx_path = os.path.join(temp_dir, f"benchmark_{size_name}.docx")
+            output_path = os.path.join(temp_dir, f"benchmark_{size_name}_fixed.docx")
+            generate_document(docx_path, spec["sections"], spec["paragraphs_per_section"])
+
+            report[size_name] = run_pipeline(docx_path, output_path)
+            report[size_name]["file_size"] = os.path.getsize(docx_path)
+
+    return report
+
+
+def compare_with_budget(report, budget):
+    """So sánh kết quả với ngân sách, trả về danh sách các giai đoạn vượt ngân sách."""
+    violations = []
+    for size_name, stages in report.items():
+        size_budget = budget.get(size_name, {})
+        for stage in STAGES:
+            stage_budget = size_budget.get(stage)
+            if not stage_budget:
+                continue
+            for metric in BUDGET_METRICS:
+                limit = stage_budget.get(metric)
+                value = stages[stage].get(metric)
+                if limit is not None and value is not None and value > limit:
+                    violations.append(f"{size_name}/{stage}: {metric} = {value} bytes > ngân sách {limit} bytes")
+    return violations
+
+
+def rss_delta_slack(file_size):
+    """Khoảng cộng thêm vào ngân sách mức tăng RSS cho tài liệu có kích thước file_size bytes."""
+    return RSS_DELTA_MIN_SLACK + RSS_DELTA_SLACK_PER_BYTE * (file_size or 0)
+
+
+def build_budget(report, headroom=DEFAULT_HEADROOM):
+    """Tạo ngân sách từ kết quả đo, cộng thêm phần dự phòng."""
+    budget = {}
+    for size_name, stages in report.items():
+        budget[size_name] = {}
+        slack = rss_delta_slack(stages.get("file_size"))
+        for stage in STAGES:
+            stage_budget = budget[size_name][stage] = {}
+            if stages[stage].get("peak_traced") is not None:
+                stage_budget["peak_traced"] = int(stages[stage]["peak_traced"] * (1 + headroom))
+            if stages[stage].get("rss_delta") is not None:
+                stage_budget["rss_delta"] = int(max(stages[stage]["rss_delta"], 0) * (1 + headroom)) + slack
+    return budget
+
+
+def format_report(report):
+    """Tạo bảng kết quả dễ đọc."""
+    lines = [f"{'Kích thước':<10} {'Giai đoạn':<10} {'Peak traced (MB)':>17} {'RSS (MB)':>10} "
+             f"{'Tăng RSS (MB)':>14} {'Thời gian (s)':>14}"]
+    for size_name, stages in report.items():
+        for stage in STAGES:
+            data = stages[stage]
+            rss = f"{data['rss'] / 1048576:.1f}" if data['rss'] is not None else "-"
+            rss_delta = f"{data['rss_delta'] / 1048576:.1f}" if data['rss_delta'] is not None else "-"
+            lines.append(f"{size_name:<10} {stage:<10} {data['peak_traced'] / 1048576:>17.2f} {rss:>10} "
+                         f"{rss_delta:>14} {data['seconds']:>14}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo bộ nhớ của pipeline phân tích/sửa trang trắng")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET_PATH, help="Đường dẫn tệp ngân sách bộ nhớ")
+    parser.add_argument("--record", "--update-budget", dest="record", action="store_true",
+                        help="Ghi kết quả hiện tại làm ngân sách mới")
+    parser.add_argument("--headroom", type=float, default=DEFAULT_HEADROOM, help="Phần dự phòng khi ghi ngân sách")
+    parser.add_argument("--sizes", nargs="+", choices=list(DOCUMENT_SIZES), help="Chỉ chạy các kích thước này")
+    parser.add_argument("--json", dest="json_output", help="Ghi kết quả chi tiết ra tệp JSON")
+    args = parser.parse_args()
+
+    # Log của pipeline làm nhiễu kết quả, chỉ giữ cảnh báo
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = run_benchmark(args.sizes)
+    print(format_report(report))
+
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+
+    if args.record:
+        with open(args.budget, 'w', encoding='utf-8') as f:
+            json.dump(build_budget(report, args.headroom), f, ensure_ascii=False, indent=4)
+            f.write("\n")
+        print(f"Đã ghi ngân sách bộ nhớ vào: {args.budget}")
+        return 0
+
+    if not os.path.exists(args.budget):
+        # Thiếu ngân sách là lỗi: nếu không, kiểm tra hồi quy không bao giờ thất bại
+        print(f"Không tìm thấy tệp ngân sách {args.budget}, chạy với --update-budget để tạo.")
+        return 2
+
+    with open(args.budget, 'r', encoding='utf-8') as f:
+        budget = json.load(f)
+
+    violations = compare_with_budget(report, budget)
+    if violations:
+        print("\nVượt ngân sách bộ nhớ:")
+        for violation in violations:
+            print(f"- {violation}")
+        return 1
+
+    print("\nTất cả các giai đoạn đều nằm trong ngân sách bộ nhớ.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
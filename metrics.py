@@ -0,0 +1,229 @@
+import os
+import bisect
+import tempfile
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} cần các nhãn {self.labelnames}, nhận được {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+
+class Counter(_Metric):
+    """Bộ đếm chỉ tăng."""
+
+    metric_type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        # Bộ đếm không nhãn được xuất ngay từ đầu với giá trị 0
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counter chỉ có thể tăng")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self, items):
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Histogram theo các ngưỡng cố định (ví dụ thời gian thực hiện từng giai đoạn)."""
+
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            state["counts"][index] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def get(self, **labels):
+        """Trả về (số lần quan sát, tổng giá trị)."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state["count"], state["sum"]) if state else (0, 0.0)
+
+    def snapshot(self):
+        """Trả về {giá trị nhãn: (số lần quan sát, tổng giá trị)} tại thời điểm gọi."""
+        with self._lock:
+            return {key: (state["count"], state["sum"]) for key, state in self._values.items()}
+
+    def _render_samples(self, items):
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state["counts"]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(float(bound))))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(state['sum'])}"
+            yield f"{self.name}_count{labels} {state['count']}"
+
+
+class MetricsRegistry:
+    """Tập hợp các chỉ số, xuất theo định dạng văn bản của Prometheus."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Chỉ số {metric.name} đã được đăng ký với kiểu/nhãn khác")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Trả về toàn bộ chỉ số dạng văn bản Prometheus."""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Ghi chỉ số ra tệp (cho textfile collector của node_exporter).
+
+        Ghi vào tệp tạm rồi đổi tên để bên đọc không bao giờ thấy tệp ghi dở.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return path
+
+
+REGISTRY = MetricsRegistry()
+
+DOCUMENTS_PROCESSED = REGISTRY.counter(
+    "autooffice_documents_processed_total", "Số tài liệu đã mở, theo kết quả", ("result",))
+SECTIONS_SCANNED = REGISTRY.counter(
+    "autooffice_sections_scanned_total", "Số phần đã được phân tích")
+BLANK_PAGES_FOUND = REGISTRY.counter(
+    "autooffice_blank_pages_found_total", "Số trang trắng phát hiện được")
+BLANK_PAGES_FIXED = REGISTRY.counter(
+    "autooffice_blank_pages_fixed_total", "Số trang trắng đã sửa")
+STAGE_DURATION = REGISTRY.histogram(
+    "autooffice_stage_duration_seconds", "Thời gian thực hiện từng giai đoạn", ("stage",))
+FINGERPRINT_CHECKS = REGISTRY.counter(
+    "autooffice_fingerprint_checks_total", "Số lần kiểm tra dấu đã xử lý (hit = bỏ qua được tệp)", ("result",))
+COM_FAILURES = REGISTRY.counter(
+    "autooffice_com_failures_total", "Số lần đếm trang qua COM thất bại", ("backend",))
+REMOTE_PAGE_COUNT_REQUESTS = REGISTRY.counter(
+    "autooffice_remote_page_count_requests_total", "Số yêu cầu đếm trang qua máy chủ từ xa", ("op", "result"))
+PREFLIGHT_CHECKS = REGISTRY.counter(
+    "autooffice_preflight_total", "Số lần kiểm tra sơ bộ tệp, theo phân loại", ("category",))
+TEMPLATE_PLAN_CHECKS = REGISTRY.counter(
+    "autooffice_template_plan_checks_total", "Số lần tra kết luận theo mẫu tài liệu (hit, miss, rejected)", ("result",))
+SECTION_CACHE_LOOKUPS = REGISTRY.counter(
+    "autooffice_section_cache_lookups_total", "Số phần tra trong bộ nhớ đệm kết luận theo phần (hit, miss)", ("result",))
+PAGE_COUNT_FALLBACKS = REGISTRY.counter(
+    "autooffice_page_count_fallbacks_total", "Số lần không đếm được trang chính xác (phải ước lượng hoặc bỏ qua bằng chứng số trang)")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Không ghi mỗi lần thu thập vào log của ứng dụng
+        pass
+
+
+def start_http_server(port=9464, host="127.0.0.1", registry=REGISTRY):
+    """Phục vụ /metrics trên một luồng nền; trả về server (gọi shutdown() để dừng)."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    logger.info(f"Đang phục vụ chỉ số tại http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,393 @@
+import sys
+import json
+import queue
+import socket
+import struct
+import hashlib
+import argparse
+import threading
+import socketserver
+import logging
+from collections import OrderedDict
+
+from metrics import REMOTE_PAGE_COUNT_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Giao thức: mỗi thông điệp gồm 4 byte độ dài (big-endian) của phần đầu JSON (UTF-8), phần đầu
+# JSON, rồi payload_size byte dữ liệu thô (nội dung các tài liệu nối liền, theo thứ tự "items").
+#
+#   HAS   {"op": "HAS", "hashes": [...]}                  -> {"ok": true, "have": [bool, ...]}
+#   COUNT {"op": "COUNT", "hash": h, "size": n} + n byte  -> {"ok": true, "pages": int | null}
+#   BATCH {"op": "BATCH", "items": [{"hash", "size"}]}    -> {"ok": true, "pages": [int | null, ...]}
+#
+# size = 0 nghĩa là chỉ gửi hash (máy chủ đã có tài liệu); nếu máy chủ không có thì trả về
+# {"ok": false, "error": "unknown_hash", "missing": [...]}. Hash là SHA-256 của nội dung tài liệu.
+PROTOCOL_VERSION = 1
+DEFAULT_PORT = 9470
+HEADER_LENGTH = struct.Struct(">I")
+MAX_HEADER_SIZE = 1024 * 1024
+MAX_PAYLOAD_SIZE = 512 * 1024 * 1024
+# Tài liệu từ kích thước này trở lên được thử gửi hash trước, chỉ tải lên khi máy chủ chưa có
+HASH_FIRST_MIN_SIZE = 64 * 1024
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            raise ConnectionError("Kết nối bị đóng giữa chừng")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_message(sock, header, payload=b""):
+    """Gửi một thông điệp (phần đầu JSON và dữ liệu thô)."""
+    header = dict(header, v=PROTOCOL_VERSION, payload_size=len(payload))
+    encoded = json.dumps(header, separators=(',', ':')).encode("utf-8")
+    sock.sendall(HEADER_LENGTH.pack(len(encoded)) + encoded)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_message(sock):
+    """Nhận một thông điệp, trả về (phần đầu, dữ liệu thô) hoặc (None, None) nếu kết nối đã đóng."""
+    first = sock.recv(HEADER_LENGTH.size)
+    if not first:
+        return None, None
+    prefix = first + _recv_exact(sock, HEADER_LENGTH.size - len(first))
+    (header_size,) = HEADER_LENGTH.unpack(prefix)
+    if header_size > MAX_HEADER_SIZE:
+        raise ValueError(f"Phần đầu thông điệp quá lớn: {header_size} bytes")
+    header = json.loads(_recv_exact(sock, header_size).decode("utf-8"))
+    if header.get("v") != PROTOCOL_VERSION:
+        raise ValueError(f"Phiên bản giao thức không được hỗ trợ: {header.get('v')}")
+    payload_size = header.get("payload_size", 0)
+    if not 0 <= payload_size <= MAX_PAYLOAD_SIZE:
+        raise ValueError(f"Dữ liệu thông điệp quá lớn: {payload_size} bytes")
+    return header, _recv_exact(sock, payload_size)
+
+
+def document_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class PageCountServer(socketserver.ThreadingTCPServer):
+    """Máy chủ đếm trang: nhận tài liệu (hoặc hash của tài liệu đã gửi trước) và trả về số trang.
+
+    count_pages(bytes) -> int hoặc None là backend thực sự đếm trang, ví dụ
+    EmptyPageDetector().get_exact_page_count trên máy Windows có Word, hoặc
+    page_verification.FakePageCountBackend để chạy thử trên Linux. Tối đa max_concurrent
+    lần đếm chạy cùng lúc (Word qua COM nên để 1); tài liệu và số trang đã đếm được giữ
+    theo hash, tổng kích thước không vượt max_store_bytes.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, count_pages, host="127.0.0.1", port=DEFAULT_PORT, max_concurrent=1,
+                 max_store_bytes=256 * 1024 * 1024):
+        self.count_pages = count_pages
+        self.max_store_bytes = max_store_bytes
+        self._count_slots = threading.BoundedSemaphore(max_concurrent)
+        # hash -> [bytes, số trang hoặc None nếu chưa đếm]
+        self._store = OrderedDict()
+        self._store_bytes = 0
+        self._store_lock = threading.Lock()
+        super().__init__((host, port), _PageCountHandler)
+
+    def has(self, digest):
+        with self._store_lock:
+            return digest in self._store
+
+    def remember(self, digest, data):
+        with self._store_lock:
+            if digest in self._store:
+                self._store.move_to_end(digest)
+                return
+            self._store[digest] = [data, None]
+            self._store_bytes += len(data)
+            while self._store_bytes > self.max_store_bytes and len(self._store) > 1:
+                _, (evicted, _) = self._store.popitem(last=False)
+                self._store_bytes -= len(evicted)
+
+    def count(self, digest, data=None):
+        """Đếm trang của tài liệu theo hash.
+
+        data là nội dung vừa tải lên trong cùng yêu cầu (nếu có), được dùng trực tiếp khi tài liệu
+        đã bị loại khỏi kho; nếu không có data và tài liệu không còn trong kho thì KeyError.
+        """
+        with self._store_lock:
+            entry = self._store.get(digest)
+            if entry is not None:
+                self._store.move_to_end(digest)
+                if entry[1] is not None:
+                    return entry[1]
+                data = entry[0]
+            elif data is None:
+                raise KeyError(digest)
+        with self._count_slots:
+            try:
+                pages = self.count_pages(data)
+            except Exception as e:
+                logger.warning(f"Lỗi khi đếm trang tài liệu {digest[:12]}: {e}")
+                pages = None
+        if pages is not None:
+            with self._store_lock:
+                if digest in self._store:
+                    self._store[digest][1] = pages
+        return pages
+
+    def handle_request_message(self, header, payload):
+        """Xử lý một yêu cầu, trả về phần đầu của phản hồi."""
+        op = header.get("op")
+        if op == "HAS":
+            return {"ok": True, "have": [self.has(digest) for digest in header.get("hashes", [])]}
+        if op == "COUNT":
+            items = [{"hash": header.get("hash"), "size": header.get("size", 0)}]
+        elif op == "BATCH":
+            items = header.get("items", [])
+        else:
+            return {"ok": False, "error": "unknown_op"}
+
+        if sum(item.get("size", 0) for item in items) != len(payload):
+            return {"ok": False, "error": "bad_payload"}
+        # Tài liệu tải lên trong yêu cầu này được đếm thẳng từ payload: một BATCH lớn hơn
+        # max_store_bytes có thể tự đẩy các tài liệu đầu của nó ra khỏi kho
+        uploaded = {}
+        offset = 0
+        for item in items:
+            size = item.get("size", 0)
+            if size:
+                data = payload[offset:offset + size]
+                offset += size
+                if document_hash(data) != item["hash"]:
+                    return {"ok": False, "error": "hash_mismatch", "hash": item["hash"]}
+                uploaded[item["hash"]] = data
+                self.remember(item["hash"], data)
+        missing = [item["hash"] for item in items if item["hash"] not in uploaded and not self.has(item["hash"])]
+        if missing:
+            return {"ok": False, "error": "unknown_hash", "missing": missing}
+
+        pages = []
+        for item in items:
+            try:
+                pages.append(self.count(item["hash"], uploaded.get(item["hash"])))
+            except KeyError:
+                # Bị loại khỏi kho bởi một yêu cầu khác ngay trước khi đếm
+                return {"ok": False, "error": "unknown_hash", "missing": [item["hash"]]}
+        return {"ok": True, "pages": pages[0] if op == "COUNT" else pages}
+
+
+class _PageCountHandler(socketserver.BaseRequestHandler):
+    """Mỗi kết nối gửi nhiều yêu cầu tuần tự (kết nối được dùng lại)."""
+
+    def handle(self):
+        while True:
+            try:
+                header, payload = recv_message(self.request)
+                if header is None:
+                    return
+                response = self.server.handle_request_message(header, payload)
+                send_message(self.request, response)
+            except (ConnectionError, OSError):
+                return
+            except ValueError as e:
+                logger.warning(f"Yêu cầu không hợp lệ từ {self.client_address}: {e}")
+                try:
+                    send_message(self.request, {"ok": False, "error": "bad_request", "message": str(e)})
+                except OSError:
+                    pass
+                return
+
+
+def _read_source(source):
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+class RemotePageCountBackend:
+    """Backend đếm trang qua máy chủ PageCountServer, dùng được làm page_count_backend.
+
+    Giữ tối đa max_connections kết nối (cũng là số yêu cầu chạy cùng lúc), các kết nối được
+    dùng lại giữa các lần gọi. Tài liệu lớn được gửi hash trước, chỉ tải lên khi máy chủ chưa
+    có. Khi lỗi mạng hoặc máy chủ không đếm được, trả về None như khi không có Word.
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, max_connections=4, timeout=120.0):
+        self.address = (host, port)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._idle = queue.LifoQueue()
+        # Hash mà máy chủ đã xác nhận có (để lần sau chỉ gửi hash)
+        self._known = set()
+        self._known_lock = threading.Lock()
+
+    @classmethod
+    def from_address(cls, address, **kwargs):
+        """Tạo backend từ chuỗi "host:port" (hoặc chỉ "host")."""
+        host, _, port = address.rpartition(":") if ":" in address else (address, "", "")
+        return cls(host, int(port) if port else DEFAULT_PORT, **kwargs)
+
+    def __call__(self, source):
+        return self.count_pages(source)
+
+    def _exchange(self, sock, header, payload):
+        try:
+            send_message(sock, header, payload)
+            response, _ = recv_message(sock)
+            if response is None:
+                raise ConnectionError("Máy chủ đã đóng kết nối")
+        except Exception:
+            sock.close()
+            raise
+        self._idle.put(sock)
+        return response
+
+    def _request(self, header, payload=b""):
+        """Gửi một yêu cầu qua một kết nối trong nhóm, trả về phần đầu của phản hồi."""
+        with self._slots:
+            try:
+                sock = self._idle.get_nowait()
+            except queue.Empty:
+                sock = None
+            if sock is not None:
+                try:
+                    return self._exchange(sock, header, payload)
+                except (ConnectionError, OSError):
+                    # Kết nối rảnh có thể đã bị máy chủ đóng (ví dụ máy chủ khởi động lại): thử kết nối mới
+                    pass
+            sock = socket.create_connection(self.address, timeout=self.timeout)
+            return self._exchange(sock, header, payload)
+
+    def _is_known(self, digest):
+        with self._known_lock:
+            return digest in self._known
+
+    def _mark_known(self, digests):
+        with self._known_lock:
+            self._known.update(digests)
+
+    def _forget(self, digests):
+        with self._known_lock:
+            self._known.difference_update(digests)
+
+    def count_pages(self, source):
+        """Đếm số trang của một tài liệu (đường dẫn hoặc bytes); None nếu không đếm được."""
+        try:
+            data = _read_source(source)
+            digest = document_hash(data)
+            response = None
+            if self._is_known(digest) or len(data) >= HASH_FIRST_MIN_SIZE:
+                response = self._request({"op": "COUNT", "hash": digest, "size": 0})
+                if not response.get("ok"):
+                    if response.get("error") != "unknown_hash":
+                        raise ValueError(response.get("error"))
+                    self._forget([digest])
+            if response is None or not response.get("ok"):
+                response = self._request({"op": "COUNT", "hash": digest, "size": len(data)}, data)
+            if not response.get("ok"):
+                raise ValueError(response.get("error"))
+            self._mark_known([digest])
+            REMOTE_PAGE_COUNT_REQUESTS.inc(op="COUNT", result="ok")
+            return response["pages"]
+        except Exception as e:
+            REMOTE_PAGE_COUNT_REQUESTS.inc(op="COUNT", result="error")
+            logger.warning(f"Không thể đếm số trang qua máy chủ {self.address[0]}:{self.address[1]}: {e}")
+            return None
+
+    def count_many(self, sources):
+        """Đếm số trang của nhiều tài liệu trong một yêu cầu BATCH; trả về danh sách (None nếu lỗi)."""
+        if not sources:
+            return []
+        try:
+            documents = [_read_source(source) for source in sources]
+            digests = [document_hash(data) for data in documents]
+            unknown = [digest for digest in set(digests) if not self._is_known(digest)]
+            if unknown:
+                response = self._request({"op": "HAS", "hashes": unknown})
+                self._mark_known(digest for digest, have in zip(unknown, response.get("have", [])) if have)
+
+            # Lần thử thứ hai tải lên các tài liệu máy chủ đã loại khỏi kho từ sau lần kiểm tra HAS
+            for _ in range(2):
+                items = []
+                payload = []
+                uploading = set()
+                for digest, data in zip(digests, documents):
+                    if self._is_known(digest) or digest in uploading:
+                        items.append({"hash": digest, "size": 0})
+                    else:
+                        uploading.add(digest)
+                        items.append({"hash": digest, "size": len(data)})
+                        payload.append(data)
+                response = self._request({"op": "BATCH", "items": items}, b"".join(payload))
+                if response.get("error") != "unknown_hash":
+                    break
+                self._forget(response.get("missing", []))
+            if not response.get("ok"):
+                raise ValueError(response.get("error"))
+            self._mark_known(digests)
+            REMOTE_PAGE_COUNT_REQUESTS.inc(op="BATCH", result="ok")
+            return response["pages"]
+        except Exception as e:
+            REMOTE_PAGE_COUNT_REQUESTS.inc(op="BATCH", result="error")
+            logger.warning(f"Không thể đếm số trang hàng loạt qua máy chủ {self.address[0]}:{self.address[1]}: {e}")
+            return [None] * len(sources)
+
+    def close(self):
+        """Đóng các kết nối đang rảnh."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Máy chủ/máy khách đếm số trang tài liệu Word qua mạng")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="Chạy máy chủ đếm trang")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--max-concurrent", type=int, default=1, help="Số lần đếm trang chạy cùng lúc")
+    serve.add_argument("--fake", action="store_true",
+                       help="Dùng backend giả lập (page_verification.FakePageCountBackend) thay cho Word")
+
+    count = subparsers.add_parser("count", help="Đếm số trang các tệp qua máy chủ")
+    count.add_argument("paths", nargs="+")
+    count.add_argument("--server", default=f"127.0.0.1:{DEFAULT_PORT}", help="Địa chỉ máy chủ host:port")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        if args.fake:
+            from page_verification import FakePageCountBackend
+            count_pages = FakePageCountBackend()
+        else:
+            from word_processor_2 import EmptyPageDetector
+            count_pages = EmptyPageDetector().get_exact_page_count
+        server = PageCountServer(count_pages, args.host, args.port, args.max_concurrent)
+        logger.info(f"Máy chủ đếm trang đang chạy tại {args.host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
+
+    backend = RemotePageCountBackend.from_address(args.server)
+    pages = backend.count_many(args.paths)
+    backend.close()
+    for path, page_count in zip(args.paths, pages):
+        print(f"{'?' if page_count is None else page_count:>5}  {path}")
+    return 1 if any(page_count is None for page_count in pages) else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import io
+import logging
+
+from docx import Document
+from docx.enum.section import WD_SECTION_START
+
+from docx_stats import read_document_stats
+from word_processor_2 import EmptyPageDetector, open_docx_source, read_docx_source
+
+logger = logging.getLogger(__name__)
+
+
+def find_offenders(candidates, page_delta, total_delta=None):
+    """Tìm các phần thực sự gây trang trắng bằng tìm kiếm nhị phân theo nhóm.
+
+    page_delta(group) trả về số trang giảm đi khi chuyển đồng thời mọi phần trong group sang
+    Continuous. Giả định mức giảm của các phần cộng dồn được: nửa phải của một nhóm được suy ra
+    bằng (mức giảm của nhóm - mức giảm của nửa trái) nên không cần đếm lại. Với k phần gây
+    trang trắng trong n ứng viên, số lần gọi page_delta khoảng O(k log n) thay vì n.
+    Nếu đã biết mức giảm của toàn bộ ứng viên, truyền vào total_delta để không đếm lại.
+    """
+    offenders = []
+
+    def search(group, delta):
+        if delta <= 0:
+            return
+        if len(group) == 1:
+            offenders.append(group[0])
+            return
+        middle = len(group) // 2
+        left, right = group[:middle], group[middle:]
+        left_delta = page_delta(left)
+        search(left, left_delta)
+        search(right, delta - left_delta)
+
+    candidates = sorted(candidates)
+    if candidates:
+        search(candidates, page_delta(candidates) if total_delta is None else total_delta)
+    return sorted(offenders)
+
+
+class PageCountVerifier:
+    """Xác minh các phần ứng viên bằng số trang trước/sau khi chuyển sang Continuous.
+
+    Tài liệu chỉ được phân tích cú pháp một lần; mỗi phép thử chỉ đổi kiểu ngắt phần của nhóm
+    ứng viên, ghi ra bytes, đếm trang bằng backend rồi khôi phục lại.
+    """
+
+    def __init__(self, source, page_count_backend=None):
+        self.source = read_docx_source(source)
+        self.page_count_backend = page_count_backend or EmptyPageDetector().count_pages_exact
+        self.document = Document(open_docx_source(self.source))
+        self.backend_calls = 0
+        self.baseline_pages = None
+
+    def count_pages(self, group=()):
+        """Đếm số trang khi các phần trong group được chuyển sang Continuous."""
+        sections = self.document.sections
+        original_types = {i: sections[i].start_type for i in group}
+        try:
+            for i in group:
+                sections[i].start_type = WD_SECTION_START.CONTINUOUS
+            buffer = io.BytesIO()
+            self.document.save(buffer)
+        finally:
+            for i, start_type in original_types.items():
+                sections[i].start_type = start_type
+
+        self.backend_calls += 1
+        page_count = self.page_count_backend(buffer.getvalue())
+        if page_count is None or page_count < 0:
+            raise RuntimeError("Backend không đếm được số trang")
+        return page_count
+
+    def page_delta(self, group):
+        """Số trang giảm đi khi chuyển group sang Continuous."""
+        if self.baseline_pages is None:
+            self.baseline_pages = self.count_pages()
+        return self.baseline_pages - self.count_pages(group)
+
+    def verify_bisect(self, candidates):
+        """Xác minh bằng tìm kiếm nhị phân; kết quả được kiểm tra lại bằng một lần đếm.
+
+        Trả về dict gồm offenders, backend_calls, baseline_pages và consistent (False nếu
+        mức giảm của các phần tìm được không khớp tổng, tức giả định cộng dồn không đúng).
+        """
+        candidates = sorted(candidates)
+        if not candidates:
+            return self._result([], True)
+        total_delta = self.page_delta(candidates)
+        offenders = find_offenders(candidates, self.page_delta, total_delta)
+        if not offenders:
+            consistent = total_delta <= 0
+        elif offenders == candidates:
+            consistent = True
+        else:
+            consistent = self.page_delta(offenders) == total_delta
+        if not consistent:
+            logger.warning("Mức giảm số trang không cộng dồn được, kết quả tìm kiếm nhị phân có thể thiếu")
+        return self._result(offenders, consistent)
+
+    def verify_individually(self, candidates):
+        """Xác minh từng ứng viên một (n + 1 lần đếm trang), dùng để đối chiếu."""
+        offenders = [i for i in sorted(candidates) if self.page_delta([i]) > 0]
+        return self._result(offenders, True)
+
+    def _result(self, offenders, consistent):
+        logger.info(f"Xác minh bằng số trang: {len(offenders)} phần gây trang trắng, "
+                    f"{self.backend_calls} lần đếm trang")
+        return {
+            "offenders": offenders,
+            "backend_calls": self.backend_calls,
+            "baseline_pages": self.baseline_pages,
+            "consistent": consistent
+        }
+
+
+class FakePageCountBackend:
+    """Backend đếm trang giả lập, tất định, để kiểm tra mà không cần Word.
+
+    Dàn trang đơn giản từ thống kê XML: mỗi đoạn văn một dòng, mỗi bảng table_lines dòng,
+    mỗi hình ảnh image_lines dòng, mỗi trang lines_per_page dòng; phần Next Page/Even Page/
+    Odd Page bắt đầu trang mới (Even/Odd chèn thêm trang trống khi lệch chẵn lẻ), phần
+    Continuous nối tiếp trang hiện tại. Số lần gọi được đếm trong calls.
+    """
+
+    PAGE_STARTING = ("nextPage", "evenPage", "oddPage")
+
+    def __init__(self, lines_per_page=40, table_lines=5, image_lines=10):
+        self.lines_per_page = lines_per_page
+        self.table_lines = table_lines
+        self.image_lines = image_lines
+        self.calls = 0
+
+    def __call__(self, source):
+        self.calls += 1
+        pages = 0
+        used = 0
+        for i, section in enumerate(read_document_stats(source)["sections_detail"]):
+            start_type = section["start_type"]
+            if i == 0 or start_type in self.PAGE_STARTING:
+                pages += 1
+                used = 0
+                if (start_type == "evenPage" and pages % 2) or (start_type == "oddPage" and not pages % 2):
+                    pages += 1
+
+            lines = (section["paragraphs"] + section["tables"] * self.table_lines
+                     + section["images"] * self.image_lines)
+            while lines > 0:
+                if used == self.lines_per_page:
+                    pages += 1
+                    used = 0
+                taken = min(self.lines_per_page - used, lines)
+                used += taken
+                lines -= taken
+        return pages
@@ -0,0 +1,143 @@
+import os
+import io
+import sys
+import time
+import zlib
+import zipfile
+import logging
+import xml.etree.ElementTree as ET
+
+from docx_stats import find_document_part
+from metrics import PREFLIGHT_CHECKS
+
+logger = logging.getLogger(__name__)
+
+ZIP_MAGIC = b"PK\x03\x04"
+EMPTY_ZIP_MAGIC = b"PK\x05\x06"
+# Tệp OLE (Compound File): .doc cũ hoặc .docx được mã hóa bằng mật khẩu
+OLE_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+OLE_ENCRYPTED_STREAM = "EncryptedPackage".encode("utf-16-le")
+OLE_WORD_STREAM = "WordDocument".encode("utf-16-le")
+# Thư mục OLE thường nằm gần đầu tệp; chỉ đọc tối đa chừng này để tìm tên stream
+OLE_SCAN_BYTES = 4 * 1024 * 1024
+
+CONTENT_TYPES_PART = "[Content_Types].xml"
+
+DEFAULT_MAX_PART_SIZE = 512 * 1024 * 1024
+# Tỉ lệ nén bất thường (zip bomb) với các phần lớn hơn 1MB sau giải nén
+MAX_COMPRESSION_RATIO = 200
+COMPRESSION_CHECK_SIZE = 1024 * 1024
+
+# Các phân loại kết quả, theo thứ tự kiểm tra
+CATEGORIES = {
+    "ok": "Hợp lệ",
+    "not_found": "Không tìm thấy tệp",
+    "unreadable": "Không đọc được tệp",
+    "empty": "Tệp rỗng",
+    "encrypted": "Tài liệu được bảo vệ bằng mật khẩu",
+    "legacy_doc": "Tệp Word 97-2003 (.doc) bị đổi tên thành .docx",
+    "not_zip": "Không phải tệp .docx (không phải định dạng zip)",
+    "truncated": "Tệp bị cắt cụt hoặc hỏng (không đọc được central directory)",
+    "missing_parts": "Thiếu phần bắt buộc của tài liệu Word",
+    "oversized": "Phần của tài liệu quá lớn hoặc có tỉ lệ nén bất thường"
+}
+
+
+def _result(category, message=None, started=None):
+    return {
+        "category": category,
+        "ok": category == "ok",
+        "message": message or CATEGORIES[category],
+        "elapsed": round(time.perf_counter() - started, 6) if started is not None else None
+    }
+
+
+def _classify_ole(data):
+    """Phân biệt .docx được mã hóa và .doc cũ từ tên stream trong thư mục OLE."""
+    if OLE_ENCRYPTED_STREAM in data:
+        return "encrypted"
+    if OLE_WORD_STREAM in data:
+        return "legacy_doc"
+    return "not_zip"
+
+
+def preflight_check(source, max_part_size=DEFAULT_MAX_PART_SIZE):
+    """Kiểm tra nhanh một tài liệu (đường dẫn hoặc bytes) trước khi phân tích cú pháp.
+
+    Chỉ đọc vài byte đầu, central directory của zip và danh sách phần, không giải nén nội dung,
+    nên mất vài mili giây mỗi tệp. Trả về dict gồm category (xem CATEGORIES), ok, message và elapsed.
+    """
+    started = time.perf_counter()
+    result = _preflight(source, max_part_size, started)
+    PREFLIGHT_CHECKS.inc(category=result["category"])
+    return result
+
+
+def _preflight(source, max_part_size, started):
+    if isinstance(source, (bytes, bytearray)):
+        if not source:
+            return _result("empty", started=started)
+        head = bytes(source[:len(OLE_MAGIC)])
+        if head == OLE_MAGIC:
+            return _result(_classify_ole(bytes(source[:OLE_SCAN_BYTES])), started=started)
+        zip_source = io.BytesIO(source)
+    else:
+        try:
+            if os.path.getsize(source) == 0:
+                return _result("empty", started=started)
+            with open(source, 'rb') as f:
+                head = f.read(len(OLE_MAGIC))
+                if head == OLE_MAGIC:
+                    return _result(_classify_ole(head + f.read(OLE_SCAN_BYTES)), started=started)
+        except FileNotFoundError:
+            return _result("not_found", started=started)
+        except OSError as e:
+            return _result("unreadable", f"{CATEGORIES['unreadable']}: {e}", started)
+        zip_source = source
+
+    if not head.startswith((ZIP_MAGIC, EMPTY_ZIP_MAGIC)):
+        return _result("not_zip", started=started)
+
+    try:
+        with zipfile.ZipFile(zip_source) as zip_file:
+            infos = zip_file.infolist()
+            names = {info.filename for info in infos}
+            if any(info.flag_bits & 0x1 for info in infos):
+                return _result("encrypted", "Các phần trong tệp zip được mã hóa", started)
+
+            document_part = find_document_part(zip_file)
+            missing = [part for part in (CONTENT_TYPES_PART, document_part) if part not in names]
+            if missing:
+                return _result("missing_parts", f"{CATEGORIES['missing_parts']}: {', '.join(missing)}", started)
+
+            for info in infos:
+                if info.file_size > max_part_size:
+                    return _result("oversized", f"Phần {info.filename} có kích thước {info.file_size} bytes", started)
+                if (info.file_size > COMPRESSION_CHECK_SIZE and info.compress_size
+                        and info.file_size / info.compress_size > MAX_COMPRESSION_RATIO):
+                    return _result("oversized", f"Phần {info.filename} có tỉ lệ nén bất thường", started)
+    except (zipfile.BadZipFile, EOFError, zlib.error, ET.ParseError) as e:
+        return _result("truncated", f"{CATEGORIES['truncated']}: {e}", started)
+    except OSError as e:
+        return _result("unreadable", f"{CATEGORIES['unreadable']}: {e}", started)
+
+    return _result("ok", started=started)
+
+
+def main():
+    """Kiểm tra sơ bộ các tệp được truyền vào, in phân loại từng tệp."""
+    if len(sys.argv) < 2:
+        print("Cách dùng: python preflight.py <tệp.docx> ...")
+        return 1
+
+    exit_code = 0
+    for path in sys.argv[1:]:
+        result = preflight_check(path)
+        print(f"{result['category']:<14} {result['elapsed'] * 1000:>7.2f}ms  {path}  {'' if result['ok'] else result['message']}")
+        if not result["ok"]:
+            exit_code = 2
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
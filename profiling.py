@@ -0,0 +1,248 @@
+import os
+import io
+import sys
+import json
+import time
+import marshal
+import pstats
+import cProfile
+import zipfile
+import platform
+import threading
+import logging
+from collections import Counter
+
+from metrics import STAGE_DURATION
+from fingerprint import get_tool_version
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Khi chỉ lấy mẫu trong lúc có thao tác, luồng lấy mẫu kiểm tra lại trạng thái dừng sau mỗi khoảng này
+IDLE_WAIT = 0.25
+
+
+def anonymize_path(file_name):
+    """Rút gọn đường dẫn mã nguồn để hồ sơ không lộ thư mục người dùng.
+
+    Mã của ứng dụng giữ đường dẫn tương đối, thư viện giữ phần sau site-packages,
+    còn lại chỉ giữ tên tệp; các tên đặc biệt như "~" hay "<frozen ...>" giữ nguyên.
+    """
+    if not file_name or file_name.startswith(("<", "~")):
+        return file_name
+    normalized = os.path.abspath(file_name)
+    if normalized.startswith(os.path.join(APP_DIR, "")):
+        return os.path.relpath(normalized, APP_DIR).replace(os.sep, "/")
+    parts = normalized.replace(os.sep, "/").split("/")
+    for marker in ("site-packages", "dist-packages"):
+        if marker in parts:
+            return "/".join(parts[parts.index(marker) + 1:])
+    return os.path.basename(normalized)
+
+
+def _anonymize_stats(stats):
+    """Đổi tên tệp trong dữ liệu pstats (gồm cả danh sách hàm gọi) sang dạng ẩn danh."""
+    def key(function):
+        file_name, line, name = function
+        return anonymize_path(file_name), line, name
+
+    anonymized = {}
+    for function, (cc, nc, tt, ct, callers) in stats.items():
+        anonymized[key(function)] = (cc, nc, tt, ct, {key(caller): value for caller, value in callers.items()})
+    return anonymized
+
+
+class ProfileCapture:
+    """Ghi hồ sơ hiệu năng cho một lần chạy (dòng lệnh hoặc chế độ debug của giao diện).
+
+    Gồm: dữ liệu cProfile (pstats) của các thao tác chạy qua run(), ngăn xếp thu gọn
+    (collapsed stacks, dùng cho flame graph) lấy mẫu định kỳ trên mọi luồng, và thời gian
+    từng giai đoạn (từ metrics.STAGE_DURATION). Gói kết quả chỉ chứa tên hàm, số liệu
+    và thống kê cấu trúc tài liệu, không chứa văn bản hay tên tệp tài liệu.
+
+    Nếu sample_idle=False, ngăn xếp chỉ được lấy mẫu khi đang có thao tác chạy qua run()/run_iter()
+    (ví dụ chế độ debug của giao diện, nơi phần lớn thời gian là chờ người dùng).
+    """
+
+    def __init__(self, sample_interval=0.005, sample_idle=True):
+        self.sample_interval = sample_interval
+        self.sample_idle = sample_idle
+        self.stacks = Counter()
+        self._profiles = []
+        self._document_stats = []
+        # cProfile chỉ cho phép một bộ ghi hoạt động tại một thời điểm nên run() được tuần tự hóa
+        self._profile_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._sampler = None
+        # Số thao tác đang chạy qua run()/run_iter(); _active_event được đặt khi có ít nhất một
+        self._active_operations = 0
+        self._active_event = threading.Event()
+        self._stage_baseline = {}
+        self.started_at = None
+        self.elapsed = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        """Bắt đầu lấy mẫu ngăn xếp và ghi mốc thời gian các giai đoạn."""
+        self._stage_baseline = STAGE_DURATION.snapshot()
+        self.started_at = time.perf_counter()
+        self._stop_event.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="autooffice-profiler", daemon=True)
+        self._sampler.start()
+        logger.info("Đã bật ghi hồ sơ hiệu năng")
+
+    def stop(self):
+        """Dừng lấy mẫu."""
+        if self._sampler is None:
+            return
+        self._stop_event.set()
+        self._sampler.join()
+        self._sampler = None
+        self.elapsed = time.perf_counter() - self.started_at
+        logger.info(f"Đã dừng ghi hồ sơ hiệu năng sau {self.elapsed:.2f}s")
+
+    def _begin_operation(self):
+        with self._lock:
+            self._active_operations += 1
+            self._active_event.set()
+
+    def _end_operation(self):
+        with self._lock:
+            self._active_operations -= 1
+            if not self._active_operations:
+                self._active_event.clear()
+
+    def run(self, func, *args, **kwargs):
+        """Chạy func dưới cProfile và giữ lại kết quả để gộp vào hồ sơ."""
+        with self._profile_lock:
+            self._begin_operation()
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._end_operation()
+                with self._lock:
+                    self._profiles.append(profile)
+
+    def run_iter(self, iterable):
+        """Duyệt iterable (ví dụ một generator phân tích theo luồng), mỗi bước chạy dưới cProfile.
+
+        Khóa của cProfile chỉ được giữ trong từng bước, không giữ khi bên gọi xử lý phần tử.
+        """
+        profile = cProfile.Profile()
+        iterator = iter(iterable)
+        try:
+            while True:
+                with self._profile_lock:
+                    self._begin_operation()
+                    profile.enable()
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                    finally:
+                        profile.disable()
+                        self._end_operation()
+                yield item
+        finally:
+            with self._lock:
+                self._profiles.append(profile)
+
+    def add_document_stats(self, stats):
+        """Ghi thống kê cấu trúc (chỉ số lượng) của tài liệu đã xử lý để tái hiện trường hợp chậm."""
+        detail_keys = ("start_type", "paragraphs", "non_empty_paragraphs", "tables", "images", "page_breaks")
+        summary = {key: value for key, value in stats.items() if isinstance(value, (int, float))}
+        summary["section_types"] = dict(stats.get("section_types", {}))
+        summary["sections_detail"] = [
+            {key: detail[key] for key in detail_keys if key in detail} for detail in stats.get("sections_detail", [])
+        ]
+        with self._lock:
+            self._document_stats.append(summary)
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.sample_interval):
+            if not self.sample_idle and not self._active_event.is_set():
+                self._active_event.wait(IDLE_WAIT)
+                continue
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{anonymize_path(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if names:
+                    with self._lock:
+                        self.stacks[";".join(reversed(names))] += 1
+
+    def stage_summary(self):
+        """Số lần và tổng thời gian của từng giai đoạn trong lần chạy."""
+        summary = {}
+        for (stage,), (count, total) in STAGE_DURATION.snapshot().items():
+            base_count, base_total = self._stage_baseline.get((stage,), (0, 0.0))
+            if count > base_count:
+                summary[stage] = {
+                    "count": count - base_count,
+                    "seconds": round(total - base_total, 6),
+                    "mean_seconds": round((total - base_total) / (count - base_count), 6)
+                }
+        return summary
+
+    def collapsed_stacks(self):
+        """Ngăn xếp thu gọn: mỗi dòng "hàm1;hàm2;... số mẫu" (định dạng của flamegraph.pl/speedscope)."""
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _merged_stats(self):
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.stats = _anonymize_stats(stats.stats)
+        return stats
+
+    def write_artifact(self, output_dir):
+        """Ghi gói hồ sơ (.zip) vào output_dir và trả về đường dẫn."""
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, time.strftime("autooffice-profile-%Y%m%d-%H%M%S.zip"))
+        stats = self._merged_stats()
+        with self._lock:
+            document_stats = list(self._document_stats)
+
+        summary = {
+            "tool_version": get_tool_version(),
+            "python": platform.python_version(),
+            "platform": platform.platform(terse=True),
+            "elapsed_seconds": round(self.elapsed, 6) if self.elapsed is not None else None,
+            "sample_interval": self.sample_interval,
+            "samples": sum(self.stacks.values()),
+            "stages": self.stage_summary(),
+            "documents": document_stats
+        }
+
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as artifact:
+            artifact.writestr("summary.json", json.dumps(summary, ensure_ascii=False, indent=2))
+            artifact.writestr("stacks.collapsed", self.collapsed_stacks())
+            if stats is not None:
+                artifact.writestr("profile.pstats", marshal.dumps(stats.stats))
+                report = io.StringIO()
+                stats.stream = report
+                stats.sort_stats("cumulative").print_stats(50)
+                artifact.writestr("profile.txt", report.getvalue())
+
+        logger.info(f"Đã ghi hồ sơ hiệu năng vào: {path}")
+        return path
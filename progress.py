@@ -0,0 +1,116 @@
+import time
+import queue
+import threading
+import logging
+
+from metrics import STAGE_DURATION
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressReporter:
+    """Phát sự kiện tiến trình (bắt đầu/kết thúc giai đoạn, số phần đã xử lý, số bytes đọc/ghi).
+
+    Sự kiện "progress" được gộp lại để không gửi quá max_rate sự kiện mỗi giây;
+    sự kiện "start", "end" và sự kiện tiến trình cuối cùng của mỗi giai đoạn luôn được gửi.
+    Khi không có callback, chỉ thời gian của từng giai đoạn được ghi vào metrics.STAGE_DURATION,
+    các lời gọi khác trả về ngay nên có thể để bật thường xuyên.
+    """
+
+    def __init__(self, callback=None, max_rate=10.0):
+        self.callback = callback
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self._lock = threading.Lock()
+        self._last_emit = {}
+        self._pending = {}
+        self._stage_started = {}
+
+    def set_callback(self, callback, max_rate=None):
+        """Đặt hàm nhận sự kiện, None để tắt."""
+        with self._lock:
+            self.callback = callback
+            if max_rate is not None:
+                self.min_interval = 1.0 / max_rate if max_rate else 0.0
+
+    def stage_start(self, stage, total=None):
+        """Báo bắt đầu một giai đoạn."""
+        now = time.perf_counter()
+        with self._lock:
+            self._stage_started[stage] = now
+            self._pending.pop(stage, None)
+        if not self.callback:
+            return
+        self._emit({"event": "start", "stage": stage, "total": total})
+
+    def stage_end(self, stage, **details):
+        """Báo kết thúc một giai đoạn, kèm thời gian thực hiện."""
+        now = time.perf_counter()
+        with self._lock:
+            pending = self._pending.pop(stage, None)
+            started = self._stage_started.pop(stage, None)
+            self._last_emit.pop(stage, None)
+        if started is not None:
+            STAGE_DURATION.observe(now - started, stage=stage)
+        if not self.callback:
+            return
+        # Gửi nốt sự kiện tiến trình đã bị gộp để người nhận thấy trạng thái cuối
+        if pending:
+            self._emit(pending)
+        event = {"event": "end", "stage": stage, "elapsed": now - started if started else None}
+        event.update(details)
+        self._emit(event)
+
+    def advance(self, stage, current, total):
+        """Báo đã xử lý current/total đơn vị (ví dụ số phần) trong giai đoạn."""
+        if not self.callback:
+            return
+        event = {"event": "progress", "stage": stage, "current": current, "total": total}
+        now = time.perf_counter()
+        with self._lock:
+            last = self._last_emit.get(stage, 0.0)
+            if current < total and now - last < self.min_interval:
+                self._pending[stage] = event
+                return
+            self._last_emit[stage] = now
+            self._pending.pop(stage, None)
+        self._emit(event)
+
+    def report_bytes(self, stage, bytes_read=0, bytes_written=0):
+        """Báo số bytes đã đọc hoặc ghi trong giai đoạn."""
+        if not self.callback:
+            return
+        self._emit({"event": "bytes", "stage": stage, "bytes_read": bytes_read, "bytes_written": bytes_written})
+
+    def _emit(self, event):
+        event["time"] = time.time()
+        try:
+            self.callback(event)
+        except Exception as e:
+            # Lỗi của bên nhận không được làm hỏng quá trình xử lý tài liệu
+            logger.warning(f"Lỗi trong callback tiến trình: {e}")
+
+
+class ProgressEventQueue:
+    """Callback tiến trình dạng hàng đợi, cho phép duyệt sự kiện từ một luồng khác.
+
+    Dùng làm callback cho ProgressReporter rồi lặp qua đối tượng này; gọi close() để kết thúc vòng lặp.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, maxsize=0):
+        self._queue = queue.Queue(maxsize)
+
+    def __call__(self, event):
+        self._queue.put(event)
+
+    def close(self):
+        """Kết thúc dòng sự kiện."""
+        self._queue.put(self._CLOSED)
+
+    def __iter__(self):
+        while True:
+            event = self._queue.get()
+            if event is self._CLOSED:
+                return
+            yield event
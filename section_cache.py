@@ -0,0 +1,78 @@
+import difflib
+import threading
+import logging
+from collections import OrderedDict
+
+from metrics import SECTION_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+
+class SectionVerdictCache:
+    """Bộ nhớ đệm kết luận trang trắng theo dấu vân tay nội dung của từng phần.
+
+    Với mỗi tài liệu (theo khóa, ví dụ đường dẫn tuyệt đối) lưu dấu vân tay và kết luận của phiên bản trước.
+    Khi có phiên bản mới, các phần không đổi được ghép với phiên bản cũ (kể cả khi bị dịch vị trí
+    do thêm/xóa phần); chỉ các phần thay đổi và các phần liền kề (vì quy tắc nội dung phụ thuộc
+    vào phần trước/sau) phải phân tích lại, các phần còn lại dùng lại kết luận cũ.
+    """
+
+    def __init__(self, max_documents=64):
+        self.max_documents = max_documents
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def plan(self, document_key, fingerprints):
+        """Trả về các kết luận dùng lại được {chỉ số phần mới: kết luận}; các phần còn lại cần phân tích lại."""
+        with self._lock:
+            entry = self._entries.get(document_key)
+            if entry is not None:
+                self._entries.move_to_end(document_key)
+        if entry is None:
+            SECTION_CACHE_LOOKUPS.inc(len(fingerprints), result="miss")
+            return {}
+
+        old_fingerprints, old_verdicts = entry
+        matcher = difflib.SequenceMatcher(None, old_fingerprints, fingerprints, autojunk=False)
+        matched = {}
+        changed = set()
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                matched.update(zip(range(j1, j2), range(i1, i2)))
+            else:
+                changed.update(range(j1, j2))
+                # Phần bị xóa: hai phần hai bên chỗ xóa có hàng xóm mới
+                if tag == "delete":
+                    changed.update((j1 - 1, j1))
+
+        dirty = set()
+        for j in changed:
+            dirty.update((j - 1, j, j + 1))
+        dirty = {j for j in dirty if 0 <= j < len(fingerprints)}
+
+        known = {j: old_verdicts[i] for j, i in matched.items() if j not in dirty}
+        SECTION_CACHE_LOOKUPS.inc(len(known), result="hit")
+        SECTION_CACHE_LOOKUPS.inc(len(fingerprints) - len(known), result="miss")
+        logger.info(f"Dùng lại kết luận của {len(known)}/{len(fingerprints)} phần, phân tích lại {len(dirty)} phần")
+        return known
+
+    def store(self, document_key, fingerprints, verdicts):
+        """Lưu dấu vân tay và kết luận của phiên bản vừa phân tích."""
+        verdicts = [
+            {
+                'status': verdict['status'],
+                'confidence': verdict['confidence'],
+                'detection_method': verdict['detection_method'],
+                'sources': list(verdict['sources'])
+            }
+            for verdict in verdicts
+        ]
+        with self._lock:
+            self._entries[document_key] = (list(fingerprints), verdicts)
+            self._entries.move_to_end(document_key)
+            while len(self._entries) > self.max_documents:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,250 @@
+import time
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from word_processor_1 import WordProcessor
+from section_cache import SectionVerdictCache
+from docx_stats import read_document_stats
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentSession:
+    """Phiên làm việc với một tài liệu: có WordProcessor và trạng thái riêng.
+
+    Mọi thao tác trên cùng một phiên được tuần tự hóa bằng khóa của phiên, nên nhiều luồng
+    (ví dụ các nút trên giao diện) có thể dùng chung một phiên mà không làm hỏng trạng thái;
+    các phiên khác nhau chạy song song độc lập.
+    """
+
+    def __init__(self, session_id, debug_mode=False, progress_callback=None, section_cache=None):
+        self.session_id = session_id
+        self.processor = WordProcessor()
+        self.processor.section_cache = section_cache
+        self.processor.set_debug_mode(debug_mode)
+        if progress_callback:
+            self.processor.set_progress_callback(progress_callback)
+        # Dùng chung khóa của WordProcessor để kết quả phân tích nền không chen vào giữa các thao tác
+        self.lock = self.processor.lock
+        # ProfileCapture khi đang ghi hồ sơ hiệu năng (chế độ debug), None nếu không
+        self.profile_capture = None
+        self.last_used = time.monotonic()
+        self._active = 0
+        # True từ khi SessionManager.get_session trả phiên cho bên gọi đến khi thao tác đầu tiên
+        # kết thúc, để phiên không bị giải phóng trước khi luồng làm việc kịp dùng
+        self._reserved = False
+        self._active_lock = threading.Lock()
+
+    @property
+    def busy(self):
+        """Phiên đang có thao tác chạy, đang được ghim hoặc vừa được trao cho bên gọi."""
+        with self._active_lock:
+            return self._active > 0 or self._reserved
+
+    def _pin(self):
+        with self._active_lock:
+            self._active += 1
+
+    def _unpin(self):
+        with self._active_lock:
+            self._active -= 1
+            self._reserved = False
+        self.last_used = time.monotonic()
+
+    def _run(self, method, *args, **kwargs):
+        self._pin()
+        try:
+            with self.lock:
+                capture = self.profile_capture
+                if capture is not None:
+                    return capture.run(method, *args, **kwargs)
+                return method(*args, **kwargs)
+        finally:
+            self._unpin()
+
+    def open(self, file_path):
+        opened = self._run(self.processor.open_document, file_path)
+        self._record_document_stats(opened)
+        return opened
+
+    def _record_document_stats(self, opened):
+        """Ghi thống kê cấu trúc tài liệu vào hồ sơ hiệu năng (nếu đang ghi)."""
+        capture = self.profile_capture
+        if capture is None or not opened:
+            return
+        try:
+            capture.add_document_stats(read_document_stats(self.processor.source))
+        except Exception as e:
+            logger.warning(f"Không thể ghi thống kê tài liệu vào hồ sơ hiệu năng: {e}")
+
+    def open_bytes(self, data, file_name=None, document_key=None):
+        """Mở tài liệu từ bytes; mặc định mọi bản tải lên của phiên dùng chung khóa bộ nhớ đệm
+        theo id phiên, nên bản tải lên lại chỉ phân tích các phần đã thay đổi."""
+        if document_key is None:
+            document_key = f"session:{self.session_id}"
+        opened = self._run(self.processor.open_document_bytes, data, file_name, None, document_key)
+        self._record_document_stats(opened)
+        return opened
+
+    def analyze(self, plan_path=None, deadline=None, on_update=None):
+        return self._run(self.processor.analyze_document, plan_path, deadline, on_update)
+
+    def iter_analysis(self):
+        """Phân tích theo luồng; khóa của phiên được giữ cho đến khi duyệt xong."""
+        self._pin()
+        try:
+            with self.lock:
+                capture = self.profile_capture
+                analysis = self.processor.iter_analysis()
+                if capture is not None:
+                    analysis = capture.run_iter(analysis)
+                yield from analysis
+        finally:
+            self._unpin()
+
+    def fix(self):
+        return self._run(self.processor.fix_empty_pages)
+
+    def undo(self):
+        return self._run(self.processor.undo_fix)
+
+    def redo(self):
+        return self._run(self.processor.redo_fix)
+
+    def export_change_log(self, path):
+        return self._run(self.processor.export_change_log, path)
+
+    def save(self, output_path=None, stamp=False):
+        return self._run(self.processor.save_document, output_path, stamp)
+
+    def save_bytes(self, stamp=False):
+        return self._run(self.processor.save_document_bytes, stamp)
+
+    def get_document_info(self):
+        return self._run(self.processor.get_document_info)
+
+    def set_debug_mode(self, enabled=True):
+        """Đổi cờ debug ngay, không chờ khóa của phiên: được gọi từ luồng giao diện trong khi
+        phiên có thể đang phân tích (thao tác đang chạy có thể thấy cờ mới giữa chừng)."""
+        self.processor.set_debug_mode(enabled)
+
+    @property
+    def has_document(self):
+        return self.processor.document is not None
+
+    def release(self):
+        """Giải phóng tài liệu đã phân tích để thu hồi bộ nhớ."""
+        with self.lock:
+            self.processor.document = None
+            self.processor.page_analyzer = None
+            self.processor.structure_report = None
+            self.processor.source = None
+            self.processor.sections_info = []
+            self.processor.empty_pages = []
+
+
+class SessionManager:
+    """Quản lý các phiên tài liệu, giải phóng phiên rảnh ít dùng nhất khi vượt quá max_sessions."""
+
+    def __init__(self, max_sessions=4, progress_callback=None):
+        self.max_sessions = max_sessions
+        self.progress_callback = progress_callback
+        self.debug_mode = False
+        self.profile_capture = None
+        # Kết luận theo phần dùng chung giữa các phiên: tải lên lại tài liệu đã sửa chỉ phân tích phần thay đổi
+        self.section_cache = SectionVerdictCache()
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_session(self, session_id, create=True):
+        """Lấy phiên theo id (ví dụ đường dẫn tệp), tạo mới nếu chưa có và create=True.
+
+        Phiên trả về được giữ lại (không bị giải phóng khi có phiên khác được tạo) cho đến khi
+        thao tác đầu tiên trên phiên kết thúc; dùng use() cho một chuỗi nhiều thao tác.
+        """
+        with self._lock:
+            session = self._get_or_create(session_id, create)
+            if session is not None:
+                with session._active_lock:
+                    session._reserved = True
+            return session
+
+    @contextmanager
+    def use(self, session_id, create=True):
+        """Ghim phiên trong suốt khối with (ví dụ mở rồi phân tích rồi lưu) để không bị giải phóng giữa các thao tác."""
+        with self._lock:
+            session = self._get_or_create(session_id, create)
+            if session is not None:
+                session._pin()
+        try:
+            yield session
+        finally:
+            if session is not None:
+                session._unpin()
+                # Các phiên đã vượt giới hạn khi mọi phiên đều bận được giải phóng khi rảnh
+                with self._lock:
+                    self._evict_idle()
+
+    def _get_or_create(self, session_id, create):
+        """Lấy hoặc tạo phiên khi đang giữ self._lock."""
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            return session
+        if not create:
+            return None
+
+        session = DocumentSession(session_id, self.debug_mode, self.progress_callback, self.section_cache)
+        session.profile_capture = self.profile_capture
+        self._sessions[session_id] = session
+        self._evict_idle(keep=session_id)
+        return session
+
+    def _evict_idle(self, keep=None):
+        """Bỏ các phiên rảnh ít được dùng nhất; phiên đang chạy (và phiên keep) không bao giờ bị bỏ."""
+        for session_id in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            session = self._sessions[session_id]
+            if session_id == keep or session.busy:
+                continue
+            del self._sessions[session_id]
+            session.release()
+            logger.info(f"Đã giải phóng phiên tài liệu ít dùng: {session_id}")
+
+    def close_session(self, session_id):
+        """Đóng và giải phóng một phiên."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.release()
+
+    def close_all(self):
+        """Đóng tất cả các phiên."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.release()
+
+    def set_debug_mode(self, enabled=True):
+        """Bật/tắt chế độ debug cho mọi phiên hiện có và phiên mới."""
+        with self._lock:
+            self.debug_mode = enabled
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            session.set_debug_mode(enabled)
+
+    def set_profile_capture(self, capture):
+        """Ghi hồ sơ hiệu năng các thao tác của mọi phiên vào capture (None để tắt)."""
+        with self._lock:
+            self.profile_capture = capture
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            session.profile_capture = capture
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
@@ -0,0 +1,122 @@
+import json
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+from metrics import TEMPLATE_PLAN_CHECKS
+
+logger = logging.getLogger(__name__)
+
+# Kết luận từ các nguồn này phụ thuộc vào độ dài văn bản, không dùng chung được cho cả họ tài liệu
+TEXT_DEPENDENT_SOURCES = ("page_count",)
+
+
+def compute_template_fingerprint(stats):
+    """Dấu vân tay cấu trúc của tài liệu từ read_document_stats(..., layout=True).
+
+    Gồm chuỗi thiết lập sectPr của các phần và hình dạng nội dung thô của từng phần
+    (số đoạn văn, bảng, hình ảnh, ngắt trang); không phụ thuộc vào văn bản nên các tài liệu
+    trộn thư (mail merge) từ cùng một mẫu có cùng dấu vân tay.
+    """
+    shape = [
+        [
+            detail.get("layout"),
+            detail["start_type"],
+            detail["paragraphs"],
+            detail["tables"],
+            detail["images"],
+            detail["page_breaks"]
+        ]
+        for detail in stats["sections_detail"]
+    ]
+    return hashlib.sha256(json.dumps(shape, separators=(',', ':')).encode("utf-8")).hexdigest()
+
+
+def content_presence(stats):
+    """Phần nào có văn bản, bảng hoặc hình ảnh trong XML (danh sách bool theo thứ tự phần)."""
+    return [
+        bool(detail["non_empty_paragraphs"] or detail["tables"] or detail["images"])
+        for detail in stats["sections_detail"]
+    ]
+
+
+def confirm_plan(stats, presence, verdicts):
+    """Kiểm tra rẻ trước khi dùng kết luận của mẫu.
+
+    Trường trộn thư để trống có thể làm một phần mất hết văn bản mà không đổi dấu vân tay;
+    vì quy tắc trang trắng phụ thuộc vào việc phần đó và các phần lân cận có nội dung hay không,
+    kết luận chỉ được dùng lại khi các phần có nội dung trùng khớp hoàn toàn với tài liệu mẫu.
+    """
+    return len(verdicts) == len(stats["sections_detail"]) and content_presence(stats) == presence
+
+
+class TemplatePlanCache:
+    """Bộ nhớ đệm kết luận trang trắng theo dấu vân tay cấu trúc (mẫu tài liệu).
+
+    Khi một tài liệu có cùng dấu vân tay với tài liệu đã phân tích, kết luận của mẫu được
+    dùng lại sau khi confirm_plan xác nhận, thay vì chạy lại toàn bộ bộ phát hiện; nếu xác
+    nhận thất bại, tài liệu được phân tích bình thường. Dùng chung được giữa các luồng.
+    """
+
+    def __init__(self, max_templates=256):
+        self.max_templates = max_templates
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, stats):
+        """Trả về danh sách kết luận từng phần của mẫu khớp với tài liệu, hoặc None."""
+        fingerprint = compute_template_fingerprint(stats)
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                self._entries.move_to_end(fingerprint)
+        if entry is None:
+            TEMPLATE_PLAN_CHECKS.inc(result="miss")
+            return None
+        presence, verdicts = entry
+        if not confirm_plan(stats, presence, verdicts):
+            TEMPLATE_PLAN_CHECKS.inc(result="rejected")
+            logger.info("Tài liệu khớp mẫu đã biết nhưng không qua kiểm tra xác nhận, phân tích lại toàn bộ")
+            return None
+
+        TEMPLATE_PLAN_CHECKS.inc(result="hit")
+        logger.info(f"Dùng kết luận của mẫu đã biết cho {len(verdicts)} phần")
+        return [dict(verdict, sources=list(verdict['sources'])) for verdict in verdicts]
+
+    def store(self, stats, verdicts):
+        """Lưu kết luận của tài liệu vừa phân tích làm kết luận của mẫu; trả về True nếu đã lưu.
+
+        Không lưu khi còn phần chưa kết luận hoặc có kết luận dựa trên số trang thực tế.
+        """
+        if len(verdicts) != len(stats["sections_detail"]):
+            return False
+        for verdict in verdicts:
+            if verdict['status'] == 'undecided' or any(source in TEXT_DEPENDENT_SOURCES
+                                                       for source in verdict['sources']):
+                return False
+
+        verdicts = [
+            {
+                'status': verdict['status'],
+                'confidence': verdict['confidence'],
+                'detection_method': verdict['detection_method'],
+                'sources': [source for source in verdict['sources'] if source not in ('cache', 'template')]
+            }
+            for verdict in verdicts
+        ]
+        fingerprint = compute_template_fingerprint(stats)
+        with self._lock:
+            self._entries[fingerprint] = (content_presence(stats), verdicts)
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_templates:
+                self._entries.popitem(last=False)
+        return True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
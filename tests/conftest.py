@@ -0,0 +1,34 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_docx(sections):
+    """Tạo tài liệu .docx (bytes) từ danh sách (kiểu ngắt phần, danh sách đoạn văn).
+
+    Kiểu ngắt là tên trong WD_SECTION_START, ví dụ "NEW_PAGE" hoặc "CONTINUOUS".
+    """
+    from docx import Document
+    from docx.enum.section import WD_SECTION_START
+
+    document = Document()
+    for i, (start_type, paragraphs) in enumerate(sections):
+        if i == 0:
+            section = document.sections[0]
+        else:
+            section = document.add_section(getattr(WD_SECTION_START, start_type))
+        section.start_type = getattr(WD_SECTION_START, start_type)
+        for text in paragraphs:
+            document.add_paragraph(text)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def make_docx():
+    return build_docx
@@ -0,0 +1,46 @@
+import io
+import tarfile
+import zipfile
+
+from docx import Document
+from docx.enum.section import WD_SECTION_START
+
+import archive_batch
+from fingerprint import is_already_processed
+
+
+def _write_zip(path, entries):
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        for name, data in entries.items():
+            zip_file.writestr(name, data)
+
+
+def test_zip_archive_is_processed_without_extracting(make_docx, tmp_path):
+    blank = make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])])
+    input_path, output_path = tmp_path / "in.zip", tmp_path / "out.zip"
+    _write_zip(input_path, {"docs/a.docx": blank, "docs/broken.docx": b"not a zip", "readme.txt": b"x"})
+
+    results = archive_batch.process_archive(str(input_path), str(output_path), workers=2)
+    statuses = {result["path"]: result["status"] for result in results}
+    assert statuses == {"docs/a.docx": "fixed", "docs/broken.docx": "rejected"}
+
+    with zipfile.ZipFile(output_path) as zip_file:
+        assert sorted(zip_file.namelist()) == ["docs/a.docx", "docs/broken.docx", "readme.txt"]
+        fixed = zip_file.read("docs/a.docx")
+        assert zip_file.read("docs/broken.docx") == b"not a zip"
+    assert is_already_processed(fixed)
+    assert Document(io.BytesIO(fixed)).sections[1].start_type == WD_SECTION_START.CONTINUOUS
+
+    # Chạy lại trên kết quả: tài liệu đã có dấu được bỏ qua và ghi nguyên bản
+    rerun = archive_batch.process_archive(str(output_path), str(tmp_path / "again.zip"), copy_other=False)
+    assert {result["path"]: result["status"] for result in rerun} == {"docs/a.docx": "skipped",
+                                                                      "docs/broken.docx": "rejected"}
+
+
+def test_tar_archive_output(make_docx, tmp_path):
+    input_path, output_path = tmp_path / "in.zip", tmp_path / "out.tar.gz"
+    _write_zip(input_path, {"a.docx": make_docx([("NEW_PAGE", ["a"])])})
+    results = archive_batch.process_archive(str(input_path), str(output_path), max_in_flight_bytes=1)
+    assert [result["status"] for result in results] == ["clean"]
+    with tarfile.open(output_path) as tar:
+        assert tar.getnames() == ["a.docx"]
@@ -0,0 +1,90 @@
+import asyncio
+import io
+import threading
+import time
+
+import pytest
+from docx import Document
+from docx.enum.section import WD_SECTION_START
+
+import word_processor_2
+from async_api import AsyncWordProcessor
+
+SECTIONS = [("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])]
+
+
+def test_process_fixes_and_saves(make_docx, tmp_path):
+    source = tmp_path / "a.docx"
+    source.write_bytes(make_docx(SECTIONS))
+    output = tmp_path / "a_fixed.docx"
+
+    async def run():
+        async with AsyncWordProcessor(max_cpu_workers=2) as processor:
+            return await processor.process(str(source), str(output))
+
+    assert asyncio.run(run()) == 1
+    assert Document(str(output)).sections[1].start_type == WD_SECTION_START.CONTINUOUS
+
+
+def test_process_returns_none_for_unreadable_file(tmp_path):
+    source = tmp_path / "broken.docx"
+    source.write_bytes(b"not a docx")
+
+    async def run():
+        async with AsyncWordProcessor() as processor:
+            return await processor.process(str(source), str(tmp_path / "out.docx"))
+
+    assert asyncio.run(run()) is None
+
+
+def test_open_bytes_and_save_bytes(make_docx):
+    async def run():
+        async with AsyncWordProcessor() as processor:
+            document = processor.document()
+            assert await document.open_bytes(make_docx(SECTIONS), "a.docx")
+            sections_info = await document.analyze()
+            assert await document.fix() == 1
+            return sections_info, await document.save_bytes()
+
+    sections_info, data = asyncio.run(run())
+    assert [section["is_empty_page"] for section in sections_info] == [False, True, False]
+    assert Document(io.BytesIO(data)).sections[1].start_type == WD_SECTION_START.CONTINUOUS
+
+
+def test_cancel_waits_for_running_step(make_docx):
+    started, finished = threading.Event(), threading.Event()
+
+    def slow_analyze(plan_path=None):
+        started.set()
+        time.sleep(0.2)
+        finished.set()
+        return []
+
+    async def run():
+        async with AsyncWordProcessor(max_cpu_workers=1) as processor:
+            document = processor.document()
+            assert await document.open_bytes(make_docx(SECTIONS), "a.docx")
+            document.processor.analyze_document = slow_analyze
+            task = asyncio.create_task(document.analyze())
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # CancelledError chỉ được ném ra sau khi bước đang chạy đã xong
+            assert finished.is_set()
+            # Semaphore CPU đã được trả lại: bước tiếp theo vẫn chạy được
+            return await asyncio.wait_for(document.get_document_info(), 5)
+
+    assert asyncio.run(run())["sections"] == 3
+
+
+def test_count_pages_without_word_returns_none(make_docx, monkeypatch):
+    monkeypatch.setattr(word_processor_2, "win32com", None)
+    monkeypatch.setattr(word_processor_2, "comtypes", None)
+
+    async def run():
+        async with AsyncWordProcessor() as processor:
+            return await processor.count_pages(make_docx(SECTIONS))
+
+    assert asyncio.run(run()) is None
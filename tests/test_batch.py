@@ -0,0 +1,88 @@
+import io
+import zipfile
+
+import batch
+from fingerprint import is_already_processed
+
+
+def _write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def _statuses(results):
+    return [result["status"] for result in results]
+
+
+def test_output_dir_rerun_skips_until_input_changes(make_docx, tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    _write(input_dir / "a.docx", make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", ["b"])]))
+
+    assert _statuses(batch.process_batch([str(input_dir)], str(output_dir))) == ["clean"]
+    assert is_already_processed(str(output_dir / "a.docx"))
+    assert _statuses(batch.process_batch([str(input_dir)], str(output_dir))) == ["skipped"]
+
+    _write(input_dir / "a.docx", make_docx([("NEW_PAGE", ["a đã sửa"]), ("NEW_PAGE", ["b"])]))
+    assert _statuses(batch.process_batch([str(input_dir)], str(output_dir))) == ["clean"]
+
+
+def test_stamped_input_is_copied_to_output_dir(make_docx, tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    _write(input_dir / "a.docx", make_docx([("NEW_PAGE", ["a"])]))
+    batch.process_batch([str(input_dir)], in_place=True)
+
+    assert _statuses(batch.process_batch([str(input_dir)], str(output_dir))) == ["skipped"]
+    assert (output_dir / "a.docx").read_bytes() == (input_dir / "a.docx").read_bytes()
+
+
+def test_watch_processes_only_new_or_changed_files(make_docx, tmp_path):
+    _write(tmp_path / "a.docx", make_docx([("NEW_PAGE", ["a"])]))
+    rounds = []
+    batch.watch_batch([str(tmp_path)], interval=0, on_results=rounds.append, rounds=2, in_place=True)
+    # Lần quét thứ hai không thấy thay đổi, kể cả tệp vừa được ghi đè kèm dấu
+    assert [_statuses(results) for results in rounds] == [["clean"]]
+
+    _write(tmp_path / "b.docx", make_docx([("NEW_PAGE", ["b"])]))
+    rounds = []
+    batch.watch_batch([str(tmp_path)], interval=0, on_results=rounds.append, rounds=1, in_place=True)
+    assert sorted(_statuses(rounds[0])) == ["clean", "skipped"]
+
+
+def _document_xml(source):
+    with zipfile.ZipFile(io.BytesIO(source) if isinstance(source, bytes) else source) as zip_file:
+        return zip_file.read("word/document.xml")
+
+
+def _as_saved_by_word(data):
+    """Gói .docx mà python-docx sẽ ghi lại khác đi (khai báo XML kiểu Word), để nhận ra việc ghi lại."""
+    output = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as source, zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            part = source.read(info.filename)
+            if info.filename == "word/document.xml":
+                part = part.replace(b"<?xml version='1.0' encoding='UTF-8' standalone='yes'?>",
+                                    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>')
+            target.writestr(info, part)
+    return output.getvalue()
+
+
+def test_in_place_clean_file_body_is_not_rewritten(make_docx, tmp_path):
+    original = _as_saved_by_word(make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", ["b"])]))
+    path = _write(tmp_path / "a.docx", original)
+
+    assert _statuses(batch.process_batch([path], in_place=True, stamp=False)) == ["clean"]
+    assert (tmp_path / "a.docx").read_bytes() == original
+
+    # Có đóng dấu: chỉ thêm dấu, phần thân tài liệu giữ nguyên từng byte
+    assert _statuses(batch.process_batch([path], in_place=True)) == ["clean"]
+    assert _document_xml(path) == _document_xml(original)
+    assert is_already_processed(path)
+
+
+def test_in_place_fixed_file_is_saved(make_docx, tmp_path):
+    path = _write(tmp_path / "a.docx", make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])]))
+    results = batch.process_batch([path], in_place=True)
+    assert _statuses(results) == ["fixed"] and results[0]["changes"] == 1
+    assert is_already_processed(path)
@@ -0,0 +1,61 @@
+import json
+
+from docx.enum.section import WD_SECTION_START
+
+from word_processor_1 import WordProcessor
+
+SECTIONS = [("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])]
+
+
+def _fixed_processor(make_docx):
+    processor = WordProcessor()
+    assert processor.open_document_bytes(make_docx(SECTIONS), "a.docx")
+    processor.analyze_document()
+    assert processor.fix_empty_pages() == 1
+    return processor
+
+
+def test_undo_and_redo_restore_section_types(make_docx):
+    processor = _fixed_processor(make_docx)
+    section = processor.document.sections[1]
+    assert section.start_type == WD_SECTION_START.CONTINUOUS
+    assert processor.sections_info[1]["fixed"]
+
+    assert processor.undo_fix() == 1
+    assert section.start_type == WD_SECTION_START.NEW_PAGE
+    assert "fixed" not in processor.sections_info[1]
+    assert processor.undo_fix() == 0
+
+    assert processor.redo_fix() == 1
+    assert section.start_type == WD_SECTION_START.CONTINUOUS
+    assert processor.redo_fix() == 0
+
+
+def test_new_change_after_undo_drops_redo_history(make_docx):
+    processor = _fixed_processor(make_docx)
+    processor.undo_fix()
+    processor.change_log.record(2, WD_SECTION_START.NEW_PAGE, WD_SECTION_START.CONTINUOUS, "manual")
+    assert not processor.change_log.can_redo()
+    assert processor.change_log.can_undo()
+
+
+def test_export_lists_changes_by_group(make_docx, tmp_path):
+    processor = _fixed_processor(make_docx)
+    path = processor.export_change_log(str(tmp_path / "changes.json"))
+    with open(path, encoding="utf-8") as f:
+        exported = json.load(f)
+    assert exported["applied_groups"] == 1
+    group = exported["groups"][0]
+    assert group["name"] == "fix_empty_pages"
+    assert group["changes"] == [{"section_index": 1, "old_type": "NEW_PAGE", "new_type": "CONTINUOUS",
+                                 "source": "page_analyzer"}]
+
+
+def test_empty_group_keeps_redo_history(make_docx):
+    processor = _fixed_processor(make_docx)
+    processor.undo_fix()
+    # Mọi trang đều bị bỏ qua (độ tin cậy thấp): nhóm rỗng không được xóa lịch sử làm lại
+    processor.empty_pages = [dict(page, confidence='low') for page in processor.empty_pages]
+    assert processor.fix_empty_pages() == 0
+    assert processor.change_log.can_redo()
+    assert processor.redo_fix() == 1
@@ -0,0 +1,43 @@
+import sqlite3
+
+import pytest
+
+from corpus_index import CorpusIndex
+
+
+class _NoSectionsDetector:
+    def run_detection(self, docx_path):
+        return {"verdicts": []}
+
+
+def test_refresh_indexes_and_skips_unchanged_files(make_docx, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.docx").write_bytes(make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])]))
+    with CorpusIndex(str(tmp_path / "index.db")) as index:
+        assert index.refresh([str(docs)])["analyzed"] == 1
+        assert index.refresh([str(docs)])["unchanged"] == 1
+        assert index.summary()["files"] == 1
+        (docs / "a.docx").unlink()
+        assert index.refresh([str(docs)])["removed"] == 1
+
+
+@pytest.mark.parametrize("db_name", ["index.db", ":memory:"])
+def test_query_is_read_only(make_docx, tmp_path, db_name):
+    (tmp_path / "a.docx").write_bytes(make_docx([("NEW_PAGE", ["a"])]))
+    db_path = db_name if db_name == ":memory:" else str(tmp_path / db_name)
+    with CorpusIndex(db_path) as index:
+        index.refresh([str(tmp_path)])
+        assert index.query("SELECT COUNT(*) AS n FROM files") == [{"n": 1}]
+        with pytest.raises(sqlite3.OperationalError):
+            index.query("DELETE FROM files")
+        assert index.query("SELECT COUNT(*) AS n FROM files") == [{"n": 1}]
+        # Kết nối ghi vẫn dùng được sau truy vấn
+        assert index.refresh([str(tmp_path)], prune=False)["unchanged"] == 1
+
+
+def test_document_without_sections_is_not_an_error(make_docx, tmp_path):
+    (tmp_path / "a.docx").write_bytes(make_docx([("NEW_PAGE", ["a"])]))
+    with CorpusIndex(str(tmp_path / "index.db"), detector=_NoSectionsDetector()) as index:
+        assert index.refresh([str(tmp_path)])["analyzed"] == 1
+        assert index.summary()["errors"] == 0
@@ -0,0 +1,43 @@
+import io
+
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+from docx_stats import read_document_stats
+
+
+def test_stats_match_python_docx(make_docx):
+    data = make_docx([("NEW_PAGE", ["a", "", "b"]), ("CONTINUOUS", []), ("ODD_PAGE", ["c"])])
+    document = Document(io.BytesIO(data))
+    stats = read_document_stats(data)
+
+    assert stats["sections"] == len(document.sections) == 3
+    assert stats["paragraphs"] == len(document.paragraphs)
+    assert stats["tables"] == 0
+    assert [detail["start_type"] for detail in stats["sections_detail"]] == ["nextPage", "continuous", "oddPage"]
+    assert [detail["non_empty_paragraphs"] for detail in stats["sections_detail"]] == [2, 0, 1]
+
+
+def test_fingerprints_change_only_for_edited_sections(make_docx):
+    before = read_document_stats(make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", ["b"])]), fingerprints=True)
+    after = read_document_stats(make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", ["b đã sửa"])]), fingerprints=True)
+    fingerprints = [[detail["fingerprint"] for detail in stats["sections_detail"]] for stats in (before, after)]
+    assert fingerprints[0][0] == fingerprints[1][0]
+    assert fingerprints[0][1] != fingerprints[1][1]
+
+
+def test_alternate_content_image_is_counted_once():
+    document = Document()
+    run = document.add_paragraph().add_run()
+    run._r.append(parse_xml(
+        f'<mc:AlternateContent {nsdecls("w")} xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006">'
+        '<mc:Choice Requires="wps"><w:drawing/></mc:Choice><mc:Fallback><w:pict/></mc:Fallback>'
+        '</mc:AlternateContent>'))
+    document.add_paragraph().add_run()._r.append(parse_xml(f'<w:pict {nsdecls("w")}/>'))
+    buffer = io.BytesIO()
+    document.save(buffer)
+
+    stats = read_document_stats(buffer.getvalue())
+    assert stats["images"] == 2
+    assert stats["sections_detail"][0]["images"] == 2
@@ -0,0 +1,76 @@
+import io
+import logging
+
+import pytest
+from docx import Document
+from docx.enum.section import WD_SECTION_START
+
+import fix_plan
+
+
+def _start_types(data):
+    return [section.start_type for section in Document(io.BytesIO(data)).sections]
+
+
+def test_plan_only_contains_sections_that_change(make_docx):
+    data = make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("ODD_PAGE", []), ("NEW_PAGE", ["b"])])
+    empty_pages = [
+        {"section_index": 2, "type": WD_SECTION_START.ODD_PAGE},
+        {"section_index": 1, "type": WD_SECTION_START.NEW_PAGE}
+    ]
+    plan = fix_plan.create_fix_plan(data, empty_pages, file_name="a.docx")
+    assert plan["changes"] == [{"section_index": 1, "from_type": "NEW_PAGE", "start_type": "CONTINUOUS",
+                                "confidence": "high"}]
+    assert plan["file_hash"] == fix_plan.compute_document_hash(data)
+
+
+def test_apply_plan_round_trip(make_docx, tmp_path):
+    data = make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])])
+    plan = fix_plan.create_fix_plan(data, [{"section_index": 1, "type": WD_SECTION_START.NEW_PAGE}])
+    plan_path = fix_plan.save_fix_plan(plan, str(tmp_path / "plan.json"))
+
+    output = io.BytesIO()
+    assert fix_plan.apply_fix_plan(fix_plan.load_fix_plan(plan_path), data, output) == 1
+    assert _start_types(output.getvalue())[1] == WD_SECTION_START.CONTINUOUS
+
+
+def test_plan_and_apply_only_fix_high_confidence(make_docx):
+    data = make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])])
+    empty_pages = [
+        {"section_index": 1, "type": WD_SECTION_START.NEW_PAGE, "confidence": "medium"},
+        {"section_index": 2, "type": WD_SECTION_START.NEW_PAGE, "confidence": "high"}
+    ]
+    plan = fix_plan.create_fix_plan(data, empty_pages)
+    assert [change["section_index"] for change in plan["changes"]] == [2]
+
+    # Kế hoạch bị sửa tay thêm kết luận độ tin cậy thấp cũng không được áp dụng
+    plan["changes"].append({"section_index": 1, "from_type": "NEW_PAGE", "start_type": "CONTINUOUS",
+                            "confidence": "low"})
+    output = io.BytesIO()
+    assert fix_plan.apply_fix_plan(plan, data, output) == 1
+    assert _start_types(output.getvalue())[1:3] == [WD_SECTION_START.NEW_PAGE, WD_SECTION_START.CONTINUOUS]
+
+
+def test_apply_without_hash_skips_sections_of_other_types(make_docx):
+    plan = {"version": fix_plan.FIX_PLAN_VERSION, "file_hash": "x",
+            "changes": [{"section_index": 1, "from_type": "NEW_PAGE", "start_type": "CONTINUOUS"}]}
+    data = make_docx([("NEW_PAGE", ["a"]), ("ODD_PAGE", []), ("NEW_PAGE", ["b"])])
+    output = io.BytesIO()
+    assert fix_plan.apply_fix_plan(plan, data, output, verify_hash=False) == 0
+    assert _start_types(output.getvalue())[1] == WD_SECTION_START.ODD_PAGE
+
+
+def test_hash_mismatch_does_not_log_document_bytes(make_docx, caplog):
+    data = make_docx([("NEW_PAGE", ["nội dung bí mật"])])
+    plan = {"version": fix_plan.FIX_PLAN_VERSION, "file_hash": "0" * 64, "file_name": "hop_dong.docx", "changes": []}
+    with caplog.at_level(logging.ERROR, logger="fix_plan"):
+        assert fix_plan.apply_fix_plan(plan, data, io.BytesIO()) is False
+    assert "hop_dong.docx" in caplog.text
+    assert "PK" not in caplog.text and len(caplog.text) < 500
+
+
+def test_load_rejects_unknown_start_type(tmp_path):
+    path = tmp_path / "plan.json"
+    path.write_text('{"version": 1, "file_hash": "x", "changes": [{"section_index": 0, "start_type": "SIDEWAYS"}]}')
+    with pytest.raises(ValueError):
+        fix_plan.load_fix_plan(str(path))
@@ -0,0 +1,53 @@
+import json
+
+import memory_benchmark as mb
+
+
+def _report(peak, rss, rss_delta):
+    stage = {"peak_traced": peak, "current_traced": 0, "rss": rss, "rss_delta": rss_delta, "seconds": 0.1}
+    return {"small": {name: dict(stage) for name in mb.STAGES}}
+
+
+def test_budget_uses_rss_delta_not_absolute_rss():
+    budget = mb.build_budget(_report(1000, 50_000_000, 1_000_000), headroom=0.2)
+    assert set(budget["small"]["open"]) == {"peak_traced", "rss_delta"}
+    assert budget["small"]["open"]["rss_delta"] == 1_200_000 + mb.RSS_DELTA_MIN_SLACK
+
+    # RSS tuyệt đối tăng do các kích thước chạy trước không được tính là vượt ngân sách
+    assert mb.compare_with_budget(_report(1000, 500_000_000, 1_000_000), budget) == []
+
+
+def test_budget_violation_reported():
+    budget = mb.build_budget(_report(1000, 0, 0), headroom=0.2)
+    violations = mb.compare_with_budget(_report(5000, 0, 0), budget)
+    assert len(violations) == len(mb.STAGES)
+    assert all("peak_traced" in violation for violation in violations)
+
+
+def test_negative_rss_delta_gets_slack():
+    budget = mb.build_budget(_report(1000, 0, -4_000_000))
+    assert budget["small"]["fix"]["rss_delta"] == mb.RSS_DELTA_MIN_SLACK
+
+
+def test_rss_slack_grows_with_document_size():
+    small = _report(1000, 0, 0)
+    small["small"]["file_size"] = 10_000
+    large = _report(1000, 0, 0)
+    large["small"]["file_size"] = 1_000_000
+    small_limit = mb.build_budget(small)["small"]["save"]["rss_delta"]
+    large_limit = mb.build_budget(large)["small"]["save"]["rss_delta"]
+    assert large_limit - small_limit == mb.RSS_DELTA_SLACK_PER_BYTE * 990_000
+
+
+def test_committed_budget_covers_every_size_and_stage():
+    with open(mb.DEFAULT_BUDGET_PATH, encoding="utf-8") as f:
+        budget = json.load(f)
+    assert set(budget) == set(mb.DOCUMENT_SIZES)
+    for stages in budget.values():
+        assert set(stages) == set(mb.STAGES)
+
+
+def test_missing_budget_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(mb, "run_benchmark", lambda sizes=None: _report(1000, 0, 0))
+    monkeypatch.setattr("sys.argv", ["memory_benchmark.py", "--budget", str(tmp_path / "missing.json")])
+    assert mb.main() == 2
@@ -0,0 +1,50 @@
+from urllib.request import urlopen
+
+import pytest
+
+from metrics import MetricsRegistry, start_http_server
+
+
+def test_counter_and_histogram_render_prometheus_text():
+    registry = MetricsRegistry()
+    counter = registry.counter("docs_total", "Tài liệu", ("result",))
+    histogram = registry.histogram("stage_seconds", "Thời gian", ("stage",), buckets=(0.1, 1.0))
+    counter.inc(result="fixed")
+    counter.inc(2, result='a"b')
+    histogram.observe(0.5, stage="open")
+
+    text = registry.render()
+    assert 'docs_total{result="fixed"} 1' in text
+    assert 'docs_total{result="a\\"b"} 2' in text
+    assert 'stage_seconds_bucket{stage="open",le="0.1"} 0' in text
+    assert 'stage_seconds_bucket{stage="open",le="+Inf"} 1' in text
+    assert 'stage_seconds_count{stage="open"} 1' in text
+    assert histogram.get(stage="open") == (1, 0.5)
+
+
+def test_invalid_use_is_rejected():
+    registry = MetricsRegistry()
+    counter = registry.counter("docs_total", "Tài liệu", ("result",))
+    with pytest.raises(ValueError):
+        counter.inc(-1, result="x")
+    with pytest.raises(ValueError):
+        counter.inc(stage="x")
+    assert registry.counter("docs_total", "Tài liệu", ("result",)) is counter
+    with pytest.raises(ValueError):
+        registry.histogram("docs_total", "Tài liệu", ("result",))
+
+
+def test_textfile_and_http_exposition(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("runs_total", "Số lần chạy").inc()
+    path = registry.write_textfile(str(tmp_path / "metrics.prom"))
+    assert "runs_total 1" in open(path, encoding="utf-8").read()
+    assert [p.name for p in tmp_path.iterdir()] == ["metrics.prom"]
+
+    server = start_http_server(0, registry=registry)
+    try:
+        with urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5) as response:
+            assert "runs_total 1" in response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,46 @@
+from docx.enum.section import WD_SECTION_START
+from docx import Document
+import io
+
+from docx_stats import read_document_stats
+from word_processor_2 import EmptyPageDetector, PageAnalyzer
+
+
+def _state(data):
+    stats = read_document_stats(data)
+    verdicts = [
+        {'status': 'undecided', 'type': WD_SECTION_START.NEW_PAGE, 'confidence': None,
+         'detection_method': None, 'sources': []}
+        for _ in stats['sections_detail']
+    ]
+    return {'docx_path': data, 'stats': stats, 'verdicts': verdicts, 'page_count': None}
+
+
+def test_page_surplus_does_not_mark_sections_empty(make_docx):
+    data = make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])])
+    detector = EmptyPageDetector(page_count_backend=lambda source: 10)
+    state = _state(data)
+    detector._evidence_page_count(state, [1])
+    assert state['verdicts'][1]['status'] == 'undecided'
+
+
+def test_page_count_rules_out_empty_pages(make_docx):
+    data = make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])])
+    detector = EmptyPageDetector(page_count_backend=lambda source: 2)
+    state = _state(data)
+    detector._evidence_page_count(state, [1])
+    assert state['verdicts'][1]['status'] == 'not_empty'
+    assert state['verdicts'][1]['sources'] == ['page_count']
+
+
+def test_fix_skips_verdicts_below_high_confidence(make_docx):
+    data = make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])])
+    document = Document(io.BytesIO(data))
+    analyzer = PageAnalyzer(data)
+    empty_pages = [
+        {'section_index': 1, 'type': WD_SECTION_START.NEW_PAGE, 'confidence': 'low'},
+        {'section_index': 2, 'type': WD_SECTION_START.NEW_PAGE, 'confidence': 'high'}
+    ]
+    assert analyzer.fix_empty_pages(document, empty_pages) == 1
+    assert document.sections[1].start_type == WD_SECTION_START.NEW_PAGE
+    assert document.sections[2].start_type == WD_SECTION_START.CONTINUOUS
@@ -0,0 +1,87 @@
+import json
+import socket
+import threading
+
+import pytest
+
+from page_count_rpc import (HEADER_LENGTH, PageCountServer, RemotePageCountBackend, document_hash,
+                            recv_message, send_message)
+
+
+@pytest.fixture
+def socket_pair():
+    left, right = socket.socketpair()
+    yield left, right
+    left.close()
+    right.close()
+
+
+def test_message_round_trip(socket_pair):
+    left, right = socket_pair
+    send_message(left, {"op": "COUNT", "hash": "abc"}, b"payload")
+    header, payload = recv_message(right)
+    assert header == {"op": "COUNT", "hash": "abc", "v": 1, "payload_size": 7}
+    assert payload == b"payload"
+
+
+def test_closed_connection_and_bad_version(socket_pair):
+    left, right = socket_pair
+    encoded = json.dumps({"v": 99, "payload_size": 0}).encode("utf-8")
+    left.sendall(HEADER_LENGTH.pack(len(encoded)) + encoded)
+    with pytest.raises(ValueError):
+        recv_message(right)
+    left.close()
+    assert recv_message(right) == (None, None)
+
+
+def _server(max_store_bytes=1024 * 1024):
+    counted = []
+
+    def count_pages(data):
+        counted.append(data)
+        return len(data)
+
+    return PageCountServer(count_pages, port=0, max_store_bytes=max_store_bytes), counted
+
+
+def test_batch_larger_than_store_is_counted_from_payload():
+    server, counted = _server(max_store_bytes=10)
+    try:
+        documents = [b"a" * 8, b"b" * 9, b"c" * 7]
+        items = [{"hash": document_hash(data), "size": len(data)} for data in documents]
+        response = server.handle_request_message({"op": "BATCH", "items": items}, b"".join(documents))
+        assert response == {"ok": True, "pages": [8, 9, 7]}
+        # Chỉ tài liệu cuối còn trong kho, hash của nó được dùng lại
+        response = server.handle_request_message({"op": "COUNT", "hash": items[2]["hash"], "size": 0}, b"")
+        assert response == {"ok": True, "pages": 7}
+        response = server.handle_request_message({"op": "COUNT", "hash": items[0]["hash"], "size": 0}, b"")
+        assert response["error"] == "unknown_hash"
+    finally:
+        server.server_close()
+
+
+def test_rejects_mismatched_payload():
+    server, _ = _server()
+    try:
+        header = {"op": "COUNT", "hash": document_hash(b"x"), "size": 1}
+        assert server.handle_request_message(header, b"y")["error"] == "hash_mismatch"
+        assert server.handle_request_message(dict(header, size=2), b"y")["error"] == "bad_payload"
+    finally:
+        server.server_close()
+
+
+def test_remote_backend_uploads_once_and_reuses_connections():
+    server, counted = _server()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    backend = RemotePageCountBackend(*server.server_address, max_connections=2, timeout=5)
+    try:
+        assert backend(b"abc") == 3
+        assert backend.count_many([b"abc", b"hello", b"hello"]) == [3, 5, 5]
+        assert backend.count_many([b"hello"]) == [5]
+        # Mỗi tài liệu chỉ được đếm một lần, các lần sau dùng kết quả theo hash
+        assert counted == [b"abc", b"hello"]
+    finally:
+        backend.close()
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,59 @@
+from docx_stats import read_document_stats
+from page_verification import FakePageCountBackend, PageCountVerifier, find_offenders
+from word_processor_1 import WordProcessor
+
+
+def _interacting_backend(source):
+    # Chỉ giảm một trang khi cả phần 1 và phần 2 cùng được chuyển sang Continuous
+    types = [section["start_type"] for section in read_document_stats(source)["sections_detail"]]
+    return 2 if types[1] == types[2] == "continuous" else 3
+
+
+def test_find_offenders_uses_known_total_delta():
+    calls = []
+
+    def page_delta(group):
+        calls.append(list(group))
+        return sum(1 for i in group if i in (3, 6))
+
+    assert find_offenders(range(8), page_delta, total_delta=2) == [3, 6]
+    assert list(range(8)) not in calls
+
+
+def test_bisect_finds_offenders_with_fake_backend(make_docx):
+    # Phần 0 đầy một trang nên phần 1 vẫn bắt đầu trang mới khi chuyển sang Continuous
+    data = make_docx([("NEW_PAGE", ["x"] * 3), ("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", ["b"] * 4)])
+    backend = FakePageCountBackend(lines_per_page=4)
+    verifier = PageCountVerifier(data, backend)
+    result = verifier.verify_bisect([2, 1])
+
+    assert result["offenders"] == [2]
+    assert result["consistent"]
+    assert result["baseline_pages"] == 4
+    # Trang gốc, toàn bộ ứng viên, nửa trái và lần kiểm tra lại; không đếm lại toàn bộ ứng viên
+    assert result["backend_calls"] == backend.calls == 4
+    assert PageCountVerifier(data, FakePageCountBackend(lines_per_page=4)).verify_individually([1, 2])["offenders"] == [2]
+
+
+def test_bisect_reports_non_additive_page_counts(make_docx):
+    data = make_docx([("NEW_PAGE", ["x"]), ("NEW_PAGE", []), ("NEW_PAGE", [])])
+
+    result = PageCountVerifier(data, _interacting_backend).verify_bisect([1, 2])
+    assert result["offenders"] == [2]
+    assert not result["consistent"]
+
+
+def test_inconsistent_bisection_keeps_original_verdicts(make_docx):
+    data = make_docx([("NEW_PAGE", ["x"]), ("NEW_PAGE", []), ("NEW_PAGE", [])])
+
+    processor = WordProcessor()
+    processor.page_count_backend = _interacting_backend
+    assert processor.open_document_bytes(data, "a.docx")
+    processor.analyze_document()
+    before = [dict(page) for page in processor.empty_pages]
+    assert [page['section_index'] for page in before] == [1, 2]
+
+    result = processor.verify_empty_pages()
+    assert not result["consistent"]
+    assert processor.empty_pages == before
+    assert [info["is_empty_page"] for info in processor.sections_info] == [False, True, True]
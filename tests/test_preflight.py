@@ -0,0 +1,63 @@
+import io
+import zipfile
+
+import pytest
+
+import archive_batch
+import batch
+import preflight
+import word_processor_1
+from preflight import OLE_MAGIC, preflight_check
+
+
+def _zip(parts):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zip_file:
+        for name, data in parts.items():
+            zip_file.writestr(name, data)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("data, category", [
+    (b"", "empty"),
+    (OLE_MAGIC + b"\0" * 64 + "EncryptedPackage".encode("utf-16-le"), "encrypted"),
+    (OLE_MAGIC + b"\0" * 64 + "WordDocument".encode("utf-16-le"), "legacy_doc"),
+    (b"%PDF-1.7 ...", "not_zip"),
+    (_zip({"a.txt": "x"}), "missing_parts"),
+])
+def test_categories(data, category):
+    result = preflight_check(data)
+    assert result["category"] == category
+    assert not result["ok"]
+
+
+def test_valid_and_truncated_documents(make_docx, tmp_path):
+    data = make_docx([("NEW_PAGE", ["a"])])
+    assert preflight_check(data)["ok"]
+    assert preflight_check(data[:len(data) // 2])["category"] == "truncated"
+    assert preflight_check(str(tmp_path / "missing.docx"))["category"] == "not_found"
+
+
+@pytest.fixture
+def count_preflight(monkeypatch):
+    calls = []
+
+    def counting_check(source, *args, **kwargs):
+        calls.append(source)
+        return preflight.preflight_check(source, *args, **kwargs)
+
+    for module in (batch, archive_batch, word_processor_1):
+        monkeypatch.setattr(module, "preflight_check", counting_check)
+    return calls
+
+
+def test_batch_checks_each_file_once(make_docx, tmp_path, count_preflight):
+    (tmp_path / "a.docx").write_bytes(make_docx([("NEW_PAGE", ["a"])]))
+    assert [result["status"] for result in batch.process_batch([str(tmp_path)], in_place=True)] == ["clean"]
+    assert len(count_preflight) == 1
+
+
+def test_archive_document_is_checked_once(make_docx, count_preflight):
+    result, _ = archive_batch.process_document_bytes("a.docx", make_docx([("NEW_PAGE", ["a"])]))
+    assert result["status"] == "clean"
+    assert len(count_preflight) == 1
@@ -0,0 +1,32 @@
+import time
+
+from profiling import ProfileCapture, anonymize_path
+from session import DocumentSession
+
+
+def _function_names(capture):
+    return {name for _, _, name in capture._merged_stats().stats}
+
+
+def test_iter_analysis_runs_under_capture(make_docx):
+    capture = ProfileCapture()
+    session = DocumentSession("a.docx")
+    session.profile_capture = capture
+    assert session.open_bytes(make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])]), "a.docx")
+
+    events = [record["event"] for record in session.iter_analysis()]
+    assert events.count("section") == 3
+    assert "iter_detection" in _function_names(capture)
+
+
+def test_sampler_can_skip_idle_time():
+    with ProfileCapture(sample_interval=0.002, sample_idle=False) as capture:
+        time.sleep(0.1)
+        assert not capture.stacks
+        capture.run(time.sleep, 0.1)
+    assert sum(capture.stacks.values()) > 0
+
+
+def test_anonymize_path_keeps_only_app_relative_names():
+    assert anonymize_path("/home/user/secret/report.py") == "report.py"
+    assert anonymize_path("<frozen importlib._bootstrap>") == "<frozen importlib._bootstrap>"
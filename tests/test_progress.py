@@ -0,0 +1,32 @@
+from progress import ProgressReporter
+from batch import print_progress
+
+
+def test_progress_events_are_rate_limited_but_final_state_is_sent():
+    events = []
+    reporter = ProgressReporter(events.append, max_rate=1.0)
+    reporter.stage_start("analyze", total=100)
+    for current in range(1, 100):
+        reporter.advance("analyze", current, 100)
+    reporter.stage_end("analyze", sections=100)
+
+    kinds = [event["event"] for event in events]
+    assert kinds[0] == "start" and kinds[-1] == "end"
+    progress = [event for event in events if event["event"] == "progress"]
+    # Sự kiện đầu được gửi ngay, các sự kiện sau bị gộp, sự kiện cuối được gửi khi kết thúc
+    assert len(progress) == 2
+    assert progress[-1]["current"] == 99
+    assert events[-1]["sections"] == 100 and events[-1]["elapsed"] is not None
+
+
+def test_reporter_without_callback_is_silent():
+    reporter = ProgressReporter()
+    reporter.stage_start("open")
+    reporter.advance("open", 1, 2)
+    reporter.stage_end("open")
+
+
+def test_print_progress_writes_to_stderr(capsys):
+    print_progress({"event": "progress", "stage": "fix", "current": 1, "total": 2})
+    print_progress({"event": "end", "stage": "fix", "elapsed": 0.5})
+    assert capsys.readouterr().err == "  fix: 1/2\n  fix: xong sau 0.50s\n"
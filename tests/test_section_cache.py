@@ -0,0 +1,74 @@
+import io
+
+from docx import Document
+
+from metrics import SECTION_CACHE_LOOKUPS
+from section_cache import SectionVerdictCache
+from word_processor_1 import WordProcessor
+from word_processor_2 import EmptyPageDetector
+
+
+def _verdict(status):
+    return {'status': status, 'confidence': 'high', 'detection_method': None, 'sources': ['xml_content']}
+
+
+def test_plan_reuses_unchanged_sections_away_from_edits():
+    cache = SectionVerdictCache()
+    assert cache.plan("a", ["s0", "s1", "s2", "s3", "s4"]) == {}
+    cache.store("a", ["s0", "s1", "s2", "s3", "s4"], [_verdict('not_empty')] * 5)
+
+    # s2 thay đổi: s1..s3 phân tích lại vì quy tắc phụ thuộc vào phần liền kề
+    assert sorted(cache.plan("a", ["s0", "s1", "x2", "s3", "s4"])) == [0, 4]
+    # Thêm một phần ở đầu: các phần cũ dịch vị trí nhưng vẫn được ghép
+    assert sorted(cache.plan("a", ["new", "s0", "s1", "s2", "s3", "s4"])) == [2, 3, 4, 5]
+    assert cache.plan("b", ["s0"]) == {}
+
+
+def test_cache_is_keyed_by_absolute_path(make_docx, tmp_path):
+    cache = SectionVerdictCache()
+    for directory in ("one", "two"):
+        (tmp_path / directory).mkdir()
+        (tmp_path / directory / "report.docx").write_bytes(make_docx([("NEW_PAGE", [directory])]))
+        processor = WordProcessor()
+        processor.section_cache = cache
+        processor.open_document(str(tmp_path / directory / "report.docx"))
+        processor.analyze_document()
+    assert sorted(cache._entries) == [str(tmp_path / "one" / "report.docx"), str(tmp_path / "two" / "report.docx")]
+
+
+def test_content_sections_are_section_local(make_docx):
+    # Phần đầu dài: ước lượng theo vị trí đoạn văn sẽ gán nội dung cho cả phần 1 trống
+    data = make_docx([("NEW_PAGE", ["a"] * 20), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])])
+    content = EmptyPageDetector()._analyze_section_content(Document(io.BytesIO(data)), data)
+    assert content == {0, 2}
+
+
+def test_reuploaded_revision_reuses_sections_under_same_key(make_docx):
+    cache = SectionVerdictCache()
+    sections = [("NEW_PAGE", [f"phần {i}"]) for i in range(6)]
+    revised = list(sections)
+    revised[3] = ("NEW_PAGE", ["phần 3 đã sửa"])
+
+    evidence = []
+    for data in (make_docx(sections), make_docx(revised)):
+        processor = WordProcessor()
+        processor.section_cache = cache
+        assert processor.open_document_bytes(data, "upload.docx", document_key="doc-42")
+        evidence.append([section_info["evidence"] for section_info in processor.analyze_document()])
+
+    assert not any('cache' in sources for sources in evidence[0])
+    # Chỉ phần 3 (và hai phần liền kề) được phân tích lại
+    reused = [i for i, sources in enumerate(evidence[1]) if 'cache' in sources]
+    assert reused == [0, 1, 5]
+    assert list(cache._entries) == ["doc-42"]
+
+
+def test_lookups_are_counted_per_section():
+    hits, misses = SECTION_CACHE_LOOKUPS.get(result="hit"), SECTION_CACHE_LOOKUPS.get(result="miss")
+    cache = SectionVerdictCache()
+    cache.plan("a", ["s0", "s1", "s2", "s3", "s4"])
+    cache.store("a", ["s0", "s1", "s2", "s3", "s4"], [_verdict('not_empty')] * 5)
+    cache.plan("a", ["s0", "s1", "x2", "s3", "s4"])
+
+    assert SECTION_CACHE_LOOKUPS.get(result="hit") - hits == 2
+    assert SECTION_CACHE_LOOKUPS.get(result="miss") - misses == 5 + 3
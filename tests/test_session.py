@@ -0,0 +1,92 @@
+import threading
+
+from session import SessionManager
+
+SECTIONS = [("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])]
+
+
+def _open(manager, session_id, data):
+    session = manager.get_session(session_id)
+    assert session.open_bytes(data, f"{session_id}.docx")
+    return session
+
+
+def test_least_recently_used_idle_session_is_evicted(make_docx):
+    data = make_docx(SECTIONS)
+    manager = SessionManager(max_sessions=2)
+    first = _open(manager, "a", data)
+    _open(manager, "b", data)
+    manager.get_session("a")
+    first.analyze()
+
+    _open(manager, "c", data)
+    assert len(manager) == 2
+    assert manager.get_session("b", create=False) is None
+    assert manager.get_session("a", create=False) is first and first.has_document
+
+
+def test_eviction_skips_busy_and_pinned_sessions(make_docx):
+    data = make_docx(SECTIONS)
+    manager = SessionManager(max_sessions=1)
+    with manager.use("a") as pinned:
+        assert pinned.open_bytes(data, "a.docx")
+        # Phiên vừa trao cho bên gọi chưa được dùng cũng không bị giải phóng
+        handed_out = manager.get_session("b")
+        manager.get_session("c")
+        assert pinned.has_document
+        assert manager.get_session("b", create=False) is handed_out
+        assert len(manager) == 3
+
+    # Hết ghim: phiên rảnh bị giải phóng ngay, phiên đã trao nhưng chưa dùng vẫn được giữ
+    assert manager.get_session("a", create=False) is None
+    assert not pinned.has_document
+    assert len(manager) == 2
+
+
+def test_debug_toggle_does_not_wait_for_running_operation(make_docx):
+    manager = SessionManager()
+    session = _open(manager, "a", make_docx(SECTIONS))
+    holding, done = threading.Event(), threading.Event()
+
+    def hold_lock():
+        with session.lock:
+            holding.set()
+            done.wait(5)
+
+    worker = threading.Thread(target=hold_lock)
+    worker.start()
+    holding.wait(5)
+    try:
+        toggle = threading.Thread(target=manager.set_debug_mode, args=(True,))
+        toggle.start()
+        toggle.join(2)
+        assert not toggle.is_alive()
+        assert session.processor.debug_mode
+    finally:
+        done.set()
+        worker.join()
+
+
+def test_concurrent_open_and_analyze(make_docx):
+    documents = {f"doc{i}": make_docx(SECTIONS[:1] + [("NEW_PAGE", [])] * i + SECTIONS[2:]) for i in range(6)}
+    manager = SessionManager(max_sessions=2)
+    results, errors = {}, []
+
+    def work(session_id, data):
+        try:
+            with manager.use(session_id) as session:
+                assert session.open_bytes(data, f"{session_id}.docx")
+                sections_info = session.analyze()
+                results[session_id] = (len(sections_info), len(session.processor.empty_pages))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=item) for item in documents.items()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert results == {f"doc{i}": (i + 2, i) for i in range(6)}
+    assert len(manager) == 2
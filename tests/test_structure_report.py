@@ -0,0 +1,74 @@
+import io
+import json
+
+from docx import Document
+
+import word_processor_2
+from word_processor_2 import DocumentStructureReport, PageAnalyzer
+
+SECTIONS = [("NEW_PAGE", ["<b>Tiêu đề</b> & mục lục"]), ("NEW_PAGE", []), ("CONTINUOUS", ["nội dung"])]
+
+
+def _counting_stats(monkeypatch):
+    calls = []
+    read_document_stats = word_processor_2.read_document_stats
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return read_document_stats(*args, **kwargs)
+
+    monkeypatch.setattr(word_processor_2, "read_document_stats", counting)
+    return calls
+
+
+def test_report_is_lazy_and_computed_once(make_docx, monkeypatch):
+    data = make_docx(SECTIONS)
+    calls = _counting_stats(monkeypatch)
+    report = DocumentStructureReport(data, Document(io.BytesIO(data)), [])
+    assert calls == []
+
+    report.to_text()
+    report.to_json()
+    report.to_html()
+    assert len(calls) == 1
+
+
+def test_renderers_share_the_same_data(make_docx):
+    data = make_docx(SECTIONS)
+    analysis = PageAnalyzer(data).analyze(document=Document(io.BytesIO(data)))
+    report = analysis['document_structure']
+
+    text = report.to_text()
+    assert "Tổng số phần: 3" in text
+    assert "Kiểu ngắt phần: Continuous" in text
+
+    parsed = json.loads(report.to_json())
+    assert [section['type_name'] for section in parsed['sections']] == ["Next Page", "Next Page", "Continuous"]
+    assert [page['section_index'] for page in parsed['empty_pages']] == [1]
+
+
+def test_html_escapes_file_and_paragraph_text(make_docx, tmp_path):
+    path = tmp_path / "báo cáo <1> & 2.docx"
+    path.write_bytes(make_docx(SECTIONS))
+    rendered = DocumentStructureReport(str(path), Document(str(path)), []).to_html()
+
+    assert "báo cáo &lt;1&gt; &amp; 2.docx" in rendered
+    assert "&lt;b&gt;Tiêu đề&lt;/b&gt; &amp; mục lục" in rendered
+    assert "<b>Tiêu đề" not in rendered
+
+
+def test_report_reuses_analysis_instead_of_reopening(make_docx, monkeypatch):
+    # Tài liệu thứ hai được kết luận chỉ từ XML, bộ phát hiện không mở bằng python-docx
+    reports = [PageAnalyzer(make_docx(sections)).analyze()['document_structure']
+               for sections in (SECTIONS, [("NEW_PAGE", ["a"]), ("CONTINUOUS", ["b"])])]
+    calls = _counting_stats(monkeypatch)
+
+    def no_reopen(*args, **kwargs):
+        raise AssertionError("báo cáo không được mở lại tài liệu")
+
+    monkeypatch.setattr(word_processor_2, "Document", no_reopen)
+    parsed = [json.loads(report.to_json()) for report in reports]
+    assert calls == []
+    assert len(parsed[0]['sections']) == 3
+    assert [section['type_name'] for section in parsed[1]['sections']] == ["Next Page", "Continuous"]
+    assert "Kiểu ngắt phần: Continuous" in reports[1].to_text()
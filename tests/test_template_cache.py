@@ -0,0 +1,57 @@
+from docx_stats import read_document_stats
+from template_cache import TemplatePlanCache, compute_template_fingerprint
+from word_processor_2 import PageAnalyzer
+
+
+def _stats(data):
+    return read_document_stats(data, layout=True)
+
+
+def _verdicts(data):
+    return PageAnalyzer(data).analyze()['verdicts']
+
+
+def test_fingerprint_ignores_text_but_not_structure(make_docx):
+    first = make_docx([("NEW_PAGE", ["Kính gửi ông A"]), ("NEW_PAGE", []), ("NEW_PAGE", ["Trân trọng"])])
+    second = make_docx([("NEW_PAGE", ["Kính gửi bà B"]), ("NEW_PAGE", []), ("NEW_PAGE", ["Trân trọng"])])
+    other = make_docx([("NEW_PAGE", ["Kính gửi ông A"]), ("CONTINUOUS", []), ("NEW_PAGE", ["Trân trọng"])])
+    assert compute_template_fingerprint(_stats(first)) == compute_template_fingerprint(_stats(second))
+    assert compute_template_fingerprint(_stats(first)) != compute_template_fingerprint(_stats(other))
+
+
+def test_lookup_reuses_verdicts_for_same_template(make_docx):
+    first = make_docx([("NEW_PAGE", ["ông A"]), ("NEW_PAGE", []), ("NEW_PAGE", ["cuối"])])
+    second = make_docx([("NEW_PAGE", ["bà B"]), ("NEW_PAGE", []), ("NEW_PAGE", ["cuối"])])
+    cache = TemplatePlanCache()
+    assert cache.lookup(_stats(first)) is None
+    assert cache.store(_stats(first), _verdicts(first))
+
+    reused = cache.lookup(_stats(second))
+    assert [verdict['status'] for verdict in reused] == ['not_empty', 'empty', 'not_empty']
+
+    analysis = PageAnalyzer(second, template_cache=cache).analyze()
+    assert [page['section_index'] for page in analysis['empty_pages']] == [1]
+    assert 'template' in analysis['evidence_sources']
+
+
+def test_lookup_rejects_documents_whose_content_presence_differs(make_docx):
+    # Trường trộn thư để trống: cùng số đoạn văn nhưng phần đầu không còn văn bản
+    first = make_docx([("NEW_PAGE", ["ông A"]), ("NEW_PAGE", ["b"])])
+    blank = make_docx([("NEW_PAGE", [""]), ("NEW_PAGE", ["b"])])
+    cache = TemplatePlanCache()
+    cache.store(_stats(first), _verdicts(first))
+    assert compute_template_fingerprint(_stats(first)) == compute_template_fingerprint(_stats(blank))
+    assert cache.lookup(_stats(blank)) is None
+
+
+def test_store_skips_page_count_verdicts_and_evicts_oldest(make_docx):
+    data = make_docx([("NEW_PAGE", ["a"])])
+    cache = TemplatePlanCache(max_templates=1)
+    verdict = {'status': 'not_empty', 'confidence': 'high', 'detection_method': None, 'sources': ['page_count']}
+    assert not cache.store(_stats(data), [verdict])
+
+    assert cache.store(_stats(data), _verdicts(data))
+    other = make_docx([("NEW_PAGE", ["a", "b"])])
+    assert cache.store(_stats(other), _verdicts(other))
+    assert len(cache) == 1
+    assert cache.lookup(_stats(data)) is None
@@ -0,0 +1,59 @@
+from docx.enum.section import WD_SECTION_START
+from docx.oxml import OxmlElement
+
+from transforms import SectionIndex
+from word_processor_1 import WordProcessor
+
+SECTIONS = [("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])]
+
+
+def _fill_empty_section(context):
+    paragraph = context.section_index.paragraphs(1)[0]
+    run = OxmlElement("w:r")
+    text = OxmlElement("w:t")
+    text.text = "nội dung mới"
+    run.append(text)
+    paragraph.append(run)
+    return 1
+
+
+def _open(data):
+    processor = WordProcessor()
+    assert processor.open_document_bytes(data, "a.docx")
+    return processor
+
+
+def test_section_index_groups_body_elements_by_section(make_docx):
+    processor = _open(make_docx(SECTIONS))
+    index = SectionIndex(processor.document)
+    assert len(index) == 3
+    assert index.content_sections() == {0, 2}
+
+
+def test_fix_uses_source_when_unmodified(make_docx):
+    processor = _open(make_docx(SECTIONS))
+    result = processor.run_pipeline(save=False)
+    assert result["changes"] == {"fix_empty_pages": 1}
+    assert processor.document.sections[1].start_type == WD_SECTION_START.CONTINUOUS
+
+
+def test_fix_analyzes_document_edited_by_earlier_transform(make_docx):
+    processor = _open(make_docx(SECTIONS))
+    processor.register_transform("fill", _fill_empty_section, before="fix_empty_pages")
+    result = processor.run_pipeline(save=False)
+    assert result["changes"] == {"fill": 1, "fix_empty_pages": 0}
+    assert processor.document.sections[1].start_type == WD_SECTION_START.NEW_PAGE
+
+
+def test_failing_transform_aborts_save(make_docx, tmp_path):
+    def broken(context):
+        raise RuntimeError("hỏng")
+
+    processor = _open(make_docx(SECTIONS))
+    processor.register_transform("broken", broken, before="fix_empty_pages")
+    output_path = tmp_path / "out.docx"
+    result = processor.run_pipeline(str(output_path))
+    assert result["saved"] is None
+    assert result["error"].startswith("broken")
+    assert "fix_empty_pages" not in result["changes"]
+    assert not output_path.exists()
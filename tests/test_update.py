@@ -0,0 +1,87 @@
+import hashlib
+import os
+import subprocess
+
+import pytest
+
+import update
+
+
+def _git(repo, *args):
+    subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    _git(tmp_path, "init", "-q")
+    _git(tmp_path, "config", "user.email", "test@example.com")
+    _git(tmp_path, "config", "user.name", "test")
+    _git(tmp_path, "config", "core.autocrlf", "false")
+    (tmp_path / "app.py").write_bytes(b"print('a')\nprint('b')\n")
+    (tmp_path / "version.json").write_text("{}")
+    _git(tmp_path, "add", "-A")
+    _git(tmp_path, "commit", "-q", "-m", "init")
+    return tmp_path
+
+
+@pytest.fixture
+def updater(tmp_path):
+    instance = update.AutoOfficeUpdater.__new__(update.AutoOfficeUpdater)
+    instance.app_path = str(tmp_path)
+    instance.deleted_files = []
+    return instance
+
+
+def test_manifest_hashes_git_blob_not_crlf_working_tree(repo):
+    # Thư mục làm việc kiểu Windows (CRLF), blob trong git vẫn là LF
+    (repo / "app.py").write_bytes(b"print('a')\r\nprint('b')\r\n")
+    manifest = update.build_manifest(str(repo))
+    lf_content = b"print('a')\nprint('b')\n"
+    assert manifest == {"app.py": {"sha256": hashlib.sha256(lf_content).hexdigest(), "size": len(lf_content)}}
+
+
+def test_crlf_local_file_is_not_changed(updater, tmp_path):
+    lf_content = b"x = 1\ny = 2\n"
+    (tmp_path / "app.py").write_bytes(lf_content.replace(b"\n", b"\r\n"))
+    (tmp_path / "other.py").write_bytes(b"old\n")
+    manifest = {
+        "app.py": {"sha256": hashlib.sha256(lf_content).hexdigest(), "size": len(lf_content)},
+        "other.py": {"sha256": hashlib.sha256(b"new\n").hexdigest(), "size": 4},
+        "missing.py": {"sha256": hashlib.sha256(b"").hexdigest(), "size": 0}
+    }
+    assert sorted(updater._get_changed_files(manifest)) == ["missing.py", "other.py"]
+
+
+def test_deleted_files_come_from_manifest_diff(updater, tmp_path):
+    (tmp_path / "version.json").write_text('{"files": {"a.py": {}, "gone.py": {}, "already_gone.py": {}}}')
+    (tmp_path / "a.py").write_text("a")
+    (tmp_path / "gone.py").write_text("gone")
+    assert updater._get_deleted_files({"a.py": {}}) == ["gone.py"]
+
+    updater.deleted_files = ["gone.py"]
+    updater._remove_deleted_files()
+    assert not os.path.exists(tmp_path / "gone.py")
+    assert os.path.exists(tmp_path / "a.py")
+
+
+def test_manifest_rejects_paths_outside_app(updater):
+    with pytest.raises(ValueError):
+        updater._get_changed_files({"../evil.py": {"sha256": "", "size": 0}})
+
+
+def test_delta_update_always_includes_launcher(updater, tmp_path, monkeypatch):
+    launcher = b"# launcher\n"
+    (tmp_path / update.LAUNCHER_FILE).write_bytes(launcher)
+    manifest = {update.LAUNCHER_FILE: {"sha256": hashlib.sha256(launcher).hexdigest(), "size": len(launcher)}}
+    updater.repo_name, updater.branch, updater.raw_url = "AutoOffice", "main", "https://example.invalid"
+    updater.remote_version_data = {"version": "2.0.0", "files": manifest}
+
+    class Response:
+        status_code = 200
+        content = launcher
+
+    requested = []
+    monkeypatch.setattr(update.requests, "get", lambda url: requested.append(url) or Response())
+    extracted_dir = updater._download_delta_update(manifest)
+    assert requested == [f"https://example.invalid/{update.LAUNCHER_FILE}"]
+    assert os.path.exists(os.path.join(extracted_dir, update.LAUNCHER_FILE))
@@ -0,0 +1,109 @@
+import threading
+
+from section_cache import SectionVerdictCache
+from word_processor_1 import WordProcessor
+
+
+def _add_paragraph(context):
+    context.document.add_paragraph("đoạn mới")
+    context.invalidate_section_index()
+    return 1
+
+
+def test_document_info_reflects_in_memory_edits(make_docx):
+    processor = WordProcessor()
+    assert processor.open_document_bytes(make_docx([("NEW_PAGE", ["a", "b"])]), "a.docx")
+    assert processor.get_document_info()["paragraphs"] == 2
+
+    processor.transforms = [("add_paragraph", _add_paragraph)]
+    processor.run_pipeline(save=False)
+    assert processor.modified
+    assert processor.get_document_info()["paragraphs"] == 3
+
+
+def _start_slow_analysis(processor, release):
+    def slow_analyze(on_evidence=None, document=None):
+        release.wait(5)
+        return {'empty_pages': [{'section_index': 1, 'type': None, 'confidence': 'high'}],
+                'verdicts': None, 'evidence_sources': ['xml_content'], 'document_structure': None}
+
+    processor.page_analyzer.analyze = slow_analyze
+    updates = []
+    processor.analyze_document(deadline=0.01, on_update=updates.append)
+    assert not processor.analysis_final
+    return updates
+
+
+def _finish_background_analysis(release):
+    release.set()
+    for thread in threading.enumerate():
+        if thread.name == "autooffice-refine":
+            thread.join(5)
+
+
+def test_background_analysis_result_is_applied(make_docx):
+    processor = WordProcessor()
+    processor.open_document_bytes(make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])]))
+    release = threading.Event()
+    updates = _start_slow_analysis(processor, release)
+    _finish_background_analysis(release)
+    assert [update["final"] for update in updates] == [True]
+    assert [page['section_index'] for page in processor.empty_pages] == [1]
+
+
+def test_background_analysis_is_discarded_after_edit(make_docx):
+    processor = WordProcessor()
+    processor.open_document_bytes(make_docx([("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("NEW_PAGE", ["b"])]))
+    release = threading.Event()
+    updates = _start_slow_analysis(processor, release)
+
+    processor.transforms = [("add_paragraph", _add_paragraph)]
+    processor.run_pipeline(save=False)
+    _finish_background_analysis(release)
+    assert updates == []
+    assert processor.empty_pages == []
+
+
+STREAM_SECTIONS = [("NEW_PAGE", ["a"]), ("NEW_PAGE", []), ("CONTINUOUS", ["b"]), ("NEW_PAGE", ["c"])]
+
+
+def test_streaming_events_match_analyze_document(make_docx):
+    data = make_docx(STREAM_SECTIONS)
+    processor = WordProcessor()
+    assert processor.open_document_bytes(data, "a.docx")
+    records = list(processor.iter_analysis())
+
+    assert [record["index"] for record in records if record["event"] == "section"] == [0, 1, 2, 3]
+    verdicts = {record["index"]: record for record in records if record["event"] == "verdict"}
+    assert sorted(verdicts) == [0, 1, 2, 3]
+    assert all(record["confidence"] for record in verdicts.values())
+    assert [index for index, record in verdicts.items() if record["is_empty_page"]] == [1]
+    # Mỗi phần được trả về trước (section) rồi mới có kết luận (verdict)
+    assert [record["event"] for record in records[:4]] == ["section"] * 4
+
+    reference = WordProcessor()
+    reference.open_document_bytes(data, "a.docx")
+    assert processor.sections_info == reference.analyze_document()
+    assert processor.empty_pages == reference.empty_pages
+
+
+def test_streaming_analyzes_edited_document(make_docx):
+    processor = WordProcessor()
+    processor.open_document_bytes(make_docx(STREAM_SECTIONS), "a.docx")
+    processor.analyze_document()
+    assert processor.fix_empty_pages() == 1
+
+    records = list(processor.iter_analysis())
+    assert not any(record.get("is_empty_page") for record in records)
+    assert processor.empty_pages == []
+    assert processor.sections_info[1]["type_name"] == "Continuous"
+
+
+def test_streaming_uses_section_cache(make_docx):
+    processor = WordProcessor()
+    processor.section_cache = SectionVerdictCache()
+    data = make_docx(STREAM_SECTIONS)
+    for _ in range(2):
+        processor.open_document_bytes(data, "a.docx", document_key="doc")
+        records = [record for record in processor.iter_analysis() if record["event"] == "verdict"]
+    assert all("cache" in record["evidence"] for record in records)
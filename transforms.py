@@ -0,0 +1,111 @@
+import logging
+
+from docx.oxml.ns import qn
+
+logger = logging.getLogger(__name__)
+
+TAG_P = qn("w:p")
+TAG_SECT_PR = qn("w:sectPr")
+TAG_P_PR = qn("w:pPr")
+TAG_T = qn("w:t")
+TAG_TBL = qn("w:tbl")
+# Hình ảnh kiểu mới (DrawingML) và kiểu cũ (VML)
+IMAGE_TAGS = (qn("w:drawing"), qn("w:pict"))
+
+
+class SectionIndex:
+    """Chỉ mục các phần của tài liệu đã mở: mỗi phần gồm đối tượng Section của python-docx
+    và các phần tử con của body (đoạn văn, bảng) thuộc phần đó.
+
+    Được xây dựng một lần và dùng chung cho mọi transform trong pipeline; transform nào thêm/xóa
+    phần tử của body phải gọi TransformContext.invalidate_section_index() để chỉ mục được tạo lại.
+    """
+
+    def __init__(self, document):
+        sections = document.sections
+        self.sections = []
+        current_elements = []
+        for element in document.element.body.iterchildren():
+            if element.tag == TAG_SECT_PR:
+                # sectPr cuối body thuộc về phần cuối cùng, không phải nội dung
+                continue
+            current_elements.append(element)
+            if element.tag == TAG_P:
+                p_pr = element.find(TAG_P_PR)
+                if p_pr is not None and p_pr.find(TAG_SECT_PR) is not None:
+                    self._add_section(sections, current_elements)
+                    current_elements = []
+        self._add_section(sections, current_elements)
+
+    def _add_section(self, sections, elements):
+        index = len(self.sections)
+        if index >= len(sections):
+            return
+        self.sections.append({"index": index, "section": sections[index], "elements": elements})
+
+    def __len__(self):
+        return len(self.sections)
+
+    def __iter__(self):
+        return iter(self.sections)
+
+    def __getitem__(self, index):
+        return self.sections[index]
+
+    def paragraphs(self, index):
+        """Các phần tử đoạn văn (w:p) cấp body thuộc phần index."""
+        return [element for element in self.sections[index]["elements"] if element.tag == TAG_P]
+
+    def has_content(self, index):
+        """Phần index có văn bản, bảng hoặc hình ảnh hay không (cùng tiêu chí với docx_stats)."""
+        for element in self.sections[index]["elements"]:
+            if element.tag == TAG_TBL:
+                return True
+            if any(text.text and text.text.strip() for text in element.iter(TAG_T)):
+                return True
+            if any(True for _ in element.iter(*IMAGE_TAGS)):
+                return True
+        return False
+
+    def content_sections(self):
+        """Tập chỉ số các phần có nội dung."""
+        return {entry["index"] for entry in self.sections if self.has_content(entry["index"])}
+
+
+class TransformContext:
+    """Dữ liệu dùng chung cho các transform trong một lần chạy pipeline."""
+
+    def __init__(self, processor):
+        self.processor = processor
+        self.document = processor.document
+        self.change_log = processor.change_log
+        self.progress = processor.progress
+        self._section_index = None
+
+    @property
+    def section_index(self):
+        """Chỉ mục phần, chỉ được xây dựng khi có transform cần đến."""
+        if self._section_index is None:
+            self._section_index = SectionIndex(self.document)
+        return self._section_index
+
+    def invalidate_section_index(self):
+        """Gọi sau khi thay đổi cấu trúc body để transform sau thấy chỉ mục mới."""
+        self._section_index = None
+
+
+def fix_empty_pages_transform(context):
+    """Transform có sẵn: chuyển các ngắt phần gây trang trắng sang Continuous.
+
+    Khi tài liệu trong bộ nhớ đã khác tệp gốc (transform trước đã chỉnh sửa), phân tích dựa
+    trên chỉ mục phần dùng chung của tài liệu hiện tại thay vì đọc lại tệp gốc.
+    """
+    processor = context.processor
+    if processor.modified:
+        processor.analyze_current_document(context.section_index)
+    elif not processor.sections_info:
+        processor.analyze_document()
+    # Không sửa gì khi không có trang trắng, tránh fix_empty_pages phân tích lại tài liệu
+    if not processor.empty_pages:
+        return 0
+    return processor.fix_empty_pages()
@@ -1,5 +1,6 @@
 import json
 import os
+import hashlib
 import requests
 import logging
 import zipfile
@@ -13,6 +14,8 @@ from tkinter import messagebox
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+LAUNCHER_FILE = "update_launcher.py"
+
 def get_application_path():
     """Lấy đường dẫn đến thư mục chứa ứng dụng, hoạt động cả với file exe và mã nguồn."""
     if getattr(sys, 'frozen', False):
@@ -25,14 +28,98 @@ def get_application_path():
     logger.info(f"Đường dẫn ứng dụng: {application_path}")
     return application_path
 
+def compute_file_hash(file_path, chunk_size=65536):
+    """Tính hash SHA-256 của một tệp theo từng khối để không phải đọc toàn bộ vào bộ nhớ."""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def normalize_line_endings(content):
+    """Đổi CRLF thành LF cho tệp văn bản (tệp nhị phân giữ nguyên).
+    
+    Repository đặt "* text=auto" nên git lưu tệp văn bản với LF; bản clone trên Windows có
+    CRLF trong thư mục làm việc dù nội dung giống hệt blob trên server.
+    """
+    if b"\0" in content[:8192]:
+        return content
+    return content.replace(b"\r\n", b"\n")
+
+def compute_normalized_hash(file_path):
+    """Hash SHA-256 của tệp sau khi chuẩn hóa xuống dòng (so sánh được với hash của blob git)."""
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(normalize_line_endings(f.read())).hexdigest()
+
+def _read_git_blobs(root_dir):
+    """Trả về {đường dẫn: nội dung blob} của các tệp trong commit HEAD.
+    
+    Đọc nội dung blob (giống raw.githubusercontent.com phục vụ) thay vì tệp trong thư mục
+    làm việc, vốn có thể đã bị đổi sang CRLF khi checkout trên Windows.
+    """
+    listing = subprocess.check_output(["git", "ls-tree", "-r", "-z", "HEAD"], cwd=root_dir)
+    entries = []
+    for record in listing.split(b"\0"):
+        if not record:
+            continue
+        meta, path = record.split(b"\t", 1)
+        _, object_type, object_id = meta.split()
+        if object_type == b"blob":
+            entries.append((path.decode("utf-8"), object_id))
+    
+    batch_input = b"".join(object_id + b"\n" for _, object_id in entries)
+    output = subprocess.run(["git", "cat-file", "--batch"], cwd=root_dir, input=batch_input,
+                            stdout=subprocess.PIPE, check=True).stdout
+    blobs = {}
+    offset = 0
+    for relative_path, _ in entries:
+        header_end = output.index(b"\n", offset)
+        size = int(output[offset:header_end].split()[2])
+        blobs[relative_path] = output[header_end + 1:header_end + 1 + size]
+        offset = header_end + 1 + size + 1
+    return blobs
+
+def build_manifest(root_dir, excluded=("version.json",)):
+    """Tạo manifest gồm hash và kích thước của các tệp trong commit HEAD của root_dir.
+    
+    Nếu không dùng được git, quét thư mục làm việc (hash sau khi chuẩn hóa xuống dòng về LF).
+    """
+    try:
+        blobs = _read_git_blobs(root_dir)
+    except Exception as e:
+        logger.warning(f"Không thể đọc các tệp từ git, quét toàn bộ thư mục: {e}")
+        blobs = {}
+        for dir_path, dir_names, file_names in os.walk(root_dir):
+            dir_names[:] = [d for d in dir_names if not d.startswith('.') and d != "temp_update"]
+            for file_name in file_names:
+                full_path = os.path.join(dir_path, file_name)
+                with open(full_path, 'rb') as f:
+                    content = normalize_line_endings(f.read())
+                blobs[os.path.relpath(full_path, root_dir).replace(os.sep, "/")] = content
+    
+    manifest = {}
+    for relative_path in sorted(blobs):
+        if relative_path in excluded or relative_path.startswith('.'):
+            continue
+        manifest[relative_path] = {
+            "sha256": hashlib.sha256(blobs[relative_path]).hexdigest(),
+            "size": len(blobs[relative_path])
+        }
+    return manifest
+
 class AutoOfficeUpdater:
     def __init__(self, repo_url="https://github.com/truong-29/AutoOffice"):
         self.repo_url = repo_url
         self.repo_owner = "truong-29"
         self.repo_name = "AutoOffice"
+        self.branch = "main"
+        self.raw_url = f"https://raw.githubusercontent.com/{self.repo_owner}/{self.repo_name}/{self.branch}"
         self.api_url = f"https://api.github.com/repos/{self.repo_owner}/{self.repo_name}/contents/version.json"
         self.app_path = get_application_path()
         self.current_version = self._get_current_version()
+        self.remote_version_data = None
+        # Tệp cần xóa khi cập nhật (có trong phiên bản đang cài, không còn trong phiên bản mới)
+        self.deleted_files = []
         
     def _get_current_version(self):
         """Lấy phiên bản hiện tại từ file version.json."""
@@ -83,6 +170,7 @@ class AutoOfficeUpdater:
             import base64
             content = base64.b64decode(content_data["content"]).decode("utf-8")
             remote_version_data = json.loads(content)
+            self.remote_version_data = remote_version_data
             
             remote_version = remote_version_data.get("version", "1.0.0")
             
@@ -131,12 +219,157 @@ class AutoOfficeUpdater:
         return self.repo_url + "/releases"
         
     def download_update(self):
-        """Tải xuống bản cập nhật mới từ GitHub."""
+        """Tải xuống bản cập nhật mới từ GitHub.
+        
+        Nếu version.json trên server có manifest ("files"), chỉ tải các tệp đã thay đổi;
+        nếu không có manifest hoặc tải từng tệp thất bại thì tải toàn bộ repository.
+        Các tệp có trong manifest cục bộ nhưng không còn trong manifest mới được ghi vào
+        deleted_files và bị xóa khi khởi động update launcher.
+        """
+        manifest = self.remote_version_data.get("files") if self.remote_version_data else None
+        
+        self.deleted_files = []
+        if manifest:
+            try:
+                self.deleted_files = self._get_deleted_files(manifest)
+            except ValueError as e:
+                logger.error(f"Manifest không hợp lệ: {e}")
+                manifest = None
+            if self.deleted_files:
+                logger.info(f"Có {len(self.deleted_files)} tệp đã bị xóa trong phiên bản mới")
+                
+        if manifest:
+            extracted_dir = self._download_delta_update(manifest)
+            if extracted_dir:
+                return extracted_dir
+            logger.warning("Không thể cập nhật theo manifest, chuyển sang tải toàn bộ repository")
+        else:
+            logger.info("Không có manifest trong version.json, tải toàn bộ repository")
+            
+        return self._download_full_archive()
+    
+    def _prepare_temp_dir(self):
+        """Tạo mới thư mục tạm thời chứa bản cập nhật."""
+        temp_dir = os.path.join(self.app_path, "temp_update")
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        os.makedirs(temp_dir)
+        return temp_dir
+    
+    def _get_changed_files(self, manifest):
+        """So sánh manifest với các tệp đã cài đặt và trả về danh sách tệp cần tải."""
+        changed_files = []
+        
+        for relative_path, file_info in manifest.items():
+            # Không chấp nhận đường dẫn tuyệt đối hoặc đi ra ngoài thư mục ứng dụng
+            normalized_path = os.path.normpath(relative_path)
+            if os.path.isabs(normalized_path) or normalized_path.startswith(".."):
+                raise ValueError(f"Đường dẫn không hợp lệ trong manifest: {relative_path}")
+            
+            local_path = os.path.join(self.app_path, normalized_path)
+            if not os.path.exists(local_path):
+                changed_files.append(relative_path)
+                continue
+            
+            # Kích thước và hash khớp ngay: không cần chuẩn hóa xuống dòng
+            if (os.path.getsize(local_path) == file_info.get("size")
+                    and compute_file_hash(local_path) == file_info.get("sha256")):
+                continue
+                
+            # Tệp văn bản có thể chỉ khác CRLF/LF (bản clone trên Windows)
+            if compute_normalized_hash(local_path) != file_info.get("sha256"):
+                changed_files.append(relative_path)
+                
+        return changed_files
+    
+    def _get_local_manifest(self):
+        """Manifest của phiên bản đang cài (trong version.json cục bộ), rỗng nếu không có."""
+        try:
+            with open(os.path.join(self.app_path, "version.json"), 'r', encoding='utf-8') as f:
+                return json.load(f).get("files") or {}
+        except Exception:
+            return {}
+    
+    def _get_deleted_files(self, manifest):
+        """Các tệp có trong manifest của phiên bản đang cài nhưng không còn trong phiên bản mới."""
+        deleted_files = []
+        for relative_path in sorted(set(self._get_local_manifest()) - set(manifest)):
+            normalized_path = os.path.normpath(relative_path)
+            if os.path.isabs(normalized_path) or normalized_path.startswith(".."):
+                raise ValueError(f"Đường dẫn không hợp lệ trong manifest: {relative_path}")
+            if os.path.exists(os.path.join(self.app_path, normalized_path)):
+                deleted_files.append(relative_path)
+        return deleted_files
+    
+    def _remove_deleted_files(self):
+        """Xóa các tệp đã bị xóa trong phiên bản mới (xem _get_deleted_files)."""
+        for relative_path in self.deleted_files:
+            local_path = os.path.join(self.app_path, os.path.normpath(relative_path))
+            try:
+                os.remove(local_path)
+                logger.info(f"Đã xóa tệp không còn trong phiên bản mới: {relative_path}")
+            except OSError as e:
+                logger.warning(f"Không thể xóa {relative_path}: {e}")
+    
+    def _download_delta_update(self, manifest):
+        """Chỉ tải các tệp có hash khác với tệp đã cài đặt."""
+        try:
+            changed_files = self._get_changed_files(manifest)
+            # update launcher luôn được tải kèm để start_update_launcher dùng bản mới nhất
+            if LAUNCHER_FILE in manifest and LAUNCHER_FILE not in changed_files:
+                changed_files.append(LAUNCHER_FILE)
+            logger.info(f"Có {len(changed_files)}/{len(manifest)} tệp cần cập nhật theo manifest")
+            
+            temp_dir = self._prepare_temp_dir()
+            extracted_dir = os.path.join(temp_dir, f"{self.repo_name}-{self.branch}")
+            os.makedirs(extracted_dir)
+            
+            downloaded_bytes = 0
+            for relative_path in changed_files:
+                file_info = manifest[relative_path]
+                download_url = f"{self.raw_url}/{relative_path}"
+                
+                response = requests.get(download_url)
+                if response.status_code != 200:
+                    logger.error(f"Lỗi khi tải {relative_path}: HTTP {response.status_code}")
+                    return False
+                    
+                content = response.content
+                if len(content) != file_info.get("size") or hashlib.sha256(content).hexdigest() != file_info.get("sha256"):
+                    logger.error(f"Tệp {relative_path} tải về không khớp với manifest")
+                    return False
+                
+                target_path = os.path.join(extracted_dir, os.path.normpath(relative_path))
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                with open(target_path, 'wb') as f:
+                    f.write(content)
+                downloaded_bytes += len(content)
+            
+            # Không có launcher trong manifest: dùng bản đang cài
+            local_launcher = os.path.join(self.app_path, LAUNCHER_FILE)
+            if LAUNCHER_FILE not in manifest and os.path.exists(local_launcher):
+                shutil.copy2(local_launcher, os.path.join(extracted_dir, LAUNCHER_FILE))
+            
+            # Ghi version.json mới để update launcher cập nhật phiên bản
+            with open(os.path.join(extracted_dir, "version.json"), 'w', encoding='utf-8') as f:
+                json.dump(self.remote_version_data, f, ensure_ascii=False, indent=4)
+                
+            logger.info(f"Đã tải {len(changed_files)} tệp ({downloaded_bytes} bytes) vào: {extracted_dir}")
+            return extracted_dir
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi tải bản cập nhật theo manifest: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return False
+        
+    def _download_full_archive(self):
+        """Tải xuống toàn bộ repository dưới dạng zip."""
         try:
             logger.info("Đang tải xuống bản cập nhật mới...")
             
             # URL để tải xuống repository dưới dạng zip
-            download_url = f"https://github.com/{self.repo_owner}/{self.repo_name}/archive/refs/heads/main.zip"
+            download_url = f"https://github.com/{self.repo_owner}/{self.repo_name}/archive/refs/heads/{self.branch}.zip"
             
             response = requests.get(download_url, stream=True)
             
@@ -155,10 +388,7 @@ class AutoOfficeUpdater:
             buffer.seek(0)
             
             # Tạo thư mục tạm thời để giải nén
-            temp_dir = os.path.join(self.app_path, "temp_update")
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-            os.makedirs(temp_dir)
+            temp_dir = self._prepare_temp_dir()
             
             # Giải nén tệp zip
             with zipfile.ZipFile(buffer) as zip_ref:
@@ -191,17 +421,18 @@ class AutoOfficeUpdater:
             logger.info("Đang khởi động update launcher...")
             
             # Đường dẫn đến update_launcher.py
-            update_launcher_path = os.path.join(self.app_path, "update_launcher.py")
-            
-            # Kiểm tra xem file update_launcher.py có tồn tại không
-            if not os.path.exists(update_launcher_path):
-                # Copy update_launcher.py từ thư mục giải nén nếu có
-                src_launcher_path = os.path.join(extracted_dir, "update_launcher.py")
-                if os.path.exists(src_launcher_path):
-                    shutil.copy2(src_launcher_path, update_launcher_path)
-                else:
-                    logger.error("Không tìm thấy update_launcher.py")
-                    return False
+            update_launcher_path = os.path.join(self.app_path, LAUNCHER_FILE)
+            
+            # Dùng update_launcher.py từ thư mục giải nén nếu có (bản mới nhất), nếu không thì bản đang cài
+            src_launcher_path = os.path.join(extracted_dir, LAUNCHER_FILE)
+            if os.path.exists(src_launcher_path):
+                shutil.copy2(src_launcher_path, update_launcher_path)
+            elif not os.path.exists(update_launcher_path):
+                logger.error("Không tìm thấy update_launcher.py")
+                return False
+            
+            # Xóa các tệp không còn trong phiên bản mới (launcher chỉ chép đè tệp từ thư mục giải nén)
+            self._remove_deleted_files()
             
             # Khởi động update_launcher.py với tham số là đường dẫn thư mục giải nén và phiên bản mới
             python_exe = sys.executable
@@ -289,3 +520,17 @@ class AutoOfficeUpdater:
         # Khởi động update_launcher và thoát ứng dụng hiện tại
         self.start_update_launcher(extracted_dir, new_version)
         return True
+
+if __name__ == "__main__":
+    # Ghi manifest vào version.json trước khi phát hành: python update.py manifest
+    if len(sys.argv) > 1 and sys.argv[1] == "manifest":
+        root_dir = get_application_path()
+        version_path = os.path.join(root_dir, "version.json")
+        with open(version_path, 'r', encoding='utf-8') as f:
+            version_data = json.load(f)
+        version_data["files"] = build_manifest(root_dir)
+        with open(version_path, 'w', encoding='utf-8') as f:
+            json.dump(version_data, f, ensure_ascii=False, indent=4)
+        print(f"Đã ghi manifest gồm {len(version_data['files'])} tệp vào {version_path}")
+    else:
+        print("Cách dùng: python update.py manifest")
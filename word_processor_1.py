@@ -2,8 +2,19 @@ from docx import Document
 from docx.enum.section import WD_SECTION_START
 from docx.shared import Pt
 import os
+import io
 import logging
-from word_processor_2 import EmptyPageDetector, PageAnalyzer
+import threading
+from word_processor_2 import EmptyPageDetector, PageAnalyzer, open_docx_source, read_docx_source
+from fix_plan import create_fix_plan, save_fix_plan, compute_document_hash
+from progress import ProgressReporter
+from docx_stats import read_document_stats
+from fingerprint import stamp_marker, compute_source_hash
+from change_log import ChangeLog
+from metrics import DOCUMENTS_PROCESSED, BLANK_PAGES_FIXED
+from transforms import TransformContext, SectionIndex, fix_empty_pages_transform
+from page_verification import PageCountVerifier
+from preflight import preflight_check
 try:
     from update import get_application_path
 except ImportError:
@@ -29,10 +40,42 @@ class WordProcessor:
     def __init__(self):
         self.document = None
         self.file_path = None
+        # Nguồn tài liệu: đường dẫn tệp hoặc bytes (khi mở từ bộ nhớ)
+        self.source = None
         self.sections_info = []
         self.empty_pages = []
         self.page_analyzer = None
+        self.structure_report = None
         self.debug_mode = False
+        self.progress = ProgressReporter()
+        self.change_log = ChangeLog()
+        # Hàm đếm số trang chính xác (docx_path -> int hoặc None), None để dùng Word qua COM
+        self.page_count_backend = None
+        # Các transform chạy trên cùng tài liệu đã mở: danh sách (tên, hàm(context) -> số thay đổi)
+        self.transforms = [("fix_empty_pages", fix_empty_pages_transform)]
+        # SectionVerdictCache dùng chung giữa các lần mở (None để luôn phân tích toàn bộ);
+        # khóa là document_key do bên gọi truyền vào, đường dẫn tuyệt đối, hoặc hash nội dung
+        # khi mở từ bộ nhớ mà không có document_key, nên chỉ các phiên bản của cùng một tài
+        # liệu dùng lại kết luận của nhau
+        self.section_cache = None
+        # TemplatePlanCache dùng chung cho các tài liệu trộn thư cùng mẫu (None để tắt)
+        self.template_cache = None
+        # False khi analyze_document trả về kết quả tạm thời (deadline) và đang phân tích tiếp ở nền
+        self.analysis_final = True
+        # Khóa trạng thái tài liệu; kết quả phân tích nền chỉ được áp dụng khi giữ khóa này
+        # (DocumentSession dùng chung khóa này làm khóa của phiên)
+        self.lock = threading.RLock()
+        # Tăng mỗi khi tài liệu được mở, chỉnh sửa hoặc phân tích lại; kết quả phân tích nền
+        # bắt đầu ở thế hệ cũ bị bỏ qua để không ghi đè trạng thái mới hơn
+        self._generation = 0
+        # Kết quả kiểm tra sơ bộ của lần mở gần nhất (xem preflight.py)
+        self.preflight_result = None
+        # True khi tài liệu trong bộ nhớ đã khác self.source (sau khi sửa, hoàn tác, transform)
+        self.modified = False
+        
+    def set_progress_callback(self, callback, max_rate=10.0):
+        """Đăng ký hàm nhận sự kiện tiến trình (dict), tối đa max_rate sự kiện "progress" mỗi giây."""
+        self.progress.set_callback(callback, max_rate)
         
     def set_debug_mode(self, enabled=True):
         """Bật/tắt chế độ debug."""
@@ -40,40 +83,122 @@ class WordProcessor:
         if self.page_analyzer:
             self.page_analyzer.set_debug_mode(enabled)
         
-    def open_document(self, file_path):
-        """Mở tệp Word và đọc dữ liệu."""
+    def open_document(self, file_path, preflight=None):
+        """Mở tệp Word và đọc dữ liệu.
+        
+        preflight là kết quả preflight_check đã có của chính tệp này (ví dụ khi chạy hàng loạt),
+        truyền vào để không kiểm tra lại.
+        """
+        return self._open_source(file_path, file_path, preflight)
+    
+    def open_document_bytes(self, data, file_name=None, preflight=None, document_key=None):
+        """Mở tài liệu Word từ bytes mà không cần ghi ra tệp tạm (preflight như open_document).
+        
+        document_key là định danh ổn định của tài liệu (ví dụ id phiên hoặc id tài liệu của dịch
+        vụ) để các phiên bản tải lên lại dùng lại kết luận theo phần trong section_cache; không
+        có thì dùng hash nội dung, chỉ khớp khi tải lên lại đúng bản cũ.
+        """
+        return self._open_source(bytes(data), file_name, preflight, document_key)
+    
+    def open_document_stream(self, stream, file_name=None, document_key=None):
+        """Mở tài liệu Word từ một đối tượng file-like (ví dụ tệp tải lên), document_key như open_document_bytes."""
+        try:
+            data = read_docx_source(stream)
+        except Exception as e:
+            logger.error(f"Lỗi khi đọc dữ liệu từ stream: {e}")
+            return False
+        return self._open_source(data, file_name, document_key=document_key)
+    
+    def _open_source(self, source, file_path, preflight=None, document_key=None):
+        """Mở tài liệu từ đường dẫn hoặc bytes."""
+        self.progress.stage_start("open")
         try:
             self.file_path = file_path
-            self.document = Document(file_path)
-            logger.info(f"Đã mở tệp: {file_path}")
+            self.source = source
+            self.sections_info = []
+            self.empty_pages = []
+            self.structure_report = None
+            self.analysis_final = True
+            self.change_log = ChangeLog()
+            self.modified = False
+            self._generation += 1
+            
+            # Loại sớm tệp hỏng, bị mã hóa hoặc sai định dạng trước khi phân tích cú pháp
+            self.preflight_result = preflight or preflight_check(source)
+            if not self.preflight_result["ok"]:
+                self.document = None
+                self.page_analyzer = None
+                logger.warning(f"Không mở tệp {file_path or '<bộ nhớ>'}: {self.preflight_result['message']}")
+                self.progress.stage_end("open", success=False, category=self.preflight_result["category"])
+                DOCUMENTS_PROCESSED.inc(result="rejected")
+                return False
+                
+            self.document = Document(open_docx_source(source))
+            logger.info(f"Đã mở tệp: {file_path or f'<bộ nhớ, {len(source)} bytes>'}")
+            
+            bytes_read = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+            self.progress.report_bytes("open", bytes_read=bytes_read)
             
             # Tạo phân tích trang
-            self.page_analyzer = PageAnalyzer(file_path)
+            # Tên tệp tải lên không định danh được tài liệu nên khi không có document_key,
+            # tài liệu trong bộ nhớ dùng hash nội dung
+            cache_key = None
+            if self.section_cache is not None:
+                if document_key is not None:
+                    cache_key = document_key
+                elif isinstance(source, bytes):
+                    cache_key = f"sha256:{compute_document_hash(source)}"
+                else:
+                    cache_key = os.path.abspath(source)
+            self.page_analyzer = PageAnalyzer(source, self.progress, self.page_count_backend,
+                                              self.section_cache, cache_key, self.template_cache)
             # Áp dụng chế độ debug nếu có
             if self.debug_mode:
                 self.page_analyzer.set_debug_mode(True)
             
+            self.progress.stage_end("open", success=True)
+            DOCUMENTS_PROCESSED.inc(result="opened")
             return True
         except Exception as e:
             logger.error(f"Lỗi khi mở tệp: {e}")
+            self.progress.stage_end("open", success=False)
+            DOCUMENTS_PROCESSED.inc(result="error")
             return False
     
-    def analyze_document(self):
-        """Phân tích tài liệu để tìm các ngắt phần và trang trắng."""
+    def analyze_document(self, plan_path=None, deadline=None, on_update=None):
+        """Phân tích tài liệu để tìm các ngắt phần và trang trắng.
+        
+        Nếu có plan_path, ghi thêm kế hoạch sửa để áp dụng sau bằng fix_plan.apply_fix_plan.
+        
+        Nếu có deadline (giây), trả về kết quả tốt nhất có được trước hạn; phân tích tiếp tục
+        ở nền và on_update (nếu có) nhận kết quả tốt hơn khi có (xem _analyze_with_deadline).
+        """
         if not self.document:
             logger.error("Chưa mở tệp nào.")
             return False
             
+        # Kết quả phân tích nền của lần gọi trước (nếu còn chạy) không còn được áp dụng
+        self._generation += 1
+        if deadline is not None and self.page_analyzer:
+            return self._analyze_with_deadline(deadline, on_update, plan_path)
+            
         self.sections_info = []
+        self.analysis_final = True
+        self.progress.stage_start("analyze")
         
         # Sử dụng công cụ phát hiện trang trắng nâng cao
+        verdicts = None
         try:
             if self.page_analyzer:
-                analysis_result = self.page_analyzer.analyze()
+                # Bộ phân tích đọc self.source nên chỉ dùng lại tài liệu đã mở khi chưa bị sửa
+                analysis_result = self.page_analyzer.analyze(document=None if self.modified else self.document)
                 self.empty_pages = analysis_result['empty_pages']
+                verdicts = analysis_result['verdicts']
                 
                 # Log cấu trúc tài liệu để debug
+                # (báo cáo chỉ được tính khi render, xem DocumentStructureReport)
                 document_structure = analysis_result['document_structure']
+                self.structure_report = document_structure
                 
                 # Chỉ log nếu ở chế độ debug
                 if self.debug_mode:
@@ -86,43 +211,307 @@ class WordProcessor:
             logger.error(traceback.format_exc())
         
         # Lấy thông tin về các section trong tài liệu
-        for i, section in enumerate(self.document.sections):
+        self.sections_info = self._build_sections_info(verdicts, report_progress=True)
+        total_sections = len(self.sections_info)
+            
+        logger.info(f"Đã phân tích tệp: Tìm thấy {len(self.sections_info)} phần.")
+        
+        # Đếm số trang trắng được phát hiện
+        empty_pages_count = len(self.empty_pages)
+        logger.info(f"Phát hiện {empty_pages_count} trang trắng trong tài liệu.")
+        
+        # Hiển thị thông tin chi tiết về mỗi trang trắng
+        if empty_pages_count > 0:
+            for i, page in enumerate(self.empty_pages):
+                logger.info(f"Trang trắng {i+1}: Phần {page['section_index']+1}, "
+                          f"Phương pháp phát hiện: {page.get('detection_method', 'unknown')}")
+        
+        if plan_path:
+            self.create_fix_plan(plan_path)
+        
+        self.progress.stage_end("analyze", sections=total_sections, empty_pages=empty_pages_count)
+        return self.sections_info
+    
+    def analyze_current_document(self, section_index=None):
+        """Phân tích tài liệu trong bộ nhớ sau khi đã chỉnh sửa (self.source không còn khớp).
+        
+        Dùng chỉ mục phần (transforms.SectionIndex) của tài liệu hiện tại, có thể truyền chỉ mục
+        dùng chung của pipeline. Trả về sections_info như analyze_document.
+        """
+        if not self.document or not self.page_analyzer:
+            logger.error("Chưa mở tệp nào.")
+            return False
+            
+        self._generation += 1
+        self.progress.stage_start("analyze")
+        section_index = section_index or SectionIndex(self.document)
+        self.empty_pages = self.page_analyzer.empty_page_detector.detect_in_document(self.document, section_index)
+        self.analysis_final = True
+        self.sections_info = self._build_sections_info()
+        logger.info(f"Đã phân tích tài liệu trong bộ nhớ: {len(self.empty_pages)} trang trắng")
+        self.progress.stage_end("analyze", sections=len(self.sections_info), empty_pages=len(self.empty_pages))
+        return self.sections_info
+    
+    def _build_sections_info(self, verdicts=None, report_progress=False):
+        """Tạo thông tin từng phần từ tài liệu và danh sách trang trắng hiện tại.
+        
+        Nếu có verdicts (kết luận từng phần của bộ phát hiện), mỗi phần có thêm độ tin cậy
+        ("provisional" khi chưa có kết luận) và các nguồn bằng chứng đã dùng.
+        """
+        sections_info = []
+        empty_sections = {page['section_index'] for page in self.empty_pages}
+        sections = self.document.sections
+        total_sections = len(sections)
+        for i, section in enumerate(sections):
+            if report_progress:
+                self.progress.advance("analyze", i + 1, total_sections)
             section_type = section.start_type
             
             # Kiểm tra xem phần này có trong danh sách trang trắng không
-            is_empty_page = any(page['section_index'] == i for page in self.empty_pages)
-            
-            # Nếu phát hiện là trang trắng hoặc là ngắt phần Next Page,
-            # đánh dấu để hiển thị trong giao diện
-            needs_conversion = is_empty_page
-            if section_type == WD_SECTION_START.NEW_PAGE and not is_empty_page:
-                # Đánh dấu là ngắt phần thông thường (không phải trang trắng)
-                pass
+            is_empty_page = i in empty_sections
             
             section_info = {
                 "index": i,
                 "type": section_type,
                 "type_name": self._get_section_type_name(section_type),
                 "page_break": section_type == WD_SECTION_START.NEW_PAGE,
-                "needs_conversion": needs_conversion,
+                "needs_conversion": is_empty_page,
                 "is_empty_page": is_empty_page
             }
-            self.sections_info.append(section_info)
-            
-        logger.info(f"Đã phân tích tệp: Tìm thấy {len(self.sections_info)} phần.")
+            if verdicts is not None and i < len(verdicts):
+                verdict = verdicts[i]
+                section_info["confidence"] = (verdict['confidence'] if verdict['status'] != 'undecided'
+                                              else "provisional")
+                section_info["evidence"] = list(verdict['sources'])
+            sections_info.append(section_info)
+        return sections_info
+    
+    def _analyze_with_deadline(self, deadline, on_update=None, plan_path=None):
+        """Phân tích trong giới hạn thời gian (giây).
         
-        # Đếm số trang trắng được phát hiện
-        empty_pages_count = len(self.empty_pages)
-        logger.info(f"Phát hiện {empty_pages_count} trang trắng trong tài liệu.")
+        Bộ phát hiện chạy ở luồng nền theo thứ tự nguồn bằng chứng rẻ trước; khi hết hạn,
+        sections_info/empty_pages nhận kết luận tạm thời mới nhất (phần chưa kết luận có
+        confidence "provisional") và analysis_final=False. Sau hạn, mỗi khi có nguồn bằng
+        chứng mới và khi hoàn tất, kết quả được cập nhật vào WordProcessor và gửi cho
+        on_update(dict gồm final, sections_info, empty_pages, evidence_sources).
         
-        # Hiển thị thông tin chi tiết về mỗi trang trắng
-        if empty_pages_count > 0:
-            for i, page in enumerate(self.empty_pages):
-                logger.info(f"Trang trắng {i+1}: Phần {page['section_index']+1}, "
-                          f"Phương pháp phát hiện: {page.get('detection_method', 'unknown')}")
+        Kết quả nền được áp dụng khi giữ self.lock và bị bỏ qua nếu tài liệu đã được mở lại,
+        chỉnh sửa (sửa, hoàn tác, transform) hoặc phân tích lại sau khi bắt đầu.
+        """
+        analyzer = self.page_analyzer
+        document = None if self.modified else self.document
+        generation = self._generation
+        condition = threading.Condition()
+        state = {"snapshot": None, "result": None, "returned": False}
+        
+        def on_evidence(snapshot):
+            analysis = {
+                'empty_pages': snapshot['empty_pages'],
+                'verdicts': snapshot['verdicts'],
+                'evidence_sources': snapshot['sources_run']
+            }
+            with condition:
+                state["snapshot"] = analysis
+                returned = state["returned"]
+            if returned:
+                self._publish_analysis(generation, analysis, False, on_update)
         
+        def refine():
+            try:
+                result = analyzer.analyze(on_evidence, document)
+            except Exception as e:
+                logger.error(f"Lỗi khi phân tích trang trắng ở nền: {e}")
+                result = {}
+            with condition:
+                state["result"] = result
+                returned = state["returned"]
+                condition.notify_all()
+            if returned and result:
+                self._publish_analysis(generation, result, True, on_update)
+        
+        self.progress.stage_start("analyze")
+        threading.Thread(target=refine, name="autooffice-refine", daemon=True).start()
+        with condition:
+            condition.wait_for(lambda: state["result"] is not None, timeout=deadline)
+            state["returned"] = True
+            result, snapshot = state["result"], state["snapshot"]
+        
+        if result:
+            self._apply_analysis(result, True)
+        else:
+            self._apply_analysis(snapshot or {'empty_pages': [], 'verdicts': None, 'evidence_sources': []}, False)
+            logger.info(f"Hết thời gian phân tích ({deadline}s), trả về kết quả tạm thời; "
+                        f"tiếp tục phân tích ở nền")
+        
+        if plan_path and self.analysis_final:
+            self.create_fix_plan(plan_path)
+        self.progress.stage_end("analyze", sections=len(self.sections_info), empty_pages=len(self.empty_pages),
+                                final=self.analysis_final)
         return self.sections_info
     
+    def _apply_analysis(self, analysis, final):
+        """Cập nhật trạng thái từ một kết quả phân tích (tạm thời hoặc cuối cùng)."""
+        with self.lock:
+            self.empty_pages = analysis['empty_pages']
+            if final and analysis.get('document_structure') is not None:
+                self.structure_report = analysis['document_structure']
+            self.analysis_final = final
+            self.sections_info = self._build_sections_info(analysis.get('verdicts'))
+            return {
+                "final": final,
+                "sections_info": [dict(section_info) for section_info in self.sections_info],
+                "empty_pages": list(self.empty_pages),
+                "evidence_sources": list(analysis.get('evidence_sources', []))
+            }
+    
+    def _publish_analysis(self, generation, analysis, final, on_update):
+        """Áp dụng kết quả phân tích nền và báo cho bên gọi, trừ khi tài liệu đã thay đổi từ đó."""
+        with self.lock:
+            if generation != self._generation:
+                logger.info("Bỏ kết quả phân tích nền: tài liệu đã được mở lại, chỉnh sửa hoặc phân tích lại")
+                return
+            update = self._apply_analysis(analysis, final)
+        logger.info(f"Cập nhật kết quả phân tích ({'hoàn tất' if final else 'tạm thời'}): "
+                    f"{len(update['empty_pages'])} trang trắng, nguồn bằng chứng: {', '.join(update['evidence_sources'])}")
+        if on_update:
+            try:
+                on_update(update)
+            except Exception as e:
+                logger.warning(f"Lỗi trong callback cập nhật phân tích: {e}")
+    
+    def iter_analysis(self):
+        """Phân tích tài liệu theo kiểu luồng, trả về kết quả từng phần ngay khi có.
+        
+        Mỗi phần được trả về trước với event "section" (kiểu ngắt phần), sau đó với event
+        "verdict" ngay khi có kết luận (is_empty_page, confidence, detection_method, evidence).
+        Phân tích đi qua cùng bộ lập kế hoạch với analyze_document (nguồn bằng chứng rẻ trước,
+        section_cache, template_cache) nên khi duyệt hết, sections_info và empty_pages giống như
+        sau analyze_document. Tài liệu đã sửa trong bộ nhớ được phân tích ở trạng thái hiện tại.
+        """
+        if not self.document or not self.page_analyzer:
+            logger.error("Chưa mở tệp nào.")
+            return
+            
+        self._generation += 1
+        self.sections_info = []
+        self.empty_pages = []
+        self.analysis_final = True
+        self.progress.stage_start("analyze")
+        
+        try:
+            for i, section in enumerate(self.document.sections):
+                section_type = section.start_type
+                section_info = {
+                    "index": i,
+                    "type": section_type,
+                    "type_name": self._get_section_type_name(section_type),
+                    "page_break": section_type == WD_SECTION_START.NEW_PAGE,
+                    "needs_conversion": False,
+                    "is_empty_page": False
+                }
+                self.sections_info.append(section_info)
+                yield dict(section_info, event='section')
+            
+            analysis = self.page_analyzer.iter_analyze(self._current_source(), self.document)
+            emitted = set()
+            while True:
+                try:
+                    snapshot = next(analysis)
+                except StopIteration as stop:
+                    result = stop.value
+                    break
+                yield from self._verdict_events(snapshot['verdicts'], emitted)
+            
+            # Phần chưa có bằng chứng nào chỉ được kết luận (độ tin cậy thấp) ở kết quả cuối
+            self._apply_analysis(result, True)
+            yield from self._verdict_events(result['verdicts'], emitted)
+        except Exception as e:
+            logger.error(f"Lỗi khi phân tích tài liệu theo luồng: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            
+        logger.info(f"Đã phân tích tệp: Tìm thấy {len(self.sections_info)} phần, "
+                    f"{len(self.empty_pages)} trang trắng.")
+        self.progress.stage_end("analyze", sections=len(self.sections_info), empty_pages=len(self.empty_pages))
+    
+    def _verdict_events(self, verdicts, emitted):
+        """Sự kiện "verdict" cho các phần vừa có kết luận (chưa có trong emitted)."""
+        for i, verdict in enumerate(verdicts):
+            if i in emitted or verdict['status'] == 'undecided' or i >= len(self.sections_info):
+                continue
+            emitted.add(i)
+            is_empty_page = verdict['status'] == 'empty'
+            section_info = self.sections_info[i]
+            section_info.update(is_empty_page=is_empty_page, needs_conversion=is_empty_page,
+                                confidence=verdict['confidence'], evidence=list(verdict['sources']))
+            yield dict(section_info, event='verdict', detection_method=verdict['detection_method'])
+    
+    def verify_empty_pages(self, method="bisect"):
+        """Xác minh các trang trắng đã phát hiện bằng số trang trước/sau khi chuyển sang Continuous.
+        
+        method="bisect" thử theo nhóm và tìm kiếm nhị phân (khoảng O(k log n) lần đếm trang),
+        method="individual" thử từng phần. Các phần không làm giảm số trang bị loại khỏi
+        empty_pages. Nếu tìm kiếm nhị phân không nhất quán (consistent=False), empty_pages giữ
+        nguyên. Trả về kết quả của PageCountVerifier, hoặc None nếu không xác minh được.
+        """
+        if not self.document or not self.source:
+            logger.error("Chưa mở tệp nào.")
+            return None
+            
+        self._generation += 1
+        candidates = [page['section_index'] for page in self.empty_pages]
+        self.progress.stage_start("verify", total=len(candidates))
+        try:
+            verifier = PageCountVerifier(self.source, self.page_count_backend)
+            if method == "individual":
+                result = verifier.verify_individually(candidates)
+            else:
+                result = verifier.verify_bisect(candidates)
+        except Exception as e:
+            logger.error(f"Lỗi khi xác minh trang trắng bằng số trang: {e}")
+            self.progress.stage_end("verify", success=False)
+            return None
+            
+        if not result["consistent"]:
+            # Giả định cộng dồn không đúng nên các phần suy ra không đáng tin: giữ nguyên danh
+            # sách và độ tin cậy ban đầu thay vì nâng lên 'high' và bỏ các ứng viên còn lại
+            logger.warning("Kết quả xác minh bằng số trang không nhất quán, giữ nguyên kết quả phân tích")
+            self.progress.stage_end("verify", success=True, consistent=False, backend_calls=result["backend_calls"])
+            return result
+            
+        offenders = set(result["offenders"])
+        verified_pages = []
+        for page in self.empty_pages:
+            if page['section_index'] in offenders:
+                page = dict(page, confidence='high', evidence=list(page.get('evidence', [])) + ['page_count_' + method])
+                verified_pages.append(page)
+            else:
+                logger.info(f"Phần {page['section_index']} không làm giảm số trang, bỏ khỏi danh sách trang trắng")
+        self.empty_pages = verified_pages
+        for section_info in self.sections_info:
+            is_empty_page = section_info["index"] in offenders
+            section_info["is_empty_page"] = is_empty_page
+            section_info["needs_conversion"] = is_empty_page
+            
+        self.progress.stage_end("verify", success=True, backend_calls=result["backend_calls"])
+        return result
+    
+    def create_fix_plan(self, plan_path=None):
+        """Tạo kế hoạch sửa (hash tệp + các phần cần chuyển sang Continuous) từ kết quả phân tích."""
+        if not self.document:
+            logger.error("Chưa mở tệp nào.")
+            return None
+            
+        try:
+            file_name = os.path.basename(self.file_path) if self.file_path else None
+            plan = create_fix_plan(self.source, self.empty_pages, file_name=file_name)
+            if plan_path:
+                save_fix_plan(plan, plan_path)
+            return plan
+        except Exception as e:
+            logger.error(f"Lỗi khi tạo kế hoạch sửa: {e}")
+            return None
+    
     def _get_section_type_name(self, section_type):
         """Trả về tên kiểu ngắt phần."""
         section_types = {
@@ -155,9 +544,12 @@ class WordProcessor:
                 logger.info("Không tìm thấy trang trắng để xử lý.")
                 return 0
             
+        self.progress.stage_start("fix", total=len(self.empty_pages))
+        self.change_log.begin_group("fix_empty_pages")
+        
         # Sử dụng PageAnalyzer để sửa các trang trắng
         if self.page_analyzer and self.empty_pages:
-            changes_made = self.page_analyzer.fix_empty_pages(self.document, self.empty_pages)
+            changes_made = self.page_analyzer.fix_empty_pages(self.document, self.empty_pages, self.change_log)
         else:
             # Phương pháp dự phòng nếu không có PageAnalyzer
             changes_made = 0
@@ -165,16 +557,37 @@ class WordProcessor:
             for i, section_info in enumerate(self.sections_info):
                 if section_info["needs_conversion"] and section_info["is_empty_page"]:
                     section = self.document.sections[i]
+                    old_type = section.start_type
                     section.start_type = WD_SECTION_START.CONTINUOUS
+                    self.change_log.record(i, old_type, WD_SECTION_START.CONTINUOUS, "fallback")
                     changes_made += 1
                     logger.info(f"Đã chuyển phần {i} từ 'Next Page' sang 'Continuous' (trang trắng)")
+        self.change_log.end_group()
+        
+        if changes_made:
+            self._mark_modified()
         
         # Cập nhật thông tin sections sau khi thay đổi
         self.update_sections_info_after_fix()
         
         logger.info(f"Đã thực hiện {changes_made} thay đổi để xóa trang trắng.")
+        self.progress.stage_end("fix", changes=changes_made)
+        BLANK_PAGES_FIXED.inc(changes_made)
         return changes_made
     
+    def _current_source(self):
+        """Nguồn của tài liệu hiện tại: self.source, hoặc bản ghi của tài liệu trong bộ nhớ khi đã sửa."""
+        if not self.modified:
+            return self.source
+        buffer = io.BytesIO()
+        self.document.save(buffer)
+        return buffer.getvalue()
+    
+    def _mark_modified(self):
+        """Ghi nhận tài liệu trong bộ nhớ đã thay đổi (kết quả phân tích nền đang chạy trở nên cũ)."""
+        self.modified = True
+        self._generation += 1
+    
     def update_sections_info_after_fix(self):
         """Cập nhật thông tin các phần sau khi đã sửa."""
         if not self.document:
@@ -185,38 +598,187 @@ class WordProcessor:
             if i < len(self.sections_info):
                 self.sections_info[i]["type"] = section.start_type
                 self.sections_info[i]["type_name"] = self._get_section_type_name(section.start_type)
-                # Đánh dấu đã được sửa
+                # Đánh dấu đã được sửa (bỏ dấu nếu thay đổi đã được hoàn tác)
                 if section.start_type == WD_SECTION_START.CONTINUOUS and self.sections_info[i]["is_empty_page"]:
                     self.sections_info[i]["fixed"] = True
+                else:
+                    self.sections_info[i].pop("fixed", None)
     
-    def save_document(self, output_path=None):
-        """Lưu tài liệu đã chỉnh sửa."""
+    def undo_fix(self):
+        """Hoàn tác lần sửa gần nhất trong bộ nhớ, trả về số thay đổi đã hoàn tác."""
+        if not self.document:
+            logger.error("Chưa mở tệp nào.")
+            return 0
+        reverted = self.change_log.undo(self.document)
+        if reverted:
+            self._mark_modified()
+        self.update_sections_info_after_fix()
+        return reverted
+    
+    def redo_fix(self):
+        """Làm lại lần sửa vừa hoàn tác, trả về số thay đổi đã áp dụng lại."""
+        if not self.document:
+            logger.error("Chưa mở tệp nào.")
+            return 0
+        reapplied = self.change_log.redo(self.document)
+        if reapplied:
+            self._mark_modified()
+        self.update_sections_info_after_fix()
+        return reapplied
+    
+    def export_change_log(self, path):
+        """Xuất nhật ký thay đổi ra tệp JSON để kiểm tra."""
+        try:
+            return self.change_log.export(path)
+        except Exception as e:
+            logger.error(f"Lỗi khi xuất nhật ký thay đổi: {e}")
+            return None
+    
+    def register_transform(self, name, func, before=None):
+        """Đăng ký transform func(context) -> số thay đổi, chạy sau các transform đã có
+        hoặc ngay trước transform tên before. Đăng ký lại cùng tên sẽ thay thế transform cũ.
+        """
+        self.unregister_transform(name)
+        position = len(self.transforms)
+        if before is not None:
+            names = [transform_name for transform_name, _ in self.transforms]
+            if before not in names:
+                raise ValueError(f"Không có transform: {before}")
+            position = names.index(before)
+        self.transforms.insert(position, (name, func))
+    
+    def unregister_transform(self, name):
+        """Bỏ transform theo tên (kể cả transform có sẵn fix_empty_pages)."""
+        self.transforms = [(transform_name, func) for transform_name, func in self.transforms
+                           if transform_name != name]
+    
+    def run_pipeline(self, output_path=None, stamp=False, save=True):
+        """Chạy lần lượt mọi transform trên tài liệu đã mở rồi lưu một lần.
+        
+        Các transform dùng chung tài liệu đã phân tích cú pháp và chỉ mục phần (TransformContext),
+        nên N bước dọn dẹp chỉ tốn một lần đọc và một lần ghi tệp. Trả về dict gồm số thay đổi
+        của từng transform và kết quả lưu (đường dẫn đã lưu, hoặc None khi save=False).
+        
+        Nếu một transform gặp lỗi, các transform sau không chạy, tài liệu không được lưu và
+        kết quả có thêm "error" (tên transform và lỗi).
+        """
+        if not self.document:
+            logger.error("Chưa mở tệp nào.")
+            return None
+            
+        context = TransformContext(self)
+        changes = {}
+        self.progress.stage_start("transform", total=len(self.transforms))
+        for done, (name, func) in enumerate(self.transforms, 1):
+            try:
+                changes[name] = func(context) or 0
+                if changes[name]:
+                    self._mark_modified()
+                logger.info(f"Transform {name}: {changes[name]} thay đổi")
+            except Exception as e:
+                # Tài liệu có thể đã bị sửa dở dang, không được lưu
+                logger.error(f"Lỗi trong transform {name}, không lưu tài liệu: {e}")
+                changes[name] = None
+                self._mark_modified()
+                self.progress.stage_end("transform", changes=changes, success=False)
+                return {"changes": changes, "saved": None, "error": f"{name}: {e}"}
+            self.progress.advance("transform", done, len(self.transforms))
+        self.progress.stage_end("transform", changes=changes)
+        
+        saved = self.save_document(output_path, stamp) if save else None
+        return {"changes": changes, "saved": saved}
+    
+    def save_document(self, output_path=None, stamp=False):
+        """Lưu tài liệu đã chỉnh sửa.
+        
+        Nếu stamp=True, ghi thêm dấu đã xử lý (phiên bản công cụ, quy tắc, hash nội dung) vào
+        thuộc tính tùy chỉnh để các lần chạy hàng loạt sau có thể bỏ qua tệp (xem fingerprint.py).
+        """
         if not self.document:
             logger.error("Chưa mở tệp nào.")
             return False
             
         if not output_path:
+            if not self.file_path:
+                logger.error("Tài liệu được mở từ bộ nhớ, cần chỉ định nơi lưu.")
+                return False
             # Tạo tên tệp mới nếu không được chỉ định
             file_name, file_ext = os.path.splitext(self.file_path)
             output_path = f"{file_name}_fixed{file_ext}"
             
+        self.progress.stage_start("save")
         try:
-            self.document.save(output_path)
+            self._write_document(output_path, stamp)
             logger.info(f"Đã lưu tệp vào: {output_path}")
+            self.progress.report_bytes("save", bytes_written=os.path.getsize(output_path))
+            self.progress.stage_end("save", success=True)
             return output_path
         except Exception as e:
             logger.error(f"Lỗi khi lưu tệp: {e}")
+            self.progress.stage_end("save", success=False)
             return False
     
+    def save_document_stream(self, stream, stamp=False):
+        """Ghi tài liệu đã chỉnh sửa vào một đối tượng file-like."""
+        if not self.document:
+            logger.error("Chưa mở tệp nào.")
+            return False
+            
+        self.progress.stage_start("save")
+        try:
+            start_position = stream.tell() if stream.seekable() else None
+            self._write_document(stream, stamp)
+            logger.info("Đã ghi tài liệu vào stream")
+            if start_position is not None:
+                self.progress.report_bytes("save", bytes_written=stream.tell() - start_position)
+            self.progress.stage_end("save", success=True)
+            return True
+        except Exception as e:
+            logger.error(f"Lỗi khi ghi tài liệu vào stream: {e}")
+            self.progress.stage_end("save", success=False)
+            return False
+    
+    def save_document_bytes(self, stamp=False):
+        """Trả về tài liệu đã chỉnh sửa dưới dạng bytes."""
+        buffer = io.BytesIO()
+        if not self.save_document_stream(buffer, stamp):
+            return None
+        return buffer.getvalue()
+    
+    def _write_document(self, target, stamp):
+        """Ghi tài liệu ra đường dẫn hoặc stream, kèm dấu đã xử lý nếu được yêu cầu."""
+        if not stamp:
+            self.document.save(target)
+            return
+            
+        buffer = io.BytesIO()
+        self.document.save(buffer)
+        data = stamp_marker(buffer.getvalue(), source_hash=compute_source_hash(self.source))
+        if hasattr(target, 'write'):
+            target.write(data)
+        else:
+            with open(target, 'wb') as f:
+                f.write(data)
+    
     def get_document_info(self):
         """Lấy thông tin cơ bản về tài liệu."""
         if not self.document:
             return None
             
+        # Đọc số liệu trực tiếp từ XML, không cần tạo danh sách đối tượng python-docx;
+        # sau khi sửa/transform thì self.source đã cũ nên đọc từ bản ghi của tài liệu hiện tại
+        try:
+            stats = read_document_stats(self._current_source())
+        except Exception as e:
+            logger.error(f"Lỗi khi đọc thống kê tài liệu: {e}")
+            return None
+            
         info = {
-            "sections": len(self.document.sections),
-            "paragraphs": len(self.document.paragraphs),
-            "tables": len(self.document.tables),
+            "sections": stats["sections"],
+            "paragraphs": stats["paragraphs"],
+            "tables": stats["tables"],
+            "images": stats["images"],
+            "page_breaks": stats["page_breaks"],
             "empty_pages": len(self.empty_pages)
         }
         return info
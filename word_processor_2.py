@@ -1,6 +1,10 @@
 import os
+import io
+import json
+import html
 import logging
 import re
+import threading
 from docx import Document
 from docx.enum.section import WD_SECTION_START
 from docx.shared import Pt, Inches
@@ -10,11 +14,24 @@ from docx2python import docx2python
 import tempfile
 import shutil
 from docx.api import Document as ReadOnlyDocument
-import win32com.client
-import pythoncom
 import sys
-import comtypes.client
 import time
+from progress import ProgressReporter
+from docx_stats import read_document_stats
+from transforms import SectionIndex
+from metrics import SECTIONS_SCANNED, BLANK_PAGES_FOUND, COM_FAILURES, PAGE_COUNT_FALLBACKS
+
+# COM chỉ có trên Windows cài MS Office; get_page_count sẽ tự chuyển sang phương pháp ước lượng
+try:
+    import win32com.client
+    import pythoncom
+except ImportError:
+    win32com = None
+    pythoncom = None
+try:
+    import comtypes.client
+except ImportError:
+    comtypes = None
 
 try:
     from update import get_application_path
@@ -37,50 +54,160 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Giá trị w:type trong sectPr tương ứng với kiểu ngắt phần của python-docx
+XML_SECTION_TYPES = {
+    "continuous": WD_SECTION_START.CONTINUOUS,
+    "nextColumn": WD_SECTION_START.NEW_COLUMN,
+    "nextPage": WD_SECTION_START.NEW_PAGE,
+    "evenPage": WD_SECTION_START.EVEN_PAGE,
+    "oddPage": WD_SECTION_START.ODD_PAGE
+}
+
+# Các kiểu ngắt phần luôn bắt đầu trang mới
+PAGE_STARTING_TYPES = (WD_SECTION_START.NEW_PAGE, WD_SECTION_START.EVEN_PAGE, WD_SECTION_START.ODD_PAGE)
+
+def open_docx_source(source):
+    """Chuẩn hóa nguồn tài liệu (đường dẫn hoặc bytes) để truyền cho Document/docx2python.
+    
+    Bytes được bọc trong BytesIO mới mỗi lần gọi vì mỗi lần đọc sẽ tiêu thụ stream.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+def read_docx_source(source):
+    """Đọc nguồn tài liệu (bytes hoặc stream) thành bytes, giữ nguyên nếu là đường dẫn."""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, 'read'):
+        return source.read()
+    return source
+
+def drain_snapshots(generator, on_evidence=None):
+    """Chạy hết một generator kết luận tạm thời (EmptyPageDetector.iter_detection,
+    PageAnalyzer.iter_analyze), gửi từng snapshot cho on_evidence và trả về kết quả cuối."""
+    while True:
+        try:
+            snapshot = next(generator)
+        except StopIteration as stop:
+            return stop.value
+        if on_evidence is None:
+            continue
+        try:
+            on_evidence(snapshot)
+        except Exception as e:
+            logger.warning(f"Lỗi khi gửi kết luận tạm thời: {e}")
+
 class EmptyPageDetector:
     """Class chuyên biệt để phát hiện trang trắng trong tài liệu Word."""
     
-    def __init__(self):
+    # Các nguồn bằng chứng: chi phí tương đối và trường hợp mà nguồn có thể kết luận.
+    # run_detection chạy theo chi phí tăng dần, chỉ cho những phần chưa có kết luận.
+    EVIDENCE_SOURCES = [
+        {
+            'name': 'structure',
+            'cost': 1,
+            'method': '_evidence_structure',
+            'decides': "Phần không phải Next Page: không thể tạo trang trắng kiểu này"
+        },
+        {
+            'name': 'xml_content',
+            'cost': 2,
+            'method': '_evidence_xml_content',
+            'decides': "Phần Next Page có văn bản, bảng hoặc hình ảnh trong XML: không phải trang trắng"
+        },
+        {
+            'name': 'content_rules',
+            'cost': 50,
+            'method': '_evidence_content_rules',
+            'decides': "Phần Next Page không có nội dung: quy tắc phần đầu/cuối/giữa với docx2python"
+        },
+        {
+            'name': 'page_count',
+            'cost': 1000,
+            'method': '_evidence_page_count',
+            'decides': "Phần còn lại: số trang thực tế không vượt số phần có nội dung thì không có trang trắng"
+        }
+    ]
+    
+    def __init__(self, progress=None, page_count_backend=None):
         self.temp_dir = None
         self.debug_mode = False
+        self.progress = progress or ProgressReporter()
+        # Hàm đếm số trang chính xác (docx_path -> int hoặc None); mặc định dùng Word qua COM
+        self.page_count_backend = page_count_backend
         
     def set_debug_mode(self, enabled=True):
         """Bật/tắt chế độ debug để có thêm log."""
         self.debug_mode = enabled
         
     def extract_document(self, docx_path):
-        """Trích xuất nội dung tài liệu Word để phân tích."""
+        """Trích xuất nội dung tài liệu Word để phân tích.
+        
+        Thư mục tạm được trả về trong kết quả (không lưu vào đối tượng) để nhiều lần gọi
+        song song không ghi đè lên nhau; dọn dẹp bằng cleanup(result['temp_dir']).
+        """
         try:
             # Tạo thư mục tạm thời để giải nén
-            self.temp_dir = tempfile.mkdtemp()
-            logger.info(f"Tạo thư mục tạm thời: {self.temp_dir}")
+            temp_dir = tempfile.mkdtemp()
+            logger.info(f"Tạo thư mục tạm thời: {temp_dir}")
             
             # Sử dụng docx2python để giải nén
-            doc_data = docx2python(docx_path, self.temp_dir)
+            doc_data = docx2python(open_docx_source(docx_path), temp_dir)
             
             return {
                 'docx_data': doc_data,
-                'temp_dir': self.temp_dir
+                'temp_dir': temp_dir
             }
         except Exception as e:
             logger.error(f"Lỗi khi giải nén tài liệu: {e}")
             return None
     
-    def cleanup(self):
+    def cleanup(self, temp_dir=None):
         """Dọn dẹp các tệp tạm thời."""
-        if self.temp_dir and os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
-            logger.info(f"Đã xóa thư mục tạm thời: {self.temp_dir}")
+        temp_dir = temp_dir or self.temp_dir
+        if temp_dir and os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+            logger.info(f"Đã xóa thư mục tạm thời: {temp_dir}")
     
     def get_page_count(self, docx_path):
         """Lấy số trang thực tế trong tài liệu Word."""
         try:
+            page_count = self.count_pages_exact(docx_path)
+            if page_count is not None:
+                return page_count
+                
+            # Phương pháp thay thế: Ước lượng dựa trên số phần
+            PAGE_COUNT_FALLBACKS.inc()
+            document = Document(open_docx_source(docx_path))
+            estimated_pages = len(document.sections)
+            logger.info(f"Ước lượng số trang: {estimated_pages}")
+            return estimated_pages
+                
+        except Exception as e:
+            logger.error(f"Lỗi khi đếm số trang: {e}")
+            return -1
+    
+    def get_exact_page_count(self, docx_path):
+        """Đếm số trang bằng Word qua COM, trả về None nếu không có Word."""
+        temp_path = None
+        try:
+            # COM chỉ mở được tệp trên đĩa: ghi tạm bytes ra tệp khi thực sự có COM
+            com_path = docx_path
+            if isinstance(docx_path, (bytes, bytearray)) and (win32com is not None or comtypes is not None):
+                fd, temp_path = tempfile.mkstemp(suffix=".docx")
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(docx_path)
+                com_path = temp_path
+                
             # Phương pháp 1: Dùng COM để đếm số trang (chỉ hoạt động trên Windows với MS Office)
             try:
+                if win32com is None:
+                    raise RuntimeError("pywin32 chưa được cài đặt")
                 pythoncom.CoInitialize()
                 word = win32com.client.Dispatch("Word.Application")
                 word.Visible = False
-                doc = word.Documents.Open(docx_path)
+                doc = word.Documents.Open(com_path)
                 page_count = doc.ComputeStatistics(2)  # 2 là wdStatisticPages
                 doc.Close(False)
                 word.Quit()
@@ -88,101 +215,130 @@ class EmptyPageDetector:
                 logger.info(f"Số trang thực tế trong tài liệu: {page_count}")
                 return page_count
             except Exception as e:
+                if win32com is not None:
+                    COM_FAILURES.inc(backend="pywin32")
                 logger.warning(f"Không thể đếm số trang bằng COM: {e}")
             
             # Phương pháp 2: Dùng comtypes
             try:
+                if comtypes is None:
+                    raise RuntimeError("comtypes chưa được cài đặt")
                 # Yêu cầu Word tự động đóng
                 word = comtypes.client.CreateObject('Word.Application')
                 word.Visible = False
-                doc = word.Documents.Open(docx_path)
+                doc = word.Documents.Open(com_path)
                 page_count = doc.ComputeStatistics(2)  # wdStatisticPages
                 doc.Close(False)
                 word.Quit()
                 logger.info(f"Số trang thực tế trong tài liệu (comtypes): {page_count}")
                 return page_count
             except Exception as e:
+                if comtypes is not None:
+                    COM_FAILURES.inc(backend="comtypes")
                 logger.warning(f"Không thể đếm số trang bằng comtypes: {e}")
                 
-            # Phương pháp thay thế: Ước lượng dựa trên số phần
-            document = Document(docx_path)
-            estimated_pages = len(document.sections)
-            logger.info(f"Ước lượng số trang: {estimated_pages}")
-            return estimated_pages
-                
-        except Exception as e:
-            logger.error(f"Lỗi khi đếm số trang: {e}")
-            return -1
+            return None
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
             
     def detect_empty_pages_v2(self, docx_path):
         """Phương pháp cải tiến để phát hiện trang trắng chính xác hơn."""
+        return self.run_detection(docx_path)['empty_pages']
+        
+    def run_detection(self, docx_path, require_page_count=False, known_verdicts=None, stats=None, on_evidence=None,
+                      known_source='cache'):
+        """Phát hiện trang trắng và giữ lại dữ liệu trung gian để tạo báo cáo cấu trúc sau này.
+        
+        Các nguồn bằng chứng trong EVIDENCE_SOURCES được chạy theo thứ tự chi phí tăng dần,
+        mỗi nguồn chỉ xét các phần chưa có kết luận; nguồn đắt (đếm trang bằng Word) chỉ chạy
+        khi còn phần chưa kết luận hoặc khi require_page_count=True.
+        
+        known_verdicts ({chỉ số phần: kết luận}) là các kết luận đã có sẵn (ví dụ từ SectionVerdictCache),
+        các phần này được coi là đã kết luận từ đầu và có thêm nguồn known_source ('cache' hoặc
+        'template' khi lấy từ TemplatePlanCache); stats là kết quả read_document_stats đã đọc sẵn.
+        
+        on_evidence(snapshot) được gọi sau bước cấu trúc và sau mỗi nguồn bằng chứng với kết luận
+        tạm thời (empty_pages, verdicts, sources_run), để bên gọi có thể dùng kết quả sớm.
+        
+        Trả về dict gồm empty_pages, document, section_has_content, page_count,
+        sources_run (tên các nguồn đã chạy) và verdicts (kết luận từng phần).
+        """
+        return drain_snapshots(self.iter_detection(docx_path, require_page_count, known_verdicts, stats,
+                                                   known_source), on_evidence)
+    
+    def iter_detection(self, docx_path, require_page_count=False, known_verdicts=None, stats=None,
+                       known_source='cache'):
+        """Như run_detection nhưng là generator: trả ra từng kết luận tạm thời (snapshot) sau bước
+        cấu trúc và sau mỗi nguồn bằng chứng; kết quả cuối là giá trị trả về của generator."""
+        context = {
+            'empty_pages': [],
+            'document': None,
+            'section_has_content': None,
+            'page_count': None,
+            'stats': None,
+            'sources_run': [],
+            'verdicts': []
+        }
         try:
-            # Mở tài liệu
-            document = Document(docx_path)
+            state = {
+                'docx_path': docx_path,
+                'stats': stats or read_document_stats(docx_path),
+                'document': None,
+                'section_has_content': None,
+                'page_count': None
+            }
+            verdicts = []
+            for detail in state['stats']['sections_detail']:
+                verdicts.append({
+                    'status': 'undecided',
+                    'type': XML_SECTION_TYPES.get(detail['start_type'], WD_SECTION_START.NEW_PAGE),
+                    'confidence': None,
+                    'detection_method': None,
+                    'sources': []
+                })
+            state['verdicts'] = verdicts
             
-            # Thu thập thông tin cơ bản
-            total_sections = len(document.sections)
-            total_paragraphs = len(document.paragraphs)
-            page_count = self.get_page_count(docx_path)
+            for i, known in (known_verdicts or {}).items():
+                if i < len(verdicts):
+                    verdicts[i].update(status=known['status'], confidence=known['confidence'],
+                                       detection_method=known['detection_method'],
+                                       sources=[source for source in known['sources']
+                                                if source not in ('cache', 'template')] + [known_source])
+            if known_verdicts:
+                context['sources_run'].append(known_source)
             
-            logger.info(f"Tài liệu có {total_sections} phần, {total_paragraphs} đoạn văn, ước tính {page_count} trang")
+            logger.info(f"Tài liệu có {len(verdicts)} phần, {state['stats']['paragraphs']} đoạn văn")
+            yield self._snapshot(verdicts, context['sources_run'])
             
-            # Danh sách chứa phần nghi ngờ là trang trắng
-            potential_empty_pages = []
-            confirmed_empty_pages = []
+            self.progress.stage_start("detect")
+            for source in sorted(self.EVIDENCE_SOURCES, key=lambda source: source['cost']):
+                undecided = [i for i, verdict in enumerate(verdicts) if verdict['status'] == 'undecided']
+                if not undecided and not (require_page_count and source['name'] == 'page_count'):
+                    if self.debug_mode:
+                        logger.info(f"Bỏ qua nguồn bằng chứng {source['name']}: mọi phần đã có kết luận")
+                    continue
+                
+                try:
+                    getattr(self, source['method'])(state, undecided)
+                    context['sources_run'].append(source['name'])
+                except Exception as e:
+                    logger.warning(f"Nguồn bằng chứng {source['name']} gặp lỗi: {e}")
+                yield self._snapshot(verdicts, context['sources_run'])
             
-            # Bước 1: Phân tích các ngắt phần với tiêu chí chặt chẽ
-            for i, section in enumerate(document.sections):
-                # Chỉ phân tích các phần kiểu Next Page
-                if section.start_type == WD_SECTION_START.NEW_PAGE:
-                    # Đánh dấu là "tiềm năng" để phân tích kỹ hơn
-                    potential_empty_pages.append({
-                        'section_index': i,
-                        'type': section.start_type,
-                    })
-                    
-            logger.info(f"Phát hiện {len(potential_empty_pages)} ngắt phần kiểu Next Page")
+            # Phần không có bằng chứng nào cho thấy trang trắng thì giữ nguyên
+            for verdict in verdicts:
+                if verdict['status'] == 'undecided':
+                    verdict['status'] = 'not_empty'
+                    verdict['confidence'] = 'low'
             
-            # Bước 2: Phân tích sâu hơn các phần tiềm năng
-            if potential_empty_pages:
-                # Tạo danh sách các phần chứa nội dung thực
-                section_has_content = self._analyze_section_content(document, docx_path)
-                
-                # Phân tích lại các phần tiềm năng
-                for page in potential_empty_pages:
-                    section_idx = page['section_index']
-                    
-                    # Nếu phân tích chỉ ra rằng phần này không có nội dung
-                    if section_idx in section_has_content:
-                        # Phần có nội dung, không phải trang trắng
-                        if self.debug_mode:
-                            logger.info(f"Phần {section_idx} có nội dung, không phải trang trắng")
-                    else:
-                        # Kiểm tra thêm nếu đây là phần đầu tiên hoặc cuối cùng
-                        if section_idx == 0 or section_idx == total_sections - 1:
-                            # Phần đầu/cuối thường không phải trang trắng
-                            if self.debug_mode:
-                                logger.info(f"Phần {section_idx} là phần đầu/cuối, có khả năng không phải trang trắng")
-                            # Phân tích thêm
-                            if self._is_definitely_empty(document, section_idx):
-                                confirmed_empty_pages.append({
-                                    'section_index': section_idx,
-                                    'type': page['type'],
-                                    'confidence': 'high',
-                                    'detection_method': 'deep_analysis'
-                                })
-                        else:
-                            # Phần giữa tài liệu, kiểm tra xem có phải trang trắng không
-                            # Phần giữa có ngắt phần Next Page nhưng không có nội dung
-                            if self._check_for_empty_middle_section(document, section_idx, section_has_content):
-                                confirmed_empty_pages.append({
-                                    'section_index': section_idx,
-                                    'type': page['type'],
-                                    'confidence': 'high',
-                                    'detection_method': 'empty_middle_section'
-                                })
-            
-            logger.info(f"Xác nhận {len(confirmed_empty_pages)} trang trắng sau khi phân tích kỹ lưỡng")
+            confirmed_empty_pages = self._collect_empty_pages(verdicts)
+            
+            self.progress.stage_end("detect", empty_pages=len(confirmed_empty_pages), sources=context['sources_run'])
+            SECTIONS_SCANNED.inc(len(verdicts))
+            BLANK_PAGES_FOUND.inc(len(confirmed_empty_pages))
+            logger.info(f"Xác nhận {len(confirmed_empty_pages)} trang trắng sau khi phân tích kỹ lưỡng "
+                        f"(nguồn bằng chứng: {', '.join(context['sources_run'])})")
             
             # Hiển thị thông tin chi tiết về mỗi trang trắng được xác nhận
             for i, page in enumerate(confirmed_empty_pages):
@@ -190,13 +346,197 @@ class EmptyPageDetector:
                           f"Phương pháp: {page.get('detection_method', 'unknown')}, "
                           f"Độ tin cậy: {page.get('confidence', 'medium')}")
                 
-            return confirmed_empty_pages
+            context['empty_pages'] = confirmed_empty_pages
+            context['document'] = state['document']
+            context['section_has_content'] = state['section_has_content']
+            context['page_count'] = state['page_count']
+            context['stats'] = state['stats']
+            context['verdicts'] = verdicts
+            return context
             
         except Exception as e:
             logger.error(f"Lỗi khi phát hiện trang trắng v2: {e}")
             import traceback
             logger.error(traceback.format_exc())
-            return []
+            context['error'] = str(e)
+            return context
+    
+    @staticmethod
+    def _collect_empty_pages(verdicts):
+        """Danh sách trang trắng từ các kết luận từng phần."""
+        return [
+            {
+                'section_index': i,
+                'type': verdict['type'],
+                'confidence': verdict['confidence'],
+                'detection_method': verdict['detection_method'],
+                'evidence': list(verdict['sources'])
+            }
+            for i, verdict in enumerate(verdicts) if verdict['status'] == 'empty'
+        ]
+    
+    def _snapshot(self, verdicts, sources_run):
+        """Kết luận tạm thời (bản sao) để trả cho bên gọi iter_detection."""
+        return {
+            'empty_pages': self._collect_empty_pages(verdicts),
+            'verdicts': [dict(verdict, sources=list(verdict['sources'])) for verdict in verdicts],
+            'sources_run': list(sources_run)
+        }
+    
+    def _decide(self, verdict, status, source_name, detection_method=None, confidence='high'):
+        """Ghi kết luận của một nguồn bằng chứng cho một phần."""
+        verdict['status'] = status
+        verdict['confidence'] = confidence
+        verdict['detection_method'] = detection_method
+        verdict['sources'].append(source_name)
+    
+    def _get_document(self, state):
+        """Chỉ mở tài liệu bằng python-docx khi một nguồn bằng chứng thực sự cần."""
+        if state['document'] is None:
+            state['document'] = Document(open_docx_source(state['docx_path']))
+        return state['document']
+    
+    def _xml_content_sections(self, state):
+        """Các phần có văn bản, bảng hoặc hình ảnh theo thống kê XML."""
+        return {
+            i for i, detail in enumerate(state['stats']['sections_detail'])
+            if detail['non_empty_paragraphs'] or detail['tables'] or detail['images']
+        }
+    
+    def _evidence_structure(self, state, undecided):
+        """Phần không phải Next Page không thể tạo trang trắng kiểu này."""
+        for i in undecided:
+            verdict = state['verdicts'][i]
+            if verdict['type'] != WD_SECTION_START.NEW_PAGE:
+                self._decide(verdict, 'not_empty', 'structure')
+    
+    def _evidence_xml_content(self, state, undecided):
+        """Phần có nội dung trong XML không phải là trang trắng."""
+        content_sections = self._xml_content_sections(state)
+        for i in undecided:
+            if i in content_sections:
+                self._decide(state['verdicts'][i], 'not_empty', 'xml_content')
+    
+    def _evidence_content_rules(self, state, undecided):
+        """Áp dụng quy tắc phần đầu/cuối/giữa (kèm phân tích docx2python) cho các phần còn lại."""
+        document = self._get_document(state)
+        docx_path = state['docx_path']
+        section_has_content = self._analyze_section_content(document, docx_path) | self._xml_content_sections(state)
+        state['section_has_content'] = section_has_content
+        
+        potential_empty_pages = [{'section_index': i, 'type': state['verdicts'][i]['type']} for i in undecided]
+        for page, confirmed in self._iter_section_verdicts(document, docx_path, potential_empty_pages,
+                                                           section_has_content):
+            verdict = state['verdicts'][page['section_index']]
+            if confirmed:
+                self._decide(verdict, 'empty', 'content_rules', confirmed['detection_method'], confirmed['confidence'])
+            else:
+                self._decide(verdict, 'not_empty', 'content_rules')
+    
+    def _evidence_page_count(self, state, undecided):
+        """Dùng số trang thực tế để loại trừ: nếu số trang không vượt số phần bắt đầu trang mới
+        có nội dung thì không thể có trang trắng.
+
+        Số trang dư không chỉ ra phần nào trống (nội dung dài hơn một trang cũng tạo trang dư),
+        nên khi đó các phần còn lại vẫn chưa có kết luận.
+        """
+        self.progress.stage_start("page_count")
+        page_count = self.count_pages_exact(state['docx_path'])
+        self.progress.stage_end("page_count", page_count=page_count)
+        state['page_count'] = page_count
+        if page_count is None:
+            PAGE_COUNT_FALLBACKS.inc()
+        
+        if page_count is None or page_count < 0 or not undecided:
+            return
+            
+        content_sections = self._xml_content_sections(state)
+        pages_needed = sum(
+            1 for i, verdict in enumerate(state['verdicts'])
+            if i in content_sections and (i == 0 or verdict['type'] in PAGE_STARTING_TYPES)
+        )
+        if page_count > pages_needed:
+            return
+        for i in undecided:
+            self._decide(state['verdicts'][i], 'not_empty', 'page_count')
+    
+    def count_pages_exact(self, docx_path):
+        """Đếm số trang bằng backend đã cấu hình hoặc Word (COM); None nếu không đếm chính xác được."""
+        if self.page_count_backend is not None:
+            return self.page_count_backend(docx_path)
+        return self.get_exact_page_count(docx_path)
+    
+    def _iter_section_verdicts(self, document, docx_path, potential_empty_pages, section_has_content=None):
+        """Phân tích sâu lần lượt các phần tiềm năng.
+        
+        Trả về từng cặp (phần tiềm năng, thông tin trang trắng hoặc None) ngay khi có kết luận.
+        """
+        if not potential_empty_pages:
+            return
+            
+        total_sections = len(document.sections)
+        
+        # Tạo danh sách các phần chứa nội dung thực
+        if section_has_content is None:
+            section_has_content = self._analyze_section_content(document, docx_path)
+        
+        # Phân tích lại các phần tiềm năng
+        for checked, page in enumerate(potential_empty_pages, 1):
+            self.progress.advance("detect", checked, len(potential_empty_pages))
+            section_idx = page['section_index']
+            confirmed = None
+            
+            # Nếu phân tích chỉ ra rằng phần này không có nội dung
+            if section_idx in section_has_content:
+                # Phần có nội dung, không phải trang trắng
+                if self.debug_mode:
+                    logger.info(f"Phần {section_idx} có nội dung, không phải trang trắng")
+            else:
+                # Kiểm tra thêm nếu đây là phần đầu tiên hoặc cuối cùng
+                if section_idx == 0 or section_idx == total_sections - 1:
+                    # Phần đầu/cuối thường không phải trang trắng
+                    if self.debug_mode:
+                        logger.info(f"Phần {section_idx} là phần đầu/cuối, có khả năng không phải trang trắng")
+                    # Phân tích thêm
+                    if self._is_definitely_empty(document, section_idx):
+                        confirmed = {
+                            'section_index': section_idx,
+                            'type': page['type'],
+                            'confidence': 'high',
+                            'detection_method': 'deep_analysis'
+                        }
+                else:
+                    # Phần giữa tài liệu, kiểm tra xem có phải trang trắng không
+                    # Phần giữa có ngắt phần Next Page nhưng không có nội dung
+                    if self._check_for_empty_middle_section(document, section_idx, section_has_content):
+                        confirmed = {
+                            'section_index': section_idx,
+                            'type': page['type'],
+                            'confidence': 'high',
+                            'detection_method': 'empty_middle_section'
+                        }
+            
+            yield page, confirmed
+    
+    def detect_in_document(self, document, section_index):
+        """Phát hiện trang trắng trên tài liệu trong bộ nhớ từ chỉ mục phần (transforms.SectionIndex).
+
+        Nội dung từng phần được xác định trực tiếp từ các phần tử body của phần đó, rồi áp dụng
+        quy tắc phần đầu/cuối/giữa; không dùng số trang vì chỉ đếm được trên tệp đã lưu.
+        """
+        section_has_content = section_index.content_sections()
+        potential_empty_pages = [
+            {'section_index': i, 'type': section.start_type}
+            for i, section in enumerate(document.sections)
+            if section.start_type == WD_SECTION_START.NEW_PAGE and i not in section_has_content
+        ]
+        self.progress.stage_start("detect", total=len(potential_empty_pages))
+        empty_pages = []
+        for page, confirmed in self._iter_section_verdicts(document, None, potential_empty_pages, section_has_content):
+            if confirmed:
+                empty_pages.append(dict(confirmed, evidence=['section_index']))
+        self.progress.stage_end("detect", empty_pages=len(empty_pages))
+        return empty_pages
     
     def _check_for_empty_middle_section(self, document, section_idx, section_has_content):
         """Kiểm tra xem một phần ở giữa tài liệu có phải là trang trắng không."""
@@ -264,26 +604,12 @@ class EmptyPageDetector:
             # Khởi tạo tập hợp phần có nội dung
             sections_with_content = set()
             
-            # Phương pháp 1: Ước tính phần của mỗi đoạn văn có nội dung
-            non_empty_paragraphs = []
-            for i, para in enumerate(document.paragraphs):
-                if para.text.strip():
-                    non_empty_paragraphs.append(i)
-            
-            # Ước tính phân bố đoạn văn cho các phần
-            if non_empty_paragraphs and len(document.sections) > 0:
-                total_paras = len(document.paragraphs)
-                total_sections = len(document.sections)
-                
-                # Phân bố đoạn văn theo phần dựa trên vị trí
-                for para_idx in non_empty_paragraphs:
-                    # Ước tính phần chứa đoạn văn này
-                    est_section = min(int((para_idx / total_paras) * total_sections), total_sections - 1)
-                    sections_with_content.add(est_section)
+            # Phương pháp 1: Nội dung của từng phần theo đúng các phần tử body thuộc phần đó
+            sections_with_content.update(SectionIndex(document).content_sections())
             
             # Phương pháp 2: Phân tích docx2python
             try:
-                doc_data = docx2python(docx_path)
+                doc_data = docx2python(open_docx_source(docx_path))
                 for i, section in enumerate(doc_data.body_sections):
                     # Nếu phần có text, tables, hoặc hình ảnh
                     if self._contains_content(section):
@@ -446,7 +772,7 @@ class EmptyPageDetector:
     def _advanced_empty_page_detection(self, docx_path, empty_pages_list):
         """Phương pháp phát hiện trang trắng nâng cao."""
         try:
-            document = Document(docx_path)
+            document = Document(open_docx_source(docx_path))
             
             # Phương pháp 1: Kiểm tra hình dạng của tài liệu
             # (các phần tiếp theo nhau với ngắt trang, không có bảng, hình ảnh)
@@ -495,52 +821,30 @@ class EmptyPageDetector:
     def visualize_document_structure(self, docx_path):
         """Tạo bản mô tả cấu trúc tài liệu để debug."""
         try:
-            document = Document(docx_path)
-            structure = []
-            
-            structure.append(f"=== Cấu trúc tài liệu ===")
-            structure.append(f"Tổng số phần: {len(document.sections)}")
-            structure.append(f"Tổng số đoạn văn: {len(document.paragraphs)}")
-            structure.append(f"Tổng số bảng: {len(document.tables)}")
-            structure.append(f"")
-            
-            for i, section in enumerate(document.sections):
-                structure.append(f"--- Phần {i+1} ---")
-                structure.append(f"Kiểu ngắt phần: {self._get_section_type_name(section.start_type)}")
-                structure.append(f"Header khác nhau: {section.different_first_page_header_footer}")
-                structure.append(f"Kích thước trang: {section.page_width.inches:.2f}\" x {section.page_height.inches:.2f}\"")
-                structure.append(f"")
-            
-            structure.append(f"=== Phân bố nội dung ===")
-            paragraph_count = 0
-            for i, para in enumerate(document.paragraphs):
-                if para.text.strip():
-                    paragraph_count += 1
-                    if paragraph_count <= 5 or paragraph_count > len(document.paragraphs) - 5:
-                        structure.append(f"Đoạn văn {i+1}: '{para.text[:50]}...' (Dài: {len(para.text)})")
-            
-            if len(document.paragraphs) > 10:
-                structure.append(f"... và {len(document.paragraphs) - 10} đoạn văn khác ...")
-                
-            # Thêm thông tin về phần có nội dung
-            section_content = self._analyze_section_content(document, docx_path)
-            structure.append(f"\n=== Phân bố nội dung theo phần ===")
-            structure.append(f"Các phần có nội dung: {sorted(list(section_content))}")
-            
-            # Thêm thông tin về các trang trắng được phát hiện
-            empty_pages = self.detect_empty_pages_v2(docx_path)
-            structure.append(f"\n=== Trang trắng được phát hiện ===")
-            for i, page in enumerate(empty_pages):
-                structure.append(f"Trang trắng {i+1}: Phần {page['section_index']+1}, "
-                               f"Phương pháp: {page.get('detection_method', 'unknown')}")
-                
-            return "\n".join(structure)
+            context = self.run_detection(docx_path)
+            return self.build_structure_report(docx_path, context).to_text()
             
         except Exception as e:
             logger.error(f"Lỗi khi tạo cấu trúc tài liệu: {e}")
             return f"Không thể tạo cấu trúc tài liệu: {str(e)}"
     
-    def _get_section_type_name(self, section_type):
+    def build_structure_report(self, docx_path, context, document=None):
+        """Tạo báo cáo cấu trúc (chưa tính toán) từ kết quả của run_detection.
+
+        document là tài liệu python-docx bên gọi đã mở sẵn từ cùng nguồn, dùng khi bộ phát
+        hiện không cần tự mở tài liệu.
+        """
+        return DocumentStructureReport(
+            docx_path,
+            context['document'] if context['document'] is not None else document,
+            context['empty_pages'],
+            context['section_has_content'],
+            context['page_count'],
+            context.get('stats')
+        )
+    
+    @staticmethod
+    def _get_section_type_name(section_type):
         """Trả về tên kiểu ngắt phần."""
         section_types = {
             WD_SECTION_START.CONTINUOUS: "Continuous",
@@ -551,35 +855,265 @@ class EmptyPageDetector:
         }
         return section_types.get(section_type, "Unknown")
         
+class DocumentStructureReport:
+    """Báo cáo cấu trúc tài liệu được tính khi cần và lưu lại sau lần đầu.
+    
+    Chỉ dùng dữ liệu mà bước phân tích đã có (document, thống kê XML, các phần có nội dung,
+    trang trắng, số trang), nên tạo đối tượng không tốn chi phí. Không mở lại tài liệu khi
+    render: thiếu thống kê thì đọc thống kê XML, thiếu document thì thông tin từng phần chỉ
+    có kiểu ngắt (từ thống kê) và không có phần xem trước đoạn văn.
+    """
+    
+    def __init__(self, docx_path, document, empty_pages, section_has_content=None, page_count=None, stats=None):
+        self.docx_path = docx_path
+        self.document = document
+        self.empty_pages = empty_pages
+        self.section_has_content = section_has_content
+        self.page_count = page_count
+        self.stats = stats
+        self._data = None
+        self._lock = threading.Lock()
+        
+    def __str__(self):
+        return self.to_text()
+        
+    def get_data(self):
+        """Tính dữ liệu báo cáo (một lần) và trả về dạng dict."""
+        with self._lock:
+            if self._data is None:
+                self._data = self._build_data()
+            return self._data
+    
+    def _build_data(self):
+        stats = dict(self.stats if self.stats is not None else read_document_stats(self.docx_path))
+        sections_detail = stats.pop('sections_detail', [])
+        
+        sections = []
+        paragraphs = []
+        if self.document is None:
+            # Bộ lập kế hoạch có thể đã kết luận mà không cần mở tài liệu bằng python-docx
+            for i, detail in enumerate(sections_detail):
+                section_type = XML_SECTION_TYPES.get(detail['start_type'], WD_SECTION_START.NEW_PAGE)
+                sections.append({
+                    'index': i,
+                    'type_name': EmptyPageDetector._get_section_type_name(section_type),
+                    'different_first_page': None,
+                    'page_width_inches': None,
+                    'page_height_inches': None
+                })
+        else:
+            for i, section in enumerate(self.document.sections):
+                sections.append({
+                    'index': i,
+                    'type_name': EmptyPageDetector._get_section_type_name(section.start_type),
+                    'different_first_page': bool(section.different_first_page_header_footer),
+                    'page_width_inches': round(section.page_width.inches, 2) if section.page_width else None,
+                    'page_height_inches': round(section.page_height.inches, 2) if section.page_height else None
+                })
+                
+            # Chỉ lấy vài đoạn văn đầu và cuối để xem nhanh phân bố nội dung
+            non_empty = [(i, para.text) for i, para in enumerate(self.document.paragraphs) if para.text.strip()]
+            preview = non_empty if len(non_empty) <= 10 else non_empty[:5] + non_empty[-5:]
+            for i, text in preview:
+                paragraphs.append({'index': i, 'text': text[:50], 'length': len(text)})
+        
+        return {
+            'file_name': os.path.basename(self.docx_path) if isinstance(self.docx_path, str) else None,
+            'stats': stats,
+            'page_count': self.page_count,
+            'sections': sections,
+            'paragraph_preview': paragraphs,
+            'sections_with_content': sorted(self.section_has_content) if self.section_has_content is not None else None,
+            'empty_pages': [
+                {
+                    'section_index': page['section_index'],
+                    'detection_method': page.get('detection_method', 'unknown'),
+                    'confidence': page.get('confidence', 'medium')
+                }
+                for page in self.empty_pages
+            ]
+        }
+        
+    def to_text(self):
+        """Render báo cáo dạng văn bản (giống định dạng log trước đây)."""
+        data = self.get_data()
+        stats = data['stats']
+        structure = []
+        
+        structure.append(f"=== Cấu trúc tài liệu ===")
+        if data['file_name']:
+            structure.append(f"Tệp: {data['file_name']}")
+        structure.append(f"Tổng số phần: {stats['sections']}")
+        structure.append(f"Tổng số đoạn văn: {stats['paragraphs']}")
+        structure.append(f"Tổng số bảng: {stats['tables']}")
+        structure.append(f"Tổng số hình ảnh: {stats['images']}")
+        structure.append(f"Tổng số ngắt trang: {stats['page_breaks']}")
+        if data['page_count'] is not None:
+            structure.append(f"Số trang: {data['page_count']}")
+        structure.append(f"")
+        
+        for section in data['sections']:
+            structure.append(f"--- Phần {section['index']+1} ---")
+            structure.append(f"Kiểu ngắt phần: {section['type_name']}")
+            if section['different_first_page'] is not None:
+                structure.append(f"Header khác nhau: {section['different_first_page']}")
+            if section['page_width_inches'] is not None:
+                structure.append(f"Kích thước trang: {section['page_width_inches']}\" x {section['page_height_inches']}\"")
+            structure.append(f"")
+        
+        structure.append(f"=== Phân bố nội dung ===")
+        for para in data['paragraph_preview']:
+            structure.append(f"Đoạn văn {para['index']+1}: '{para['text']}...' (Dài: {para['length']})")
+        if stats['paragraphs'] > 10:
+            structure.append(f"... và {stats['paragraphs'] - 10} đoạn văn khác ...")
+            
+        structure.append(f"\n=== Phân bố nội dung theo phần ===")
+        if data['sections_with_content'] is not None:
+            structure.append(f"Các phần có nội dung: {data['sections_with_content']}")
+        else:
+            structure.append(f"Không phân tích (không có ngắt phần Next Page)")
+        
+        structure.append(f"\n=== Trang trắng được phát hiện ===")
+        for i, page in enumerate(data['empty_pages']):
+            structure.append(f"Trang trắng {i+1}: Phần {page['section_index']+1}, "
+                           f"Phương pháp: {page['detection_method']}")
+            
+        return "\n".join(structure)
+    
+    def to_json(self, indent=None):
+        """Render báo cáo dạng JSON."""
+        return json.dumps(self.get_data(), ensure_ascii=False, indent=indent)
+    
+    def to_html(self):
+        """Render báo cáo dạng HTML đơn giản."""
+        data = self.get_data()
+        stats = data['stats']
+        parts = ["<html><head><meta charset=\"utf-8\"><title>Cấu trúc tài liệu</title></head><body>"]
+        parts.append("<h2>Cấu trúc tài liệu</h2>")
+        if data['file_name']:
+            parts.append(f"<p>Tệp: {html.escape(data['file_name'])}</p>")
+        parts.append("<ul>")
+        for label, value in (("Tổng số phần", stats['sections']), ("Tổng số đoạn văn", stats['paragraphs']),
+                             ("Tổng số bảng", stats['tables']), ("Tổng số hình ảnh", stats['images']),
+                             ("Tổng số ngắt trang", stats['page_breaks']), ("Số trang", data['page_count'])):
+            if value is not None:
+                parts.append(f"<li>{label}: {value}</li>")
+        parts.append("</ul>")
+        
+        empty_sections = {page['section_index']: page for page in data['empty_pages']}
+        parts.append("<h3>Các phần</h3><table border=\"1\"><tr><th>Phần</th><th>Kiểu ngắt phần</th>"
+                     "<th>Header khác nhau</th><th>Kích thước trang</th><th>Trang trắng</th></tr>")
+        for section in data['sections']:
+            page = empty_sections.get(section['index'])
+            empty_label = html.escape(page['detection_method']) if page else ""
+            different_first_page = "" if section['different_first_page'] is None else section['different_first_page']
+            size = ("" if section['page_width_inches'] is None
+                    else f"{section['page_width_inches']}\" x {section['page_height_inches']}\"")
+            parts.append(f"<tr><td>{section['index']+1}</td><td>{html.escape(section['type_name'])}</td>"
+                         f"<td>{different_first_page}</td><td>{size}</td>"
+                         f"<td>{empty_label}</td></tr>")
+        parts.append("</table>")
+        
+        parts.append("<h3>Phân bố nội dung</h3><ul>")
+        for para in data['paragraph_preview']:
+            parts.append(f"<li>Đoạn văn {para['index']+1}: {html.escape(para['text'])}... (Dài: {para['length']})</li>")
+        parts.append("</ul></body></html>")
+        return "".join(parts)
+
 # Lớp mở rộng với công cụ phát hiện trang trắng tiên tiến
 class PageAnalyzer:
     """Lớp phân tích trang trong tài liệu Word."""
     
-    def __init__(self, docx_path):
-        self.docx_path = docx_path
-        self.empty_page_detector = EmptyPageDetector()
+    def __init__(self, docx_path, progress=None, page_count_backend=None, section_cache=None, cache_key=None,
+                 template_cache=None):
+        # docx_path có thể là đường dẫn tệp hoặc bytes của tài liệu
+        self.docx_path = read_docx_source(docx_path)
+        self.progress = progress or ProgressReporter()
+        self.empty_page_detector = EmptyPageDetector(self.progress, page_count_backend)
+        # Bộ nhớ đệm kết luận theo phần (SectionVerdictCache) để chỉ phân tích lại phần đã sửa
+        self.section_cache = section_cache
+        self.cache_key = cache_key
+        # Bộ nhớ đệm kết luận theo mẫu tài liệu (TemplatePlanCache) cho các họ tài liệu trộn thư
+        self.template_cache = template_cache
         
     def set_debug_mode(self, enabled=True):
         """Bật/tắt chế độ debug."""
         self.empty_page_detector.set_debug_mode(enabled)
         
-    def analyze(self):
-        """Phân tích toàn bộ tài liệu và trả về thông tin chi tiết."""
-        empty_pages = self.empty_page_detector.detect_empty_pages(self.docx_path)
-        document_structure = self.empty_page_detector.visualize_document_structure(self.docx_path)
+    def analyze(self, on_evidence=None, document=None):
+        """Phân tích toàn bộ tài liệu và trả về thông tin chi tiết.
+        
+        on_evidence nhận kết luận tạm thời sau mỗi nguồn bằng chứng (xem EmptyPageDetector.run_detection).
+        document là tài liệu python-docx đã mở từ cùng nguồn (nếu có), để báo cáo cấu trúc dùng lại.
+        """
+        return drain_snapshots(self.iter_analyze(document=document), on_evidence)
+        
+    def iter_analyze(self, docx_path=None, document=None):
+        """Như analyze nhưng là generator: trả ra kết luận tạm thời sau mỗi nguồn bằng chứng,
+        kết quả cuối là giá trị trả về. docx_path thay cho tài liệu đã mở (ví dụ bản đã sửa
+        trong bộ nhớ), vẫn qua cùng bộ nhớ đệm theo mẫu và theo phần."""
+        docx_path = self.docx_path if docx_path is None else read_docx_source(docx_path)
+        if self.template_cache is not None:
+            context = yield from self._iter_with_template(docx_path)
+        elif self.section_cache is not None and self.cache_key is not None:
+            context = yield from self._iter_incremental(docx_path)
+        else:
+            context = yield from self.empty_page_detector.iter_detection(docx_path)
+        empty_pages = context['empty_pages']
+        # Báo cáo cấu trúc chỉ được tính khi thực sự cần hiển thị (ví dụ chế độ debug)
+        document_structure = self.empty_page_detector.build_structure_report(docx_path, context, document)
         
         return {
             'empty_pages': empty_pages,
-            'document_structure': document_structure
+            'document_structure': document_structure,
+            'evidence_sources': context['sources_run'],
+            'verdicts': context['verdicts']
         }
         
-    def fix_empty_pages(self, document, empty_pages):
-        """Sửa các trang trắng được phát hiện."""
+    def _iter_with_template(self, docx_path):
+        """Dùng kết luận của mẫu tài liệu đã biết (sau kiểm tra xác nhận), nếu không có thì phân
+        tích bình thường rồi lưu kết luận làm mẫu cho các tài liệu cùng cấu trúc sau này."""
+        incremental = self.section_cache is not None and self.cache_key is not None
+        stats = read_document_stats(docx_path, fingerprints=incremental, layout=True)
+        known = self.template_cache.lookup(stats)
+        if known is not None:
+            return (yield from self.empty_page_detector.iter_detection(docx_path, known_verdicts=dict(enumerate(known)),
+                                                                       stats=stats, known_source='template'))
+        
+        if incremental:
+            context = yield from self._iter_incremental(docx_path, stats)
+        else:
+            context = yield from self.empty_page_detector.iter_detection(docx_path, stats=stats)
+        self.template_cache.store(stats, context['verdicts'])
+        return context
+        
+    def _iter_incremental(self, docx_path, stats=None):
+        """Phân tích dùng lại kết luận đã lưu cho các phần không đổi so với phiên bản trước."""
+        if stats is None:
+            stats = read_document_stats(docx_path, fingerprints=True)
+        fingerprints = [detail['fingerprint'] for detail in stats['sections_detail']]
+        known_verdicts = self.section_cache.plan(self.cache_key, fingerprints)
+        context = yield from self.empty_page_detector.iter_detection(docx_path, known_verdicts=known_verdicts,
+                                                                     stats=stats)
+        if len(context['verdicts']) == len(fingerprints):
+            self.section_cache.store(self.cache_key, fingerprints, context['verdicts'])
+        return context
+        
+    def fix_empty_pages(self, document, empty_pages, change_log=None):
+        """Sửa các trang trắng được phát hiện, ghi từng thay đổi vào change_log (nếu có).
+        
+        Chỉ sửa các kết luận có độ tin cậy cao; kết luận thấp hơn chỉ được báo cáo.
+        """
         changes_made = 0
         
-        for page_info in empty_pages:
+        for fixed, page_info in enumerate(empty_pages, 1):
+            self.progress.advance("fix", fixed, len(empty_pages))
             section_index = page_info['section_index']
             
+            if page_info.get('confidence', 'high') != 'high':
+                logger.info(f"Bỏ qua phần {section_index}: độ tin cậy {page_info['confidence']} chưa đủ để sửa")
+                continue
+            
             # Kiểm tra giới hạn hợp lệ
             if 0 <= section_index < len(document.sections):
                 section = document.sections[section_index]
@@ -587,6 +1121,9 @@ class PageAnalyzer:
                 # Chỉ sửa các phần kiểu Next Page
                 if section.start_type == WD_SECTION_START.NEW_PAGE:
                     section.start_type = WD_SECTION_START.CONTINUOUS
+                    if change_log is not None:
+                        change_log.record(section_index, WD_SECTION_START.NEW_PAGE,
+                                          WD_SECTION_START.CONTINUOUS, "page_analyzer")
                     changes_made += 1
                     logger.info(f"Đã chuyển phần {section_index} từ 'Next Page' sang 'Continuous'")
         